@@ -0,0 +1,165 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Per phase cost of a rig build. Each phase records wall time, maya commands called, nodes created,
+       connections made (connectAttr calls plus command_buffer connects) and, when asked for, Python allocations
+       (tracemalloc, python 3 only). The result is a plain dict a pipeline can log per asset.
+       Builders take a NoStats when nothing is collected, so their phases don't need checks.
+
+Usage:
+    import build_stats
+    stats = build_stats.BuildStats(allocations=True)
+    with stats:
+        stats.begin('driver_surfaces')
+        ...
+        stats.begin('follicles')
+        ...
+    print(stats.report())
+    log(stats.as_dict())
+'''
+
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import maya.cmds as mc
+
+import cmds_profiler
+import command_buffer
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+CONNECT_COMMANDS = ('cmds.connectAttr',)
+
+
+class PhaseStats(object):
+    __slots__ = ('name', 'seconds', 'commands', 'nodes', 'connections', 'allocated_kb', 'peak_kb')
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.commands = 0
+        self.nodes = 0
+        self.connections = 0
+        self.allocated_kb = None
+        self.peak_kb = None
+
+    def as_dict(self):
+        return dict((key, getattr(self, key)) for key in self.__slots__)
+
+
+class BuildStats(object):
+    """
+    Collects PhaseStats while active. begin() ends the running phase and starts the next one, a phase begun again
+    (ex. global scale set in two places) adds up.
+    :param allocations: trace Python allocations, slows the build down while active
+    """
+
+    def __init__(self, allocations=False):
+        self.allocations = allocations and tracemalloc is not None
+        self.phases = list()
+        self.profiler = cmds_profiler.Profiler(slowest=0, trace=False)
+        self.seconds = 0.0
+        self.start_time = None
+        self.started_tracing = False
+        # running phase and the counters when it began
+        self.current = None
+        self.before = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        if self.allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.profiler.start()
+        self.start_time = _clock()
+
+    def stop(self):
+        self.end()
+        self.seconds += _clock() - self.start_time
+        self.profiler.stop()
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def get_phase(self, name):
+        for phase in self.phases:
+            if phase.name == name:
+                return phase
+        phase = PhaseStats(name)
+        self.phases.append(phase)
+        return phase
+
+    def counters(self):
+        commands = self.profiler.by_command()
+        connections = sum(commands.get(c, (0, 0.0))[0] for c in CONNECT_COMMANDS) + command_buffer.totals['connect']
+        # unwrapped, so the profiler doesn't count it
+        nodes = set(getattr(mc.ls, '__wrapped__', mc.ls)())
+        allocated = tracemalloc.get_traced_memory()[0] if self.allocations else None
+        return self.profiler.total_calls(), nodes, connections, allocated
+
+    def begin(self, name):
+        """ Ends the running phase and starts measuring name """
+        self.end()
+        if self.allocations and hasattr(tracemalloc, 'reset_peak'):
+            # python 3.9+, older versions report the peak of the whole build so far
+            tracemalloc.reset_peak()
+        self.current = self.get_phase(name)
+        self.before = self.counters() + (_clock(),)
+
+    def end(self):
+        """ Adds what happened since begin() to the running phase """
+        if self.current is None:
+            return
+        commands, nodes, connections, allocated = self.counters()
+        old_commands, old_nodes, old_connections, old_allocated, start = self.before
+        phase = self.current
+        phase.seconds += _clock() - start
+        phase.commands += commands - old_commands
+        phase.nodes += len(nodes - old_nodes)
+        phase.connections += connections - old_connections
+        if allocated is not None:
+            phase.allocated_kb = (phase.allocated_kb or 0.0) + (allocated - old_allocated) / 1024.0
+            phase.peak_kb = max(phase.peak_kb or 0.0, tracemalloc.get_traced_memory()[1] / 1024.0)
+        self.current = None
+        self.before = None
+
+    def as_dict(self):
+        """ {'seconds', 'phases': [phase dicts in build order]} """
+        return {'seconds': self.seconds, 'phases': [phase.as_dict() for phase in self.phases]}
+
+    def report(self):
+        lines = ['{:<20} {:>9} {:>8} {:>7} {:>7} {:>11}'.format('phase', 'seconds', 'commands', 'nodes',
+                                                               'connect', 'alloc kb')]
+        for p in self.phases:
+            lines.append('{:<20} {:>9.3f} {:>8} {:>7} {:>7} {:>11}'.format(
+                p.name, p.seconds, p.commands, p.nodes, p.connections,
+                '-' if p.allocated_kb is None else '{:.0f}'.format(p.allocated_kb)))
+        lines.append('{:<20} {:>9.3f}'.format('total', self.seconds))
+        return '\n'.join(lines)
+
+
+class NoStats(object):
+    """ Stand in for BuildStats when a build isn't measured, every call does nothing """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def begin(self, name):
+        pass
+
+    def end(self):
+        pass
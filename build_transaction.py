@@ -0,0 +1,100 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Context manager and decorator for big builds. While active the viewport refresh is suspended,
+       autoKeyframe is off and undo doesn't record, or records everything as one undo chunk. The previous
+       state comes back on exit, also when the build raises. Nested transactions (a builder calling another
+       one) only change the state once, the outermost one restores it.
+       The outermost transaction also runs a name_registry.NameRegistry for the whole build.
+
+Usage:
+    import build_transaction
+
+    @build_transaction.BuildTransaction('createRibbon')
+    def createRibbon(...):
+        ...
+
+    with build_transaction.BuildTransaction('reshape', undo_chunk=True):
+        ...
+'''
+
+import functools
+
+import maya.cmds as mc
+
+import name_registry
+
+
+# State saved by every running transaction, None for the nested ones
+_saved = list()
+
+
+class BuildTransaction(object):
+    """
+    :param name: undo chunk name
+    :param undo_chunk: keep undo on and leave the whole build as one undo chunk, instead of not recording it
+    """
+
+    def __init__(self, name='build', undo_chunk=False):
+        self.name = name
+        self.undo_chunk = undo_chunk
+
+    def __enter__(self):
+        if _saved:
+            _saved.append(None)
+            return self
+
+        state = {'refresh': mc.refresh(q=True, suspend=True),
+                 'undo': mc.undoInfo(q=True, state=True),
+                 'auto_key': mc.autoKeyframe(q=True, state=True),
+                 'chunk': False,
+                 'names': name_registry.NameRegistry()}
+
+        try:
+            mc.refresh(suspend=True)
+            mc.autoKeyframe(state=False)
+            if state['undo'] and self.undo_chunk:
+                mc.undoInfo(openChunk=True, chunkName=self.name)
+                state['chunk'] = True
+            elif state['undo']:
+                # keeps what is already in the queue
+                mc.undoInfo(stateWithoutFlush=False)
+            state['names'].start()
+        except Exception:
+            # not saved yet, later transactions must not think they are nested
+            _restore(state)
+            raise
+        _saved.append(state)
+        return self
+
+    def __exit__(self, *args):
+        state = _saved.pop()
+        if state is not None:
+            _restore(state)
+        return False
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with BuildTransaction(self.name, self.undo_chunk):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def _restore(state):
+    """ Puts back what BuildTransaction.__enter__ saved """
+    try:
+        state['names'].stop()
+        if state['chunk']:
+            mc.undoInfo(closeChunk=True)
+        elif state['undo']:
+            mc.undoInfo(stateWithoutFlush=True)
+        mc.autoKeyframe(state=state['auto_key'])
+    finally:
+        mc.refresh(suspend=state['refresh'])
+
+
+def is_active():
+    """ True while a BuildTransaction runs """
+    return bool(_saved)
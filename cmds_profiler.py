@@ -0,0 +1,218 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Opt-in profiler of the maya commands a builder calls. While active every function of maya.cmds, maya.mel
+       and pymel.core (when pymel is already imported) is wrapped, and each call is timed by command and by the
+       file:function:line that called it. Results export as a text report sorted by total time and as a Chrome
+       trace (chrome://tracing or https://ui.perfetto.dev).
+
+       Only the outermost command is timed, commands pymel runs internally count inside the pymel call. Names
+       bound with "from maya.cmds import x" before the profiler starts are not wrapped.
+
+Usage:
+    import cmds_profiler
+    import weighted_ribbon
+    result, profiler = cmds_profiler.profile_call(weighted_ribbon.createRibbon, numLayers=5)
+    print(profiler.report())
+    profiler.save_chrome_trace('createRibbon_trace.json')
+
+    with cmds_profiler.Profiler() as profiler:
+        weighted_ribbon.createRibbon()
+'''
+
+import heapq
+import json
+import os
+import sys
+import time
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class CallStats(object):
+    """ Calls of one command from one call site """
+    __slots__ = ('command', 'site', 'count', 'total', 'slowest')
+
+    def __init__(self, command, site):
+        self.command = command
+        self.site = site
+        self.count = 0
+        self.total = 0.0
+        # min heap of (seconds, arguments)
+        self.slowest = list()
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class Profiler(object):
+    """
+    Wraps the maya command modules while active.
+        stats  - {(command, site): CallStats}
+        events - (command, site, start, seconds) of every call, for the Chrome trace
+    :param slowest: slowest calls kept per command and site, with their arguments
+    :param trace: keep every call for the Chrome trace
+    """
+
+    def __init__(self, slowest=5, trace=True):
+        self.slowest = slowest
+        self.trace = trace
+        self.stats = dict()
+        self.events = list()
+        self.depth = 0
+        self.originals = list()
+        self.start_time = None
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # Hooks ############################################################################################
+
+    @staticmethod
+    def get_modules():
+        """ (prefix, module) pairs to wrap, pymel only if something imported it already """
+        import maya.cmds
+        import maya.mel
+        modules = [('cmds', maya.cmds), ('mel', maya.mel)]
+        if 'pymel.core' in sys.modules:
+            modules.append(('pm', sys.modules['pymel.core']))
+        return modules
+
+    def start(self):
+        for prefix, module in self.get_modules():
+            for name, function in list(vars(module).items()):
+                if name.startswith('_') or isinstance(function, type) or not callable(function):
+                    continue
+                self.originals.append((module, name, function))
+                setattr(module, name, self.wrap('{}.{}'.format(prefix, name), function))
+        self.start_time = _clock()
+
+    def stop(self):
+        for module, name, function in self.originals:
+            setattr(module, name, function)
+        self.originals = list()
+        if self.start_time is not None:
+            self.elapsed += _clock() - self.start_time
+            self.start_time = None
+
+    def wrap(self, command, function):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            if profiler.depth:
+                return function(*args, **kwargs)
+            profiler.depth += 1
+            start = _clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = _clock() - start
+                profiler.depth -= 1
+                frame = sys._getframe(1)
+                site = '{}:{}:{}'.format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name,
+                                         frame.f_lineno)
+                profiler.record(command, site, start, seconds, args, kwargs)
+
+        wrapper.__name__ = function.__name__ if hasattr(function, '__name__') else command
+        wrapper.__doc__ = getattr(function, '__doc__', None)
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def record(self, command, site, start, seconds, args, kwargs):
+        stats = self.stats.get((command, site))
+        if stats is None:
+            stats = self.stats[(command, site)] = CallStats(command, site)
+        stats.count += 1
+        stats.total += seconds
+
+        # arguments are only formatted for calls that make it into the slowest list
+        if self.slowest and (len(stats.slowest) < self.slowest or seconds > stats.slowest[0][0]):
+            arguments = ', '.join([repr(a) for a in args] + ['{}={!r}'.format(k, v) for k, v in kwargs.items()])
+            if len(arguments) > 200:
+                arguments = arguments[:197] + '...'
+            if len(stats.slowest) < self.slowest:
+                heapq.heappush(stats.slowest, (seconds, arguments))
+            else:
+                heapq.heapreplace(stats.slowest, (seconds, arguments))
+
+        if self.trace:
+            self.events.append((command, site, start, seconds))
+
+    # Results ##########################################################################################
+
+    def reset(self):
+        self.stats = dict()
+        self.events = list()
+        self.elapsed = 0.0
+
+    def total_calls(self):
+        return sum(s.count for s in self.stats.values())
+
+    def total_time(self):
+        return sum(s.total for s in self.stats.values())
+
+    def by_command(self):
+        """ {command: (calls, seconds)} of every call site added up """
+        commands = dict()
+        for stats in self.stats.values():
+            count, total = commands.get(stats.command, (0, 0.0))
+            commands[stats.command] = (count + stats.count, total + stats.total)
+        return commands
+
+    def report(self, limit=40, sort='total', slowest=True):
+        """
+        Text report, commands first and then call sites
+        :param sort: 'total', 'count' or 'average'
+        """
+        lines = ['{} maya calls, {:.3f} s in commands of {:.3f} s profiled'.format(
+            self.total_calls(), self.total_time(), self.elapsed)]
+
+        lines.append('')
+        lines.append('{:>8} {:>10}  command'.format('calls', 'seconds'))
+        commands = sorted(self.by_command().items(), key=lambda item: -item[1][1 if sort != 'count' else 0])
+        for command, (count, total) in commands[:limit]:
+            lines.append('{:>8} {:>10.4f}  {}'.format(count, total, command))
+
+        lines.append('')
+        lines.append('{:>8} {:>10} {:>10}  {:<24} call site'.format('calls', 'seconds', 'average', 'command'))
+        sites = sorted(self.stats.values(), key=lambda s: -getattr(s, sort))
+        for stats in sites[:limit]:
+            lines.append('{:>8} {:>10.4f} {:>10.6f}  {:<24} {}'.format(stats.count, stats.total, stats.average,
+                                                                      stats.command, stats.site))
+            if slowest and stats.count > 1:
+                for seconds, arguments in sorted(stats.slowest, reverse=True):
+                    lines.append('{:>30.6f}    {}({})'.format(seconds, stats.command, arguments))
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        """ Chrome trace event format dict, one complete event per call, times in microseconds """
+        origin = self.events[0][2] if self.events else 0.0
+        events = [{'name': command, 'cat': command.split('.')[0], 'ph': 'X', 'pid': 1, 'tid': 1,
+                   'ts': (start - origin) * 1e6, 'dur': seconds * 1e6, 'args': {'site': site}}
+                  for command, site, start, seconds in self.events]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_report(self, path, **kwargs):
+        with open(path, 'w') as f:
+            f.write(self.report(**kwargs))
+
+    def save_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def profile_call(function, *args, **kwargs):
+    """
+    Runs function under a Profiler
+    :return: (function return value, Profiler)
+    """
+    with Profiler() as profiler:
+        result = function(*args, **kwargs)
+    return result, profiler
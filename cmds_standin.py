@@ -0,0 +1,1167 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: In memory stand-in for maya.cmds (plus the maya.api.OpenMaya subset the NumPy helpers use), so the builders
+       can run and be timed in plain CPython. Every call is counted by command and by call site.
+
+       The scene is a graph of nodes with attributes and connections. Nothing is evaluated: connections are only
+       stored, transforms don't move geometry (cv positions are world positions) and rebuildSurface samples the
+       surface at the new cvs, which is exact for the flat planes the ribbons start from. It supports the cmds
+       used by weighted_ribbon.createRibbon and the modules it imports, weighted_ribbon is the only builder it
+       runs. MatrixRibbon (tmp) is not supported: it is python 2 source and needs kmd and the ribbon plugins,
+       none of which the stand-in provides. maya.OpenMaya and pymel.core are installed as empty modules, so xLib
+       can be imported but its functions that use them won't run.
+
+Usage:
+    import cmds_standin
+    scene = cmds_standin.install()
+    import weighted_ribbon
+    weighted_ribbon.createRibbon()
+    print(scene.recorder.report())
+    cmds_standin.uninstall()
+'''
+
+import copy
+import functools
+import inspect
+import os
+import re
+import sys
+import types
+
+import numpy as np
+
+import nurbs_math as nmath
+
+
+DAG_TYPES = ('transform', 'joint', 'follicle', 'locator', 'nurbsSurface', 'nurbsCurve', 'mesh')
+SHAPE_TYPES = ('follicle', 'locator', 'nurbsSurface', 'nurbsCurve', 'mesh')
+
+ATTR_ALIASES = {'v': 'visibility', 't': 'translate', 'r': 'rotate', 's': 'scale',
+                'tx': 'translateX', 'ty': 'translateY', 'tz': 'translateZ',
+                'rx': 'rotateX', 'ry': 'rotateY', 'rz': 'rotateZ',
+                'sx': 'scaleX', 'sy': 'scaleY', 'sz': 'scaleZ',
+                'io': 'intermediateObject', 'liw': 'lockInfluenceWeights', 'wm': 'worldMatrix'}
+
+ATTR_DEFAULTS = {'visibility': True, 'scaleX': 1.0, 'scaleY': 1.0, 'scaleZ': 1.0, 'scale': (1.0, 1.0, 1.0),
+                 'intermediateObject': False, 'radius': 1.0}
+
+_COMPONENT_RE = re.compile(r'^(?P<node>[^.]+)\.(?P<kind>cv|vtx)\[(?P<a>\*|\d+)\](?:\[(?P<b>\*|\d+)\])?$')
+_IDENTITY = (1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0)
+
+_SAVED_MODULES = dict()
+# builtins install() added, removed again by uninstall()
+_ADDED_BUILTINS = list()
+
+
+#######################################################################################################
+''' Call recorder ''' #################################################################################
+#######################################################################################################
+
+class Recorder(object):
+    """ Counts calls by command and by call site (file:function:line of the first frame outside this file) """
+
+    def __init__(self):
+        self.counts = dict()
+        self.sites = dict()
+
+    def reset(self):
+        self.counts = dict()
+        self.sites = dict()
+
+    def record(self, command):
+        self.counts[command] = self.counts.get(command, 0) + 1
+        key = (command, call_site())
+        self.sites[key] = self.sites.get(key, 0) + 1
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def report(self, limit=30):
+        lines = ['{} calls'.format(self.total())]
+        for command, count in sorted(self.counts.items(), key=lambda item: -item[1])[:limit]:
+            lines.append('{:>8}  {}'.format(count, command))
+        lines.append('')
+        lines.append('by call site')
+        for (command, site), count in sorted(self.sites.items(), key=lambda item: -item[1])[:limit]:
+            lines.append('{:>8}  {:<24} {}'.format(count, command, site))
+        return '\n'.join(lines)
+
+
+def call_site():
+    this_file = os.path.splitext(os.path.abspath(__file__))[0]
+    frame = inspect.currentframe()
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if os.path.splitext(os.path.abspath(filename))[0] != this_file:
+            return '{}:{}:{}'.format(os.path.basename(filename), frame.f_code.co_name, frame.f_lineno)
+        frame = frame.f_back
+    return '?'
+
+
+#######################################################################################################
+''' Scene ''' #########################################################################################
+#######################################################################################################
+
+class Surface(object):
+    """ Nurbs surface data, cvs (numCVsU, numCVsV, 3) and full knot vectors """
+    __slots__ = ('cvs', 'knots_u', 'knots_v', 'degree_u', 'degree_v')
+
+    def __init__(self, cvs, knots_u, knots_v, degree_u, degree_v):
+        self.cvs = np.asarray(cvs, dtype=float)
+        self.knots_u = np.asarray(knots_u, dtype=float)
+        self.knots_v = np.asarray(knots_v, dtype=float)
+        self.degree_u = degree_u
+        self.degree_v = degree_v
+
+
+class Node(object):
+    __slots__ = ('name', 'type', 'parent', 'children', 'attrs', 'locked', 'data', 'alive')
+
+    def __init__(self, name, node_type):
+        self.name = name
+        self.type = node_type
+        self.parent = None
+        self.children = list()
+        self.attrs = dict()
+        self.locked = set()
+        self.data = None
+        self.alive = False
+
+    def is_dag(self):
+        return self.type in DAG_TYPES
+
+    def full_path(self):
+        path = list()
+        node = self
+        while node is not None:
+            path.append(node.name)
+            node = node.parent
+        return '|' + '|'.join(reversed(path))
+
+
+class Scene(object):
+    def __init__(self):
+        self.nodes = dict()
+        # (destination node, attr) : (source node, attr)
+        self.connections = dict()
+        self.recorder = Recorder()
+        self.created = 0
+        self.undo_state = True
+        self.undo_chunks = 0
+        self.auto_key = False
+        self.suspended = False
+        # callback id : (event, function), the MDGMessage/MNodeMessage callbacks
+        self.listeners = dict()
+        self.next_listener = 1
+
+    # Nodes #############################################################################################
+
+    def unique_name(self, name):
+        name = name.split('|')[-1]
+        if name not in self.nodes:
+            return name
+        base = name.rstrip('0123456789')
+        index = 1
+        while '{}{}'.format(base, index) in self.nodes:
+            index += 1
+        return '{}{}'.format(base, index)
+
+    def add(self, node, parent=None):
+        node.name = self.unique_name(node.name)
+        self.nodes[node.name] = node
+        node.alive = True
+        self.created += 1
+        if parent is not None:
+            self.reparent(node, parent)
+        self.notify('added', node)
+        return node
+
+    def create(self, node_type, name=None, parent=None):
+        return self.add(Node(name or node_type + '1', node_type), parent)
+
+    def get(self, name, strict=True):
+        if isinstance(name, Node):
+            return name
+        node = self.nodes.get(str(name).split('|')[-1])
+        if node is None and strict:
+            raise RuntimeError('No object matches name: {}'.format(name))
+        return node
+
+    def rename(self, node, name):
+        old_name = node.name
+        del self.nodes[node.name]
+        node.name = self.unique_name(name)
+        self.nodes[node.name] = node
+        self.notify('renamed', node, old_name)
+
+    def reparent(self, node, parent):
+        if node.parent is not None:
+            node.parent.children.remove(node)
+        node.parent = parent
+        if parent is not None:
+            parent.children.append(node)
+
+    def remove(self, node):
+        for child in list(node.children):
+            self.remove(child)
+        if node.parent is not None:
+            node.parent.children.remove(node)
+            node.parent = None
+        for key in [k for k, v in self.connections.items() if k[0] is node or v[0] is node]:
+            del self.connections[key]
+        self.notify('removed', node)
+        self.nodes.pop(node.name, None)
+        node.alive = False
+
+    def listen(self, event, function):
+        callback_id = self.next_listener
+        self.next_listener += 1
+        self.listeners[callback_id] = (event, function)
+        return callback_id
+
+    def notify(self, event, node, *args):
+        for listener_event, function in list(self.listeners.values()):
+            if listener_event == event:
+                function(node, *args)
+
+    def shapes(self, node):
+        if node.type in SHAPE_TYPES:
+            return [node]
+        return [child for child in node.children if child.type in SHAPE_TYPES]
+
+    def shape_data(self, node, node_type):
+        for shape in self.shapes(node):
+            if shape.type == node_type:
+                return shape
+        raise RuntimeError('{} has no {}'.format(node.name, node_type))
+
+    # Attributes ########################################################################################
+
+    def split_plug(self, plug):
+        node, attr = str(plug).split('.', 1)
+        return self.get(node), self.attr_name(attr)
+
+    @staticmethod
+    def attr_name(attr):
+        base, bracket, rest = attr.partition('[')
+        return ATTR_ALIASES.get(base, base) + bracket + rest
+
+    def get_value(self, node, attr):
+        if attr in node.attrs:
+            return node.attrs[attr]
+        computed = self.computed_attr(node, attr)
+        if computed is not None:
+            return computed
+        return ATTR_DEFAULTS.get(attr.split('[')[0], 0.0)
+
+    def computed_attr(self, node, attr):
+        if node.type == 'transform':
+            surfaces = [s for s in self.shapes(node) if s.type == 'nurbsSurface']
+            if surfaces and attr in ('spansUV', 'degreeUV', 'minMaxRangeU', 'minMaxRangeV'):
+                return self.computed_attr(surfaces[0], attr)
+        if node.type == 'nurbsSurface':
+            data = node.data
+            if attr == 'spansUV':
+                return [(data.cvs.shape[0] - data.degree_u, data.cvs.shape[1] - data.degree_v)]
+            if attr == 'degreeUV':
+                return [(data.degree_u, data.degree_v)]
+            if attr == 'minMaxRangeU':
+                return [tuple(float(k) for k in nmath.knot_domain(data.knots_u, data.degree_u))]
+            if attr == 'minMaxRangeV':
+                return [tuple(float(k) for k in nmath.knot_domain(data.knots_v, data.degree_v))]
+        if attr.split('[')[0] in ('worldMatrix', 'worldInverseMatrix', 'parentInverseMatrix', 'matrix'):
+            return list(_IDENTITY)
+        return None
+
+    def connect(self, source, destination):
+        self.connections[destination] = source
+
+    def disconnect(self, source, destination):
+        if self.connections.get(destination) == source:
+            del self.connections[destination]
+
+    def connections_of(self, node):
+        """ ((source, attr), (destination, attr)) pairs touching node """
+        return [(src, dst) for dst, src in self.connections.items() if src[0] is node or dst[0] is node]
+
+    def history(self, node):
+        """ Deformers writing into the shapes of node """
+        result = list()
+        for shape in self.shapes(node):
+            for dst, src in self.connections.items():
+                if dst[0] is shape and src[0].type in ('skinCluster', 'blendShape') and src[0] not in result:
+                    result.append(src[0])
+        return result
+
+
+#######################################################################################################
+''' maya.cmds ''' #####################################################################################
+#######################################################################################################
+
+def _as_list(value):
+    if value is None:
+        return list()
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _flag(kwargs, *names, **default):
+    for name in names:
+        if name in kwargs:
+            return kwargs[name]
+    return default.get('default')
+
+
+def _component_match(component):
+    return _COMPONENT_RE.match(str(component))
+
+
+class Cmds(object):
+    """ Every public method is a maya.cmds command, wrapped by make_module() to be counted """
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    # Components ########################################################################################
+
+    def _components(self, component):
+        """ [(surface shape node, i, j)] of a cv component string """
+        match = _component_match(component)
+        node = self.scene.get(match.group('node'))
+        shape = self.scene.shape_data(node, 'nurbsSurface') if node.type != 'nurbsSurface' else node
+        cvs = shape.data.cvs
+        count_u, count_v = cvs.shape[:2]
+        a, b = match.group('a'), match.group('b')
+        rows = range(count_u) if a == '*' else [int(a)]
+        if b is None:
+            # single index on a surface is flat u major
+            if a == '*':
+                return [(shape, i // count_v, i % count_v) for i in range(count_u * count_v)]
+            return [(shape, int(a) // count_v, int(a) % count_v)]
+        cols = range(count_v) if b == '*' else [int(b)]
+        return [(shape, i, j) for i in rows for j in cols]
+
+    # Scene queries #####################################################################################
+
+    def objExists(self, name):
+        name = str(name)
+        if '.' in name:
+            try:
+                node, attr = self.scene.split_plug(name)
+            except RuntimeError:
+                return False
+            return attr in node.attrs
+        return self.scene.get(name, strict=False) is not None
+
+    def ls(self, *args, **kwargs):
+        flatten = _flag(kwargs, 'flatten', 'fl')
+        node_type = _flag(kwargs, 'type')
+        if _flag(kwargs, 'selection', 'sl'):
+            return list()
+        names = list()
+        for arg in args:
+            names.extend(_as_list(arg))
+        if not args:
+            names = list(self.scene.nodes)
+        result = list()
+        for name in names:
+            match = _component_match(name)
+            if match:
+                comps = self._components(name)
+                owner = match.group('node')
+                if flatten:
+                    if match.group('b') is None:
+                        count_v = comps[0][0].data.cvs.shape[1] if comps else 1
+                        result.extend('{}.cv[{}]'.format(owner, i * count_v + j) for s, i, j in comps)
+                    else:
+                        result.extend('{}.cv[{}][{}]'.format(owner, i, j) for s, i, j in comps)
+                else:
+                    result.append(name)
+                continue
+            node = self.scene.get(name, strict=False)
+            if node is None:
+                continue
+            if node_type and node.type not in _as_list(node_type):
+                continue
+            result.append(node.name)
+        return result
+
+    def nodeType(self, name, **kwargs):
+        if _flag(kwargs, 'isTypeName'):
+            if name in DAG_TYPES:
+                return ['containerBase', 'entity', 'dagNode', name]
+            return [name]
+        return self.scene.get(name).type
+
+    def listRelatives(self, *args, **kwargs):
+        names = list()
+        for arg in args:
+            names.extend(_as_list(arg))
+        full_path = _flag(kwargs, 'fullPath', 'f')
+        node_type = _flag(kwargs, 'type')
+        result = list()
+        for name in names:
+            node = self.scene.get(name)
+            if _flag(kwargs, 'parent', 'p'):
+                related = [node.parent] if node.parent is not None else list()
+            elif _flag(kwargs, 'allDescendents', 'ad'):
+                related = list()
+                stack = list(node.children)
+                while stack:
+                    child = stack.pop()
+                    related.append(child)
+                    stack.extend(child.children)
+            else:
+                related = list(node.children)
+            if _flag(kwargs, 'shapes', 's'):
+                related = [n for n in related if n.type in SHAPE_TYPES]
+            if _flag(kwargs, 'noIntermediate', 'ni'):
+                related = [n for n in related if not self.scene.get_value(n, 'intermediateObject')]
+            if node_type:
+                related = [n for n in related if n.type in _as_list(node_type)]
+            result.extend(n.full_path() if full_path else n.name for n in related)
+        return result or None
+
+    def listHistory(self, name, **kwargs):
+        node = self.scene.get(name)
+        return [node.name] + [n.name for n in self.scene.history(node)]
+
+    def listConnections(self, plug, **kwargs):
+        source = _flag(kwargs, 'source', 's', default=True)
+        destination = _flag(kwargs, 'destination', 'd', default=True)
+        plugs = _flag(kwargs, 'plugs', 'p')
+        if '.' in str(plug):
+            node, attr = self.scene.split_plug(plug)
+        else:
+            node, attr = self.scene.get(plug), None
+        result = list()
+        for src, dst in self.scene.connections_of(node):
+            if source and dst[0] is node and (attr is None or dst[1].split('[')[0] == attr.split('[')[0]):
+                result.append('{}.{}'.format(src[0].name, src[1]) if plugs else src[0].name)
+            if destination and src[0] is node and (attr is None or src[1].split('[')[0] == attr.split('[')[0]):
+                result.append('{}.{}'.format(dst[0].name, dst[1]) if plugs else dst[0].name)
+        return result or None
+
+    def attributeQuery(self, attr, **kwargs):
+        node = self.scene.get(_flag(kwargs, 'node', 'n'))
+        return self.scene.attr_name(attr) in node.attrs
+
+    def listAttr(self, plug, **kwargs):
+        node, attr = self.scene.split_plug(plug) if '.' in str(plug) else (self.scene.get(plug), None)
+        if node.type == 'blendShape' and attr in ('w', 'weight'):
+            return list(node.data)
+        return sorted(node.attrs)
+
+    def pluginInfo(self, *args, **kwargs):
+        return False
+
+    def loadPlugin(self, *args, **kwargs):
+        raise RuntimeError('Plugins are not available in the cmds stand-in')
+
+    # Creation ##########################################################################################
+
+    def createNode(self, node_type, **kwargs):
+        parent = _flag(kwargs, 'parent', 'p')
+        parent = self.scene.get(parent) if parent else None
+        if node_type in SHAPE_TYPES and parent is None:
+            parent = self.scene.create('transform', node_type + '1')
+        return self.scene.create(node_type, _flag(kwargs, 'name', 'n'), parent).name
+
+    def spaceLocator(self, **kwargs):
+        transform = self.scene.create('transform', _flag(kwargs, 'name', 'n', default='locator1'))
+        self.scene.create('locator', transform.name + 'Shape', transform)
+        return [transform.name]
+
+    def joint(self, **kwargs):
+        node = self.scene.create('joint', _flag(kwargs, 'name', 'n', default='joint1'))
+        node.attrs['radius'] = float(_flag(kwargs, 'radius', 'rad', default=1.0))
+        return node.name
+
+    def nurbsPlane(self, **kwargs):
+        axis = np.array(_flag(kwargs, 'axis', 'ax', default=(0, 1, 0)), dtype=float)
+        width = float(_flag(kwargs, 'width', 'w', default=1.0))
+        ratio = float(_flag(kwargs, 'lengthRatio', 'lr', default=1.0))
+        degree = int(_flag(kwargs, 'degree', 'd', default=3))
+        spans_u = int(_flag(kwargs, 'patchesU', 'u', default=1))
+        spans_v = int(_flag(kwargs, 'patchesV', 'v', default=1))
+        center = np.array(_flag(kwargs, 'pivot', 'p', default=(0, 0, 0)), dtype=float)
+
+        # u along the first axis perpendicular to the normal, v along the second
+        axis = axis / np.linalg.norm(axis)
+        helper = np.array([0.0, 0.0, 1.0]) if abs(axis[2]) < 0.9 else np.array([1.0, 0.0, 0.0])
+        dir_v = np.cross(axis, np.cross(helper, axis))
+        dir_v /= np.linalg.norm(dir_v)
+        dir_u = np.cross(dir_v, axis)
+
+        knots_u = nmath.open_uniform_knots(spans_u + degree, degree)
+        knots_v = nmath.open_uniform_knots(spans_v + degree, degree)
+        gu = nmath.greville_abscissae(knots_u, degree) - 0.5
+        gv = nmath.greville_abscissae(knots_v, degree) - 0.5
+        cvs = (center + gu[:, None, None] * dir_u * width * ratio + gv[None, :, None] * dir_v * width)
+
+        transform = self.scene.create('transform', _flag(kwargs, 'name', 'n', default='nurbsPlane1'))
+        shape = self.scene.create('nurbsSurface', transform.name + 'Shape', transform)
+        shape.data = Surface(cvs, knots_u, knots_v, degree, degree)
+        return [transform.name]
+
+    def duplicate(self, name, **kwargs):
+        source = self.scene.get(_as_list(name)[0])
+        new_name = _flag(kwargs, 'name', 'n', default=source.name)
+
+        def clone(node, parent, clone_name):
+            new = Node(clone_name, node.type)
+            new.attrs = dict(node.attrs)
+            new.data = copy.deepcopy(node.data)
+            self.scene.add(new, parent)
+            for child in node.children:
+                if child.type in SHAPE_TYPES:
+                    clone(child, new, new.name + 'Shape')
+                else:
+                    clone(child, new, child.name)
+            return new
+
+        return [clone(source, source.parent, new_name).name]
+
+    def skinCluster(self, *args, **kwargs):
+        names = list()
+        for arg in args:
+            names.extend(_as_list(arg))
+        influences, geo = names[:-1], self.scene.get(names[-1])
+        skin = self.scene.create('skinCluster', _flag(kwargs, 'name', 'n', default='skinCluster1'))
+        skin.data = {'influences': [self.scene.get(inf) for inf in influences], 'weights': None}
+        for i, inf in enumerate(skin.data['influences']):
+            self.scene.connect((inf, 'worldMatrix[0]'), (skin, 'matrix[{}]'.format(i)))
+        self.scene.connect((skin, 'outputGeometry[0]'), (self.scene.shapes(geo)[0], 'create'))
+        return [skin.name]
+
+    def blendShape(self, *args, **kwargs):
+        names = list()
+        for arg in args:
+            names.extend(_as_list(arg))
+        targets, base = names[:-1], self.scene.get(names[-1])
+        blend = self.scene.create('blendShape', _flag(kwargs, 'name', 'n', default='blendShape1'))
+        blend.data = [self.scene.get(target).name for target in targets]
+        for i, target in enumerate(targets):
+            self.scene.connect((self.scene.shapes(self.scene.get(target))[0], 'worldSpace[0]'),
+                               (blend, 'inputTarget[{}]'.format(i)))
+        self.scene.connect((blend, 'outputGeometry[0]'), (self.scene.shapes(base)[0], 'create'))
+        return [blend.name]
+
+    # Edits #############################################################################################
+
+    def parent(self, *args, **kwargs):
+        names = list()
+        for arg in args:
+            names.extend(_as_list(arg))
+        if _flag(kwargs, 'world', 'w'):
+            children, parent = names, None
+        else:
+            children, parent = names[:-1], self.scene.get(names[-1])
+        for child in children:
+            self.scene.reparent(self.scene.get(child), parent)
+        return [self.scene.get(child).name for child in children]
+
+    def rename(self, name, new_name, **kwargs):
+        node = self.scene.get(name)
+        self.scene.rename(node, new_name)
+        return node.name
+
+    def delete(self, *args, **kwargs):
+        for arg in args:
+            for name in _as_list(arg):
+                node = self.scene.get(name, strict=False)
+                if node is not None and node.alive:
+                    self.scene.remove(node)
+
+    def select(self, *args, **kwargs):
+        pass
+
+    def sets(self, *args, **kwargs):
+        pass
+
+    def refresh(self, *args, **kwargs):
+        suspend = _flag(kwargs, 'suspend', 'su')
+        if _flag(kwargs, 'query', 'q'):
+            return self.scene.suspended
+        if suspend is not None:
+            self.scene.suspended = bool(suspend)
+
+    def makeIdentity(self, *args, **kwargs):
+        pass
+
+    def dgeval(self, *args, **kwargs):
+        pass
+
+    def addAttr(self, name, **kwargs):
+        long_name = _flag(kwargs, 'longName', 'ln')
+        for node_name in _as_list(name):
+            node = self.scene.get(node_name)
+            if long_name in node.attrs:
+                raise RuntimeError('Found more than one attribute named {}'.format(long_name))
+            node.attrs[long_name] = _flag(kwargs, 'defaultValue', 'dv', default=0.0)
+
+    def connectAttr(self, source, destination, **kwargs):
+        src = self.scene.split_plug(source)
+        dst = self.scene.split_plug(destination)
+        if dst in self.scene.connections and not _flag(kwargs, 'force', 'f'):
+            raise RuntimeError('{} is already connected'.format(destination))
+        self.scene.connect(src, dst)
+
+    def disconnectAttr(self, source, destination, **kwargs):
+        self.scene.disconnect(self.scene.split_plug(source), self.scene.split_plug(destination))
+
+    def setAttr(self, plug, *values, **kwargs):
+        node, attr = self.scene.split_plug(plug)
+        if values:
+            if attr in node.locked:
+                raise RuntimeError('The attribute {} is locked'.format(plug))
+            node.attrs[attr] = values[0] if len(values) == 1 else tuple(values)
+        lock = _flag(kwargs, 'lock', 'l')
+        if lock is not None:
+            (node.locked.add if lock else node.locked.discard)(attr)
+
+    def getAttr(self, plug, **kwargs):
+        node, attr = self.scene.split_plug(plug)
+        if _flag(kwargs, 'lock', 'l'):
+            return attr in node.locked
+        return self.scene.get_value(node, attr)
+
+    # Geometry ##########################################################################################
+
+    def pointPosition(self, component, **kwargs):
+        shape, i, j = self._components(component)[0]
+        return [float(x) for x in shape.data.cvs[i, j]]
+
+    def xform(self, *args, **kwargs):
+        names = list()
+        for arg in args:
+            names.extend(_as_list(arg))
+        if _flag(kwargs, 'query', 'q'):
+            result = list()
+            for name in names:
+                if _component_match(name):
+                    for shape, i, j in self._components(name):
+                        result.extend(float(x) for x in shape.data.cvs[i, j])
+                else:
+                    result.extend(self.scene.get_value(self.scene.get(name), 'translate') or (0.0, 0.0, 0.0))
+            return result
+        translation = _flag(kwargs, 'translation', 't')
+        if translation is not None:
+            for name in names:
+                self.move(translation[0], translation[1], translation[2], name)
+
+    def move(self, x, y, z, *args, **kwargs):
+        for name in args:
+            for item in _as_list(name):
+                if _component_match(item):
+                    for shape, i, j in self._components(item):
+                        shape.data.cvs[i, j] = (x, y, z)
+                else:
+                    self.scene.get(item).attrs['translate'] = (float(x), float(y), float(z))
+
+    def rebuildSurface(self, surface, **kwargs):
+        shape = self.scene.shape_data(self.scene.get(surface), 'nurbsSurface')
+        data = shape.data
+        degree_u = int(_flag(kwargs, 'degreeU', 'du', default=3))
+        degree_v = int(_flag(kwargs, 'degreeV', 'dv', default=3))
+        if _flag(kwargs, 'keepControlPoints', 'kcp'):
+            count_u, count_v = data.cvs.shape[:2]
+            cvs = data.cvs
+        else:
+            count_u = int(_flag(kwargs, 'spansU', 'su', default=4)) + degree_u
+            count_v = int(_flag(kwargs, 'spansV', 'sv', default=4)) + degree_v
+            # sample the old surface at the new cvs, exact for flat planes
+            params_u = nmath.greville_abscissae(nmath.open_uniform_knots(count_u, degree_u), degree_u)
+            params_v = nmath.greville_abscissae(nmath.open_uniform_knots(count_v, degree_v), degree_v)
+            lo_u, hi_u = nmath.knot_domain(data.knots_u, data.degree_u)
+            lo_v, hi_v = nmath.knot_domain(data.knots_v, data.degree_v)
+            grid_u, grid_v = np.meshgrid(lo_u + params_u * (hi_u - lo_u), lo_v + params_v * (hi_v - lo_v),
+                                         indexing='ij')
+            cvs = nmath.evaluate_surface(grid_u.ravel(), grid_v.ravel(), data.cvs, data.knots_u, data.knots_v,
+                                         data.degree_u, data.degree_v).reshape(count_u, count_v, 3)
+        shape.data = Surface(cvs, nmath.open_uniform_knots(count_u, degree_u),
+                             nmath.open_uniform_knots(count_v, degree_v), degree_u, degree_v)
+
+    def reverseSurface(self, surface, **kwargs):
+        shape = self.scene.shape_data(self.scene.get(surface), 'nurbsSurface')
+        data = shape.data
+        direction = _flag(kwargs, 'direction', 'd', default=0)
+        if direction == 3:
+            shape.data = Surface(data.cvs.transpose(1, 0, 2).copy(), data.knots_v, data.knots_u,
+                                 data.degree_v, data.degree_u)
+        elif direction == 0:
+            data.cvs = data.cvs[::-1].copy()
+        elif direction == 1:
+            data.cvs = data.cvs[:, ::-1].copy()
+
+    # Undo, refresh and messages ########################################################################
+
+    def undoInfo(self, **kwargs):
+        if _flag(kwargs, 'query', 'q'):
+            return self.scene.undo_state
+        state = _flag(kwargs, 'state', 'st', 'stateWithoutFlush', 'swf')
+        if state is not None:
+            self.scene.undo_state = bool(state)
+        if _flag(kwargs, 'openChunk', 'ock'):
+            self.scene.undo_chunks += 1
+        if _flag(kwargs, 'closeChunk', 'cck'):
+            self.scene.undo_chunks -= 1
+
+    def autoKeyframe(self, **kwargs):
+        if _flag(kwargs, 'query', 'q'):
+            return self.scene.auto_key
+        state = _flag(kwargs, 'state', 'st')
+        if state is not None:
+            self.scene.auto_key = bool(state)
+
+    def warning(self, *args, **kwargs):
+        pass
+
+    def error(self, message, **kwargs):
+        raise RuntimeError(message)
+
+
+#######################################################################################################
+''' maya.api.OpenMaya subset ''' ######################################################################
+#######################################################################################################
+
+class _MFn(object):
+    kDagNode = 'dagNode'
+    kNurbsSurface = 'nurbsSurface'
+    kNurbsCurve = 'nurbsCurve'
+    kMesh = 'mesh'
+    kSurfaceCVComponent = 'surfaceCV'
+    kMeshVertComponent = 'meshVertex'
+    kCurveCVComponent = 'curveCV'
+
+
+class _MSpace(object):
+    kObject = 2
+    kWorld = 4
+
+
+class _MFnNumericData(object):
+    kBoolean = 'bool'
+    kInt = 'long'
+    kFloat = 'float'
+    kDouble = 'double'
+
+
+class MPoint(object):
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+def build_api(scene):
+    """ maya.api.OpenMaya and maya.api.OpenMayaAnim stand-in modules bound to scene """
+    recorder = scene.recorder
+
+    class MObject(object):
+        def __init__(self, node=None):
+            self.node = node
+
+        def isNull(self):
+            return self.node is None or not self.node.alive
+
+        def hasFn(self, fn_type):
+            if self.node is None:
+                return False
+            if fn_type == _MFn.kDagNode:
+                return self.node.is_dag()
+            return self.node.type == fn_type
+
+    class MDagPath(MObject):
+        def partialPathName(self):
+            return self.node.name
+
+        def fullPathName(self):
+            return self.node.full_path()
+
+    class MPlug(object):
+        def __init__(self, node, attr):
+            self.node = node
+            self.attr = scene.attr_name(attr)
+
+        @property
+        def isNull(self):
+            return self.node is None
+
+        @property
+        def isLocked(self):
+            return self.attr in self.node.locked
+
+        @isLocked.setter
+        def isLocked(self, value):
+            (self.node.locked.add if value else self.node.locked.discard)(self.attr)
+
+        def elementByLogicalIndex(self, index):
+            return MPlug(self.node, '{}[{}]'.format(self.attr, index))
+
+        def child(self, attr):
+            return MPlug(self.node, '{}.{}'.format(self.attr, attr))
+
+        def key(self):
+            return (self.node, self.attr)
+
+        def name(self):
+            return '{}.{}'.format(self.node.name, self.attr)
+
+    class MSelectionList(object):
+        def __init__(self):
+            self.items = list()
+
+        def add(self, name):
+            self.items.append(str(name))
+            return self
+
+        def getDependNode(self, index):
+            return MObject(scene.get(self.items[index].split('.')[0]))
+
+        def getDagPath(self, index):
+            return MDagPath(scene.get(self.items[index].split('.')[0]))
+
+        def getPlug(self, index):
+            node, attr = scene.split_plug(self.items[index])
+            return MPlug(node, attr)
+
+    class MFnDependencyNode(object):
+        def __init__(self, obj):
+            self.node = obj.node
+
+        def name(self):
+            return self.node.name
+
+        def findPlug(self, attr, want_networked):
+            return MPlug(self.node, attr)
+
+        def attribute(self, attr):
+            return attr
+
+    class MFnDagNode(MFnDependencyNode):
+        def partialPathName(self):
+            return self.node.name
+
+        def setName(self, name):
+            scene.rename(self.node, name)
+            return self.node.name
+
+        def child(self, index):
+            return MObject(self.node.children[index])
+
+    class MFnNurbsSurface(object):
+        kOpen = 1
+
+        def __init__(self, obj=None):
+            recorder.record('api.MFnNurbsSurface')
+            self.data = obj.node.data if obj is not None else None
+
+        def create(self, cvs, knots_u, knots_v, degree_u, degree_v, form_u, form_v, rational, parent=None):
+            recorder.record('api.MFnNurbsSurface.create')
+            count_u = len(knots_u) - degree_u + 1
+            points = np.array([(p.x, p.y, p.z) for p in cvs], dtype=float).reshape(count_u, -1, 3)
+            transform = scene.create('transform', 'nurbsSurface1')
+            shape = scene.create('nurbsSurface', 'nurbsSurfaceShape1', transform)
+            shape.data = Surface(points, nmath.full_knots(list(knots_u)), nmath.full_knots(list(knots_v)),
+                                 degree_u, degree_v)
+            self.data = shape.data
+            return MObject(transform)
+
+        numCVsInU = property(lambda self: self.data.cvs.shape[0])
+        numCVsInV = property(lambda self: self.data.cvs.shape[1])
+        degreeInU = property(lambda self: self.data.degree_u)
+        degreeInV = property(lambda self: self.data.degree_v)
+
+        def cvPositions(self, space=_MSpace.kObject):
+            return [MPoint(*p) for p in self.data.cvs.reshape(-1, 3)]
+
+        def setCVPositions(self, points, space=_MSpace.kObject):
+            recorder.record('api.MFnNurbsSurface.setCVPositions')
+            self.data.cvs = np.array([(p.x, p.y, p.z) for p in points], dtype=float).reshape(self.data.cvs.shape)
+
+        def updateSurface(self):
+            pass
+
+        def knotsInU(self):
+            return list(self.data.knots_u[1:-1])
+
+        def knotsInV(self):
+            return list(self.data.knots_v[1:-1])
+
+    class MFnSingleIndexedComponent(object):
+        def __init__(self):
+            self.elements = list()
+
+        def create(self, component_type):
+            return self
+
+        def addElements(self, elements):
+            self.elements.extend(elements)
+
+    class MFnDoubleIndexedComponent(MFnSingleIndexedComponent):
+        def addElement(self, u, v):
+            self.elements.append((u, v))
+
+    class MFnAttribute(object):
+        def __init__(self):
+            self.name = None
+            self.default = None
+            self.keyable = False
+            self.array = False
+
+    class MFnMessageAttribute(MFnAttribute):
+        def create(self, long_name, short_name):
+            self.name = long_name
+            return self
+
+    class MFnNumericAttribute(MFnAttribute):
+        def create(self, long_name, short_name, data_type, default=0.0):
+            self.name = long_name
+            self.default = default
+            return self
+
+    class MDGModifier(object):
+        """ Queues closures, doIt runs the ones not run yet, undoIt reverts everything done """
+
+        def __init__(self):
+            self.queued = list()
+            self.done = list()
+
+        def _queue(self, do, undo):
+            self.queued.append((do, undo))
+
+        def createNode(self, node_type, parent=None):
+            node = Node(node_type + '1', node_type)
+            parent_node = parent.node if parent is not None else None
+            if node_type in SHAPE_TYPES and parent_node is None:
+                parent_node = Node('transform1', 'transform')
+                self._queue(lambda: scene.add(parent_node), lambda: scene.remove(parent_node))
+            self._queue(lambda: scene.add(node, parent_node), lambda: scene.remove(node))
+            return MObject(node)
+
+        def renameNode(self, obj, name):
+            old = [obj.node.name]
+
+            def do():
+                old[0] = obj.node.name
+                scene.rename(obj.node, name)
+            self._queue(do, lambda: scene.rename(obj.node, old[0]))
+
+        def reparentNode(self, obj, parent):
+            old = [obj.node.parent]
+
+            def do():
+                old[0] = obj.node.parent
+                scene.reparent(obj.node, parent.node)
+            self._queue(do, lambda: scene.reparent(obj.node, old[0]))
+
+        def connect(self, source, destination):
+            self._queue(lambda: scene.connect(source.key(), destination.key()),
+                        lambda: scene.disconnect(source.key(), destination.key()))
+
+        def addAttribute(self, obj, attr):
+            self._queue(lambda: obj.node.attrs.__setitem__(attr.name, attr.default),
+                        lambda: obj.node.attrs.pop(attr.name, None))
+
+        def _set(self, plug, value):
+            old = dict()
+
+            def do():
+                old.update(plug.node.attrs)
+                plug.node.attrs[plug.attr] = value
+
+            def undo():
+                plug.node.attrs.clear()
+                plug.node.attrs.update(old)
+            self._queue(do, undo)
+
+        newPlugValueBool = newPlugValueInt = newPlugValueDouble = newPlugValueString = _set
+
+        def doIt(self):
+            recorder.record('api.{}.doIt'.format(type(self).__name__))
+            while self.queued:
+                do, undo = self.queued.pop(0)
+                do()
+                self.done.append((do, undo))
+
+        def undoIt(self):
+            while self.done:
+                do, undo = self.done.pop()
+                undo()
+                self.queued.insert(0, (do, undo))
+
+    class MDagModifier(MDGModifier):
+        pass
+
+    class MPxCommand(object):
+        pass
+
+    class MPxNode(object):
+        # plugin nodes can't be registered, the classes only need to import
+        kDependNode = 0
+        kDeformerNode = 2
+
+    class MPxDeformerNode(MPxNode):
+        pass
+
+    class MTypeId(object):
+        def __init__(self, value):
+            self.value = value
+
+    class MFnPlugin(object):
+        def __init__(self, *args):
+            pass
+
+    class MMessage(object):
+        @staticmethod
+        def removeCallbacks(ids):
+            for callback_id in ids:
+                scene.listeners.pop(callback_id, None)
+
+    class MDGMessage(MMessage):
+        @staticmethod
+        def addNodeAddedCallback(function, node_type='dependNode', client_data=None):
+            return scene.listen('added', lambda node: function(MObject(node), client_data))
+
+        @staticmethod
+        def addNodeRemovedCallback(function, node_type='dependNode', client_data=None):
+            return scene.listen('removed', lambda node: function(MObject(node), client_data))
+
+    class MNodeMessage(MMessage):
+        @staticmethod
+        def addNameChangedCallback(obj, function, client_data=None):
+            # only the callback for every node (null MObject) is needed
+            return scene.listen('renamed', lambda node, old_name: function(MObject(node), old_name, client_data))
+
+    class MFnSkinCluster(object):
+        def __init__(self, obj):
+            self.node = obj.node
+
+        def influenceObjects(self):
+            return [MDagPath(inf) for inf in self.node.data['influences']]
+
+        def setWeights(self, dag_path, component, influence_indices, weights, normalize=True, return_old=False):
+            recorder.record('api.MFnSkinCluster.setWeights')
+            count = len(self.node.data['influences'])
+            rows = len(component.elements)
+            matrix = np.asarray(list(weights), dtype=float).reshape(rows, len(influence_indices))
+            if self.node.data['weights'] is None:
+                self.node.data['weights'] = dict()
+            for row, element in zip(matrix, component.elements):
+                full = np.zeros(count)
+                full[list(influence_indices)] = row
+                self.node.data['weights'][element] = full
+
+        def getWeights(self, dag_path, component):
+            count = len(self.node.data['influences'])
+            stored = self.node.data['weights'] or dict()
+            values = list()
+            for element in component.elements:
+                values.extend(stored.get(element, np.zeros(count)).tolist())
+            return values, count
+
+    om2 = types.ModuleType('maya.api.OpenMaya')
+    for name, value in (('MFn', _MFn), ('MSpace', _MSpace), ('MFnNumericData', _MFnNumericData),
+                        ('MPoint', MPoint), ('MObject', MObject), ('MDagPath', MDagPath), ('MPlug', MPlug),
+                        ('MSelectionList', MSelectionList), ('MFnDependencyNode', MFnDependencyNode),
+                        ('MFnDagNode', MFnDagNode), ('MFnNurbsSurface', MFnNurbsSurface),
+                        ('MFnSingleIndexedComponent', MFnSingleIndexedComponent),
+                        ('MFnDoubleIndexedComponent', MFnDoubleIndexedComponent),
+                        ('MFnMessageAttribute', MFnMessageAttribute), ('MFnNumericAttribute', MFnNumericAttribute),
+                        ('MDGModifier', MDGModifier), ('MDagModifier', MDagModifier), ('MPxCommand', MPxCommand),
+                        ('MPxNode', MPxNode), ('MTypeId', MTypeId), ('MMessage', MMessage),
+                        ('MDGMessage', MDGMessage), ('MNodeMessage', MNodeMessage),
+                        ('MFnPlugin', MFnPlugin), ('MIntArray', list), ('MDoubleArray', list),
+                        ('MPointArray', list)):
+        setattr(om2, name, value)
+
+    oma2 = types.ModuleType('maya.api.OpenMayaAnim')
+    oma2.MFnSkinCluster = MFnSkinCluster
+    oma2.MPxDeformerNode = MPxDeformerNode
+    return om2, oma2
+
+
+#######################################################################################################
+''' Install ''' #######################################################################################
+#######################################################################################################
+
+def make_cmds_module(scene):
+    module = types.ModuleType('maya.cmds')
+    commands = Cmds(scene)
+    for attr in dir(commands):
+        if attr.startswith('_'):
+            continue
+        setattr(module, attr, _counted(scene.recorder, attr, getattr(commands, attr)))
+    return module
+
+
+def _counted(recorder, command, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        recorder.record(command)
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def install():
+    """
+    Puts the stand-in modules in sys.modules (maya, maya.cmds, maya.mel, maya.api.OpenMaya, ...) and reload() in
+    builtins on python 3, so weighted_ribbon imports and runs against a new empty scene.
+    :return: Scene
+    """
+    scene = Scene()
+    cmds = make_cmds_module(scene)
+    om2, oma2 = build_api(scene)
+
+    mel = types.ModuleType('maya.mel')
+    mel.eval = _counted(scene.recorder, 'mel.eval', lambda *args, **kwargs: None)
+
+    maya = types.ModuleType('maya')
+    api = types.ModuleType('maya.api')
+    maya.cmds, maya.mel, maya.api = cmds, mel, api
+    api.OpenMaya, api.OpenMayaAnim = om2, oma2
+    # import only, xLib imports them at the top
+    maya.OpenMaya = types.ModuleType('maya.OpenMaya')
+    pymel = types.ModuleType('pymel')
+    pymel.core = types.ModuleType('pymel.core')
+
+    modules = {'maya': maya, 'maya.cmds': cmds, 'maya.mel': mel, 'maya.api': api,
+               'maya.api.OpenMaya': om2, 'maya.api.OpenMayaAnim': oma2, 'maya.OpenMaya': maya.OpenMaya,
+               'pymel': pymel, 'pymel.core': pymel.core}
+    for name, module in modules.items():
+        if name not in _SAVED_MODULES:
+            _SAVED_MODULES[name] = sys.modules.get(name)
+        sys.modules[name] = module
+
+    builtins = sys.modules.get('builtins') or sys.modules.get('__builtin__')
+    if not hasattr(builtins, 'reload'):
+        import importlib
+        builtins.reload = importlib.reload
+        _ADDED_BUILTINS.append('reload')
+
+    # modules already imported against another backend would keep it
+    for name in ('skin_weights', 'nurbs_utils', 'ribbon_layout', 'command_buffer', 'controlCurveShapes',
+                 'weighted_ribbon', 'xLib', 'build_transaction', 'name_registry', 'follicle_factory'):
+        sys.modules.pop(name, None)
+
+    return scene
+
+
+def uninstall():
+    """ Restores the modules install() replaced and removes the builtins it added """
+    for name, module in _SAVED_MODULES.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    _SAVED_MODULES.clear()
+
+    builtins = sys.modules.get('builtins') or sys.modules.get('__builtin__')
+    for name in _ADDED_BUILTINS:
+        if hasattr(builtins, name):
+            delattr(builtins, name)
+    del _ADDED_BUILTINS[:]
@@ -0,0 +1,339 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Deferred command buffer. Records node creation, parenting, attribute creation, connections and setAttrs
+       and runs all of them with a single MDagModifier.doIt(). The whole flush is one entry in the undo queue
+       (the commandBufferCommit command this file registers as a plugin) and the modifier is rolled back with
+       undoIt() if anything fails, so a builder never leaves half a rig in the scene.
+
+Usage:
+    import command_buffer
+    buf = command_buffer.CommandBuffer()
+    grp = buf.create_node('transform', 'follicles_grp')
+    fol = buf.create_node('transform', 'a_follicle', parent=grp)
+    shape = buf.create_node('follicle', 'a_follicleShape', parent=fol)
+    buf.connect('surface.local', (shape, 'inputSurface'))
+    buf.set_attr((shape, 'parameterU'), .5)
+    buf.flush()
+    print(str(fol))  # final name in the scene
+'''
+
+import numbers
+import re
+import sys
+import types
+
+import numpy as np
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+import name_registry
+
+
+def maya_useNewAPI():
+    pass
+
+
+COMMIT_COMMAND = 'commandBufferCommit'
+
+# Operations recorded and flushed by every buffer in this session, by kind
+totals = {'create': 0, 'parent': 0, 'add_attr': 0, 'connect': 0, 'set_attr': 0, 'flush': 0}
+
+# The plugin is loaded as a different module than the one builders import, both find the pending
+# transaction here
+_shared = sys.modules.setdefault('_command_buffer_shared', types.ModuleType('_command_buffer_shared'))
+_shared.pending = None
+
+_INDEX_RE = re.compile(r'^(\w+)\[(\d+)\]$')
+
+try:
+    _STRING_TYPES = (basestring,)
+except NameError:
+    _STRING_TYPES = (str,)
+
+
+class BufferedNode(object):
+    """ Node recorded in a CommandBuffer. str() gives the requested name before the flush and the real one after """
+    __slots__ = ('node_type', 'name', 'mobject')
+
+    def __init__(self, node_type, name):
+        self.node_type = node_type
+        self.name = name
+        self.mobject = None
+
+    def __str__(self):
+        if self.mobject is not None and not self.mobject.isNull():
+            if self.mobject.hasFn(om2.MFn.kDagNode):
+                return om2.MFnDagNode(self.mobject).partialPathName()
+            return om2.MFnDependencyNode(self.mobject).name()
+        return self.name
+
+    def __add__(self, other):
+        return str(self) + other
+
+    def __repr__(self):
+        return 'BufferedNode({!r}, {!r})'.format(self.node_type, str(self))
+
+
+class _Transaction(object):
+    """
+    What the commit command does and undoes. The first do_it queues the recorded operations on the modifier,
+    redo just runs the same modifier again.
+    """
+    __slots__ = ('operations', 'modifier', 'locks')
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.modifier = None
+        self.locks = list()
+
+    def do_it(self):
+        try:
+            if self.modifier is None:
+                self.modifier = om2.MDagModifier()
+                self.queue()
+            self.modifier.doIt()
+            for plug in self.locks:
+                plug.isLocked = True
+        except Exception:
+            self.undo_it()
+            raise
+
+    def undo_it(self):
+        if self.modifier is None:
+            return
+        for plug in self.locks:
+            if not plug.isNull:
+                plug.isLocked = False
+        self.modifier.undoIt()
+
+    def queue(self):
+        # plugs of attributes added in this same flush only exist after a doIt
+        added = set()
+        for op in self.operations:
+            kind = op[0]
+            if kind in ('connect', 'set_attr') and added:
+                names = set(_attr_key(plug) for plug in op[1:3] if isinstance(plug, tuple))
+                if names & added:
+                    self.modifier.doIt()
+                    added = set()
+            if kind == 'add_attr':
+                added.add((_node_key(op[1]), op[2]))
+            _QUEUE[kind](self.modifier, self.locks, *op[1:])
+            totals[kind] += 1
+
+
+def _node_key(node):
+    # recorded nodes by identity, existing ones by name
+    return id(node) if isinstance(node, BufferedNode) else node
+
+
+def _attr_key(plug):
+    node, attr = plug
+    return _node_key(node), attr.split('[')[0]
+
+
+class CommitCommand(om2.MPxCommand):
+    """ Puts the pending transaction in the undo queue """
+
+    def __init__(self):
+        om2.MPxCommand.__init__(self)
+        self.transaction = None
+
+    @staticmethod
+    def creator():
+        return CommitCommand()
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        self.transaction = _shared.pending
+        _shared.pending = None
+        self.redoIt()
+
+    def redoIt(self):
+        self.transaction.do_it()
+
+    def undoIt(self):
+        self.transaction.undo_it()
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin, 'Felipe Sanges', '1.0').registerCommand(COMMIT_COMMAND, CommitCommand.creator)
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterCommand(COMMIT_COMMAND)
+
+
+def load_plugin():
+    """ Loads this file as a plugin so flushes go to the undo queue, False if it can't be loaded """
+    path = __file__
+    if path.endswith('.pyc'):
+        path = path[:-1]
+    try:
+        if not mc.pluginInfo(path, q=True, loaded=True):
+            mc.loadPlugin(path, quiet=True)
+        return True
+    except RuntimeError:
+        return False
+
+
+_DAG_TYPES = dict()
+
+
+def is_dag_type(node_type):
+    if node_type not in _DAG_TYPES:
+        _DAG_TYPES[node_type] = 'dagNode' in (mc.nodeType(node_type, isTypeName=True, inherited=True) or [])
+    return _DAG_TYPES[node_type]
+
+
+def get_mobject(node):
+    """ MObject of an existing node name or of a flushed/recorded BufferedNode """
+    if isinstance(node, BufferedNode):
+        return node.mobject
+    sel = om2.MSelectionList()
+    sel.add(node)
+    return sel.getDependNode(0)
+
+
+class CommandBuffer(object):
+    """
+    Records scene edits and runs them in one MDagModifier.
+    Nodes are BufferedNode handles, plugs are 'node.attr' strings of existing nodes or (node, 'attr') tuples,
+    where attr can have indices and children: (node, 'worldMatrix[0]'), (node, 'wtMatrix[2].weightIn').
+    """
+
+    def __init__(self, undoable=True):
+        self.undoable = undoable
+        self.operations = list()
+        self.nodes = list()
+
+    def __len__(self):
+        return len(self.operations)
+
+    def create_node(self, node_type, name=None, parent=None):
+        """ parent: existing node name or BufferedNode, shapes need one """
+        node = BufferedNode(node_type, name or node_type)
+        self.operations.append(('create', node, parent))
+        self.nodes.append(node)
+        return node
+
+    def parent(self, node, parent):
+        self.operations.append(('parent', node, parent))
+
+    def add_attr(self, node, long_name, attribute_type='message', default_value=0.0, keyable=False, array=False):
+        """
+        attribute_type: 'message', 'double', 'float', 'long' or 'bool'
+        array: multi attribute, its elements are set and connected as (node, 'long_name[i]')
+        """
+        self.operations.append(('add_attr', node, long_name, attribute_type, default_value, keyable, array))
+
+    def connect(self, source, destination):
+        self.operations.append(('connect', source, destination))
+
+    def set_attr(self, plug, value, lock=False):
+        self.operations.append(('set_attr', plug, value, lock))
+
+    def flush(self):
+        """
+        Runs every recorded operation with one doIt and clears the buffer.
+        Everything is rolled back if an operation fails.
+        :return: list of the BufferedNodes created, now holding their MObjects
+        """
+        transaction = _Transaction(self.operations)
+        totals['flush'] += 1
+        if self.undoable and load_plugin():
+            _shared.pending = transaction
+            try:
+                getattr(mc, COMMIT_COMMAND)()
+            finally:
+                _shared.pending = None
+        else:
+            transaction.do_it()
+
+        nodes = self.nodes
+        self.operations = list()
+        self.nodes = list()
+        # catches the nodes Maya renamed on a name collision
+        name_registry.track_nodes(nodes)
+        return nodes
+
+
+#######################################################################################################
+''' Modifier operations ''' ###########################################################################
+#######################################################################################################
+
+def get_plug(plug):
+    """ MPlug from a 'node.attr' string or a (node, 'attr') tuple """
+    if not isinstance(plug, tuple):
+        sel = om2.MSelectionList()
+        sel.add(plug)
+        return sel.getPlug(0)
+
+    node, attr = plug
+    fn = om2.MFnDependencyNode(get_mobject(node))
+    result = None
+    for part in attr.split('.'):
+        match = _INDEX_RE.match(part)
+        name = match.group(1) if match else part
+        result = fn.findPlug(name, False) if result is None else result.child(fn.attribute(name))
+        if match:
+            result = result.elementByLogicalIndex(int(match.group(2)))
+    return result
+
+
+def _create(modifier, locks, node, parent):
+    if parent is not None:
+        node.mobject = modifier.createNode(node.node_type, get_mobject(parent))
+    elif is_dag_type(node.node_type):
+        node.mobject = modifier.createNode(node.node_type)
+    else:
+        node.mobject = om2.MDGModifier.createNode(modifier, node.node_type)
+    modifier.renameNode(node.mobject, node.name)
+
+
+def _parent(modifier, locks, node, parent):
+    modifier.reparentNode(get_mobject(node), get_mobject(parent))
+
+
+def _add_attr(modifier, locks, node, long_name, attribute_type, default_value, keyable, array):
+    if attribute_type == 'message':
+        fn_attr = om2.MFnMessageAttribute()
+        attr = fn_attr.create(long_name, long_name)
+    else:
+        numeric_types = {'double': om2.MFnNumericData.kDouble,
+                         'float': om2.MFnNumericData.kFloat,
+                         'long': om2.MFnNumericData.kInt,
+                         'bool': om2.MFnNumericData.kBoolean}
+        fn_attr = om2.MFnNumericAttribute()
+        attr = fn_attr.create(long_name, long_name, numeric_types[attribute_type], default_value)
+        fn_attr.keyable = keyable
+    fn_attr.array = array
+    modifier.addAttribute(get_mobject(node), attr)
+
+
+def _connect(modifier, locks, source, destination):
+    modifier.connect(get_plug(source), get_plug(destination))
+
+
+def _set_attr(modifier, locks, plug, value, lock):
+    plug = get_plug(plug)
+    # numpy scalars too, bools first since they are Integral
+    if isinstance(value, (bool, np.bool_)):
+        modifier.newPlugValueBool(plug, bool(value))
+    elif isinstance(value, numbers.Integral):
+        modifier.newPlugValueInt(plug, int(value))
+    elif isinstance(value, numbers.Real):
+        modifier.newPlugValueDouble(plug, float(value))
+    elif isinstance(value, _STRING_TYPES):
+        modifier.newPlugValueString(plug, value)
+    else:
+        raise TypeError('Can not set {} to {!r} ({})'.format(plug.name(), value, type(value).__name__))
+    if lock:
+        locks.append(plug)
+
+
+_QUEUE = {'create': _create, 'parent': _parent, 'add_attr': _add_attr, 'connect': _connect, 'set_attr': _set_attr}
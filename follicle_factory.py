@@ -0,0 +1,90 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Follicles in bulk. create_follicles makes every follicle of a nurbs surface or mesh (transform, shape,
+       connections and uvs) in one command_buffer flush, instead of two createNodes, four connectAttrs and a
+       few setAttrs per follicle. The group is looked up once, not inside the loop, in the build's
+       name_registry.
+
+Usage:
+    import follicle_factory
+    fols, shapes, grp = follicle_factory.create_follicles('ribbon_srf', [0.0, 0.5, 1.0], [0.5, 0.5, 0.5],
+                                                          ['a_fol', 'b_fol', 'c_fol'], group='ribbon_fol_grp')
+'''
+
+import maya.cmds as mc
+
+import command_buffer
+import name_registry
+
+# shape type: (geometry output, follicle input)
+INPUTS = {'nurbsSurface': ('local', 'inputSurface'),
+          'mesh': ('outMesh', 'inputMesh')}
+
+
+def get_input_shape(geometry):
+    """ First non intermediate nurbsSurface or mesh shape of geometry, or geometry itself if it's one """
+    if mc.nodeType(geometry) in INPUTS:
+        return geometry
+    shapes = mc.listRelatives(geometry, shapes=True, noIntermediate=True, fullPath=True) or list()
+    for shape in shapes:
+        if mc.nodeType(shape) in INPUTS:
+            return shape
+    mc.error('{} has no nurbsSurface or mesh shape'.format(geometry))
+
+
+def create_follicles(geometry, params_u, params_v, names, shape_names=None, group=None, rotate=True, hide=False,
+                     buf=None):
+    """
+    One follicle per uv, transforms and shapes come back in the order of the uvs
+    :param geometry: nurbs surface or mesh, transform or shape
+    :param params_u: normalized u of every follicle
+    :param params_v: normalized v of every follicle
+    :param names: follicle transform names
+    :param shape_names: follicle shape names, defaults to name + 'Shape'
+    :param group: parent of the follicles, created when it doesn't exist. None leaves them in the world
+    :param rotate: connect outRotate too
+    :param hide: hide and lock the visibility of the shapes
+    :param buf: command_buffer.CommandBuffer to record in, flushed here when not given
+    :return: (transforms, shapes, group), names when flushed here, BufferedNodes otherwise
+    """
+    names = list(names)
+    if shape_names is None:
+        shape_names = [name + 'Shape' for name in names]
+    if not len(params_u) == len(params_v) == len(names) == len(shape_names):
+        raise ValueError('{} u, {} v, {} names and {} shape names given'.format(
+            len(params_u), len(params_v), len(names), len(shape_names)))
+
+    flush = buf is None
+    if flush:
+        buf = command_buffer.CommandBuffer()
+
+    shape = get_input_shape(geometry)
+    output, input_attribute = INPUTS[mc.nodeType(shape)]
+    if group is not None and not name_registry.exists(str(group)):
+        group = buf.create_node('transform', group)
+
+    transforms = list()
+    shapes = list()
+    for u, v, name, shape_name in zip(params_u, params_v, names, shape_names):
+        fol = buf.create_node('transform', name, parent=group)
+        fols = buf.create_node('follicle', shape_name, parent=fol)
+        if hide:
+            buf.set_attr((fols, 'visibility'), False, lock=True)
+
+        buf.connect(shape + '.worldMatrix[0]', (fols, 'inputWorldMatrix'))
+        buf.connect('{}.{}'.format(shape, output), (fols, input_attribute))
+        buf.connect((fols, 'outTranslate'), (fol, 'translate'))
+        if rotate:
+            buf.connect((fols, 'outRotate'), (fol, 'rotate'))
+
+        buf.set_attr((fols, 'parameterU'), float(u))
+        buf.set_attr((fols, 'parameterV'), float(v))
+        transforms.append(fol)
+        shapes.append(fols)
+
+    if flush:
+        buf.flush()
+        return [str(fol) for fol in transforms], [str(fols) for fols in shapes], group and str(group)
+    return transforms, shapes, group
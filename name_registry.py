@@ -0,0 +1,179 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Build scoped index of node names. The scene's names are read once (a single ls) when a build starts and
+       kept up to date by node added / removed / renamed callbacks, so existence checks inside loops are
+       dictionary lookups instead of objExists calls. Unique names come out of templates in bulk, reserved until
+       the build ends so two builders can't hand out the same one.
+
+       Nodes created through command_buffer are tracked with the name they asked for. When Maya renames one on
+       a collision it lands in renames, and the build warns about it once when it ends.
+
+       BuildTransaction opens a registry for the outermost build. The module functions use the running registry
+       and fall back to plain objExists outside a build.
+
+Usage:
+    import name_registry
+    with name_registry.NameRegistry() as names:
+        if not names.exists('ribbon_fol_grp'):
+            ...
+        fol_names = names.unique_names('ribbon_follicle_{:02d}_n', 20)
+    print(names.renames)
+
+    name_registry.exists('ribbon_fol_grp')
+'''
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+# Running registries, the last one is used. Kept when the module is reloaded during a build
+try:
+    _active
+except NameError:
+    _active = list()
+
+
+class NameRegistry(object):
+
+    def __init__(self):
+        # short name : number of nodes using it
+        self.counts = dict()
+        self.reserved = set()
+        # names of the tracked nodes and (requested, actual) of the ones Maya renamed
+        self.created = list()
+        self.renames = list()
+        self.callback_ids = list()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+    def start(self):
+        self.counts = dict()
+        # unwrapped, so the profiler doesn't count it
+        for name in getattr(mc.ls, '__wrapped__', mc.ls)():
+            self._add(name)
+        self.callback_ids = [om2.MDGMessage.addNodeAddedCallback(self._node_added),
+                             om2.MDGMessage.addNodeRemovedCallback(self._node_removed),
+                             om2.MNodeMessage.addNameChangedCallback(om2.MObject(), self._name_changed)]
+        _active.append(self)
+
+    def stop(self):
+        if self.callback_ids:
+            om2.MMessage.removeCallbacks(self.callback_ids)
+        self.callback_ids = list()
+        if self in _active:
+            _active.remove(self)
+        if self.renames:
+            mc.warning('{} nodes were renamed on name collisions: {}'.format(
+                len(self.renames), ', '.join('{} -> {}'.format(*rename) for rename in self.renames[:10])))
+
+    # Index #############################################################################################
+
+    def _add(self, name):
+        name = name.split('|')[-1]
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _discard(self, name):
+        name = name.split('|')[-1]
+        count = self.counts.get(name, 0) - 1
+        if count > 0:
+            self.counts[name] = count
+        else:
+            self.counts.pop(name, None)
+
+    def _node_added(self, node, *args):
+        self._add(om2.MFnDependencyNode(node).name())
+
+    def _node_removed(self, node, *args):
+        self._discard(om2.MFnDependencyNode(node).name())
+
+    def _name_changed(self, node, previous_name, *args):
+        if previous_name:
+            self._discard(previous_name)
+        self._add(om2.MFnDependencyNode(node).name())
+
+    # Queries ###########################################################################################
+
+    def exists(self, name):
+        """ objExists as a lookup. Paths and plugs go to objExists """
+        name = str(name)
+        if '|' in name or '.' in name:
+            return mc.objExists(name)
+        return name in self.counts
+
+    def is_free(self, name):
+        return not self.exists(name) and name not in self.reserved
+
+    def unique_name(self, name):
+        """ name, or name with the next free number like Maya would rename it. Reserved until the build ends """
+        if not self.is_free(name):
+            base = name.rstrip('0123456789')
+            index = 1
+            while not self.is_free('{}{}'.format(base, index)):
+                index += 1
+            name = '{}{}'.format(base, index)
+        self.reserved.add(name)
+        return name
+
+    def unique_names(self, template, count, start=1):
+        """
+        count free names from a format template, ex. 'spine_{:02d}_jnt'. Indices already taken are skipped
+        :return: list of names, reserved until the build ends
+        """
+        names = list()
+        index = start
+        while len(names) < count:
+            name = template.format(index)
+            if self.is_free(name):
+                self.reserved.add(name)
+                names.append(name)
+            index += 1
+        return names
+
+    def track(self, requested, actual):
+        """ Records a node created during the build, and the rename when Maya didn't give it its name """
+        self.created.append(actual)
+        if actual.split('|')[-1] != requested.split('|')[-1]:
+            self.renames.append((requested, actual))
+
+
+def current():
+    """ Running NameRegistry, None outside a build """
+    return _active[-1] if _active else None
+
+
+def exists(name):
+    registry = current()
+    if registry is None:
+        return mc.objExists(str(name))
+    return registry.exists(name)
+
+
+def unique_names(template, count, start=1):
+    """ NameRegistry.unique_names of the running registry, outside a build only existing nodes are skipped """
+    registry = current()
+    if registry is None:
+        names = list()
+        index = start
+        while len(names) < count:
+            if not mc.objExists(template.format(index)):
+                names.append(template.format(index))
+            index += 1
+        return names
+    return registry.unique_names(template, count, start)
+
+
+def track_nodes(nodes):
+    """ Tracks flushed command_buffer nodes in the running registry, nodes created without a name are skipped """
+    registry = current()
+    if registry is None:
+        return
+    for node in nodes:
+        if node.name != node.node_type:
+            registry.track(node.name, str(node))
@@ -0,0 +1,694 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Vectorized NURBS math used by the rigging tools. Runs in plain python with NumPy, no Maya needed.
+       Knot vectors, basis functions and their derivatives, greville abscissae, knot insertion and refinement
+       matrices, and points, tangents, normals and frames of non rational curves and surfaces.
+
+Conventions:
+    - Knot vectors are "full" knot vectors (numCVs + degree + 1 values). Maya stores two knots less,
+      use full_knots() to convert them.
+    - Parameters are always passed as arrays, every function evaluates a whole batch in one pass.
+
+Usage:
+    import nurbs_math as nmath
+    knots = nmath.open_uniform_knots(6, 2)
+    basis = nmath.basis_matrix([0.0, 0.25, 1.0], knots, 2)
+    tangents = nmath.curve_tangents([0.0, 0.5], cvs, knots, 2)
+'''
+
+import numpy as np
+
+
+#######################################################################################################
+''' Knot vectors ''' ##################################################################################
+#######################################################################################################
+
+def open_uniform_knots(num_cvs, degree, domain=(0.0, 1.0)):
+    """
+    Clamped uniform knot vector, the one rebuildSurface/rebuildCurve creates with endKnots=1.
+    :param num_cvs: number of control points
+    :param degree: curve degree
+    :param domain: (start, end) parameter range
+    :return: numpy array with num_cvs + degree + 1 knots
+    """
+    spans = num_cvs - degree
+    if spans < 1:
+        raise ValueError('{} cvs are not enough for degree {}'.format(num_cvs, degree))
+    inner = np.linspace(domain[0], domain[1], spans + 1)
+    return np.concatenate([np.repeat(domain[0], degree), inner, np.repeat(domain[1], degree)])
+
+
+def full_knots(maya_knots):
+    """
+    Maya knot arrays skip the first and last knot. Pads them back so the vector can be used
+    with the functions in this module.
+    """
+    maya_knots = np.asarray(maya_knots, dtype=float)
+    return np.concatenate([maya_knots[:1], maya_knots, maya_knots[-1:]])
+
+
+def knot_domain(knots, degree):
+    """ Valid parameter range of a full knot vector. """
+    return knots[degree], knots[len(knots) - degree - 1]
+
+
+def normalize_params(params, knots, degree):
+    """ Parameters mapped to 0-1 over the knot domain, what follicles and pointOnSurfaceInfo(turnOnPercentage) use """
+    lo, hi = knot_domain(np.asarray(knots, dtype=float), degree)
+    return (np.asarray(params, dtype=float) - lo) / (hi - lo)
+
+
+def greville_abscissae(knots, degree):
+    """
+    Greville abscissae, the parameter each cv is "attached" to: the average of the degree knots following it.
+    For degree 1 (and uniform cv spacing built by rebuild) it's exactly the cv's parameter.
+    """
+    knots = np.asarray(knots, dtype=float)
+    num_cvs = len(knots) - degree - 1
+    if degree == 0:
+        return knots[:num_cvs].copy()
+    index = np.arange(num_cvs)[:, None] + 1 + np.arange(degree)[None, :]
+    return knots[index].mean(axis=1)
+
+
+#######################################################################################################
+''' Sparse matrix ''' #################################################################################
+#######################################################################################################
+
+class SparseMatrix(object):
+    """
+    Minimal coordinate (COO) sparse matrix. Basis matrices only have degree + 1 non zero values per row,
+    storing them sparse keeps big sample grids cheap. Maya doesn't ship scipy, so this covers what we need.
+    """
+    __slots__ = ('rows', 'cols', 'values', 'shape')
+
+    def __init__(self, rows, cols, values, shape):
+        self.rows = np.asarray(rows, dtype=int).ravel()
+        self.cols = np.asarray(cols, dtype=int).ravel()
+        self.values = np.asarray(values, dtype=float).ravel()
+        self.shape = (int(shape[0]), int(shape[1]))
+
+    @classmethod
+    def from_dense(cls, matrix, tolerance=0.0):
+        matrix = np.asarray(matrix, dtype=float)
+        rows, cols = np.nonzero(np.abs(matrix) > tolerance)
+        return cls(rows, cols, matrix[rows, cols], matrix.shape)
+
+    @property
+    def nnz(self):
+        return len(self.values)
+
+    def toarray(self):
+        dense = np.zeros(self.shape)
+        np.add.at(dense, (self.rows, self.cols), self.values)
+        return dense
+
+    def dot(self, other):
+        """ Sparse x dense product """
+        other = np.asarray(other, dtype=float)
+        out = np.zeros((self.shape[0],) + other.shape[1:])
+        np.add.at(out, self.rows, self.values.reshape((-1,) + (1,) * (other.ndim - 1)) * other[self.cols])
+        return out
+
+    def transpose(self):
+        return SparseMatrix(self.cols, self.rows, self.values, (self.shape[1], self.shape[0]))
+
+    T = property(transpose)
+
+    def column(self, index):
+        """ Dense copy of one column """
+        out = np.zeros(self.shape[0])
+        mask = self.cols == index
+        np.add.at(out, self.rows[mask], self.values[mask])
+        return out
+
+
+def sparse_kron(a, b):
+    """
+    Kronecker product of two SparseMatrix. Used to build surface bases from the two curve bases.
+    """
+    rows = (a.rows[:, None] * b.shape[0] + b.rows[None, :]).ravel()
+    cols = (a.cols[:, None] * b.shape[1] + b.cols[None, :]).ravel()
+    values = (a.values[:, None] * b.values[None, :]).ravel()
+    return SparseMatrix(rows, cols, values, (a.shape[0] * b.shape[0], a.shape[1] * b.shape[1]))
+
+
+#######################################################################################################
+''' Basis functions ''' ###############################################################################
+#######################################################################################################
+
+def find_spans(params, knots, degree):
+    """
+    Knot span index for every parameter (The NURBS Book A2.1, vectorized).
+    """
+    params = np.atleast_1d(np.asarray(params, dtype=float))
+    last_cv = len(knots) - degree - 2
+    spans = np.searchsorted(knots, params, side='right') - 1
+    return np.clip(spans, degree, last_cv)
+
+
+def basis_functions(params, knots, degree):
+    """
+    Non zero basis functions for a batch of parameters (The NURBS Book A2.2, vectorized).
+    :return: (spans, values) - values is (len(params), degree + 1), values[k, r] is the weight of
+             cv spans[k] - degree + r
+    """
+    params = np.atleast_1d(np.asarray(params, dtype=float))
+    knots = np.asarray(knots, dtype=float)
+    lo, hi = knot_domain(knots, degree)
+    params = np.clip(params, lo, hi)
+    spans = find_spans(params, knots, degree)
+
+    count = len(params)
+    values = np.zeros((count, degree + 1))
+    values[:, 0] = 1.0
+    left = np.zeros((count, degree + 1))
+    right = np.zeros((count, degree + 1))
+
+    for j in range(1, degree + 1):
+        left[:, j] = params - knots[spans + 1 - j]
+        right[:, j] = knots[spans + j] - params
+        saved = np.zeros(count)
+        for r in range(j):
+            denom = right[:, r + 1] + left[:, j - r]
+            temp = np.where(denom != 0.0, values[:, r] / np.where(denom != 0.0, denom, 1.0), 0.0)
+            values[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        values[:, j] = saved
+
+    return spans, values
+
+
+def _divide(numerator, denominator):
+    """ numerator / denominator, 0.0 where the denominator is 0 (0/0 = 0 convention of repeated knots) """
+    valid = denominator != 0.0
+    return np.where(valid, numerator / np.where(valid, denominator, 1.0), 0.0)
+
+
+def _normalize(vectors):
+    length = np.sqrt((vectors * vectors).sum(axis=1))[:, None]
+    return vectors / np.where(length > 1e-12, length, 1.0)
+
+
+def basis_function_derivatives(params, knots, degree, order=1):
+    """
+    Non zero basis functions and their derivatives for a batch of parameters (The NURBS Book A2.3, vectorized).
+    :param order: highest derivative, derivatives over the degree are 0
+    :return: (spans, derivatives) - derivatives is (len(params), order + 1, degree + 1), derivatives[k, d, r] is
+             the d-th derivative of the basis function of cv spans[k] - degree + r. d = 0 matches basis_functions.
+    """
+    params = np.atleast_1d(np.asarray(params, dtype=float))
+    knots = np.asarray(knots, dtype=float)
+    lo, hi = knot_domain(knots, degree)
+    params = np.clip(params, lo, hi)
+    spans = find_spans(params, knots, degree)
+    count = len(params)
+
+    # ndu[:, r, j] with r <= j holds the basis functions of degree j, r > j the knot differences
+    ndu = np.zeros((count, degree + 1, degree + 1))
+    ndu[:, 0, 0] = 1.0
+    left = np.zeros((count, degree + 1))
+    right = np.zeros((count, degree + 1))
+    for j in range(1, degree + 1):
+        left[:, j] = params - knots[spans + 1 - j]
+        right[:, j] = knots[spans + j] - params
+        saved = np.zeros(count)
+        for r in range(j):
+            ndu[:, j, r] = right[:, r + 1] + left[:, j - r]
+            temp = _divide(ndu[:, r, j - 1], ndu[:, j, r])
+            ndu[:, r, j] = saved + right[:, r + 1] * temp
+            saved = left[:, j - r] * temp
+        ndu[:, j, j] = saved
+
+    derivatives = np.zeros((count, order + 1, degree + 1))
+    derivatives[:, 0, :] = ndu[:, :, degree]
+    top = min(order, degree)
+    for r in range(degree + 1):
+        a = np.zeros((2, count, degree + 1))
+        a[0, :, 0] = 1.0
+        s1, s2 = 0, 1
+        for k in range(1, top + 1):
+            d = np.zeros(count)
+            rk = r - k
+            pk = degree - k
+            if r >= k:
+                a[s2, :, 0] = _divide(a[s1, :, 0], ndu[:, pk + 1, rk])
+                d += a[s2, :, 0] * ndu[:, rk, pk]
+            j1 = 1 if rk >= -1 else -rk
+            j2 = k - 1 if r - 1 <= pk else degree - r
+            for j in range(j1, j2 + 1):
+                a[s2, :, j] = _divide(a[s1, :, j] - a[s1, :, j - 1], ndu[:, pk + 1, rk + j])
+                d += a[s2, :, j] * ndu[:, rk + j, pk]
+            if r <= pk:
+                a[s2, :, k] = _divide(-a[s1, :, k - 1], ndu[:, pk + 1, r])
+                d += a[s2, :, k] * ndu[:, r, pk]
+            derivatives[:, k, r] = d
+            s1, s2 = s2, s1
+
+    factor = degree
+    for k in range(1, top + 1):
+        derivatives[:, k, :] *= factor
+        factor *= degree - k
+    return spans, derivatives
+
+
+def basis_matrix(params, knots, degree):
+    """
+    Dense (len(params) x numCVs) basis matrix. Row k holds the weight of every cv at params[k].
+    """
+    spans, values = basis_functions(params, knots, degree)
+    num_cvs = len(knots) - degree - 1
+    matrix = np.zeros((len(spans), num_cvs))
+    rows = np.arange(len(spans))[:, None]
+    cols = spans[:, None] - degree + np.arange(degree + 1)[None, :]
+    matrix[rows, cols] = values
+    return matrix
+
+
+def basis_matrix_sparse(params, knots, degree):
+    """
+    Same as basis_matrix() but returns a SparseMatrix, only the degree + 1 non zero values per row are stored.
+    """
+    spans, values = basis_functions(params, knots, degree)
+    num_cvs = len(knots) - degree - 1
+    rows = np.repeat(np.arange(len(spans)), degree + 1)
+    cols = (spans[:, None] - degree + np.arange(degree + 1)[None, :]).ravel()
+    return SparseMatrix(rows, cols, values.ravel(), (len(spans), num_cvs))
+
+
+def grid_basis_matrix(sample_count_u, sample_count_v, cv_count_u, cv_count_v, degree=3):
+    """
+    (samples x cvs) basis of a uniform sample grid over a uniform cv grid, same weights
+    matrix_spline.pointOnSurfaceWeights gives for every sample. weight_cache.grid_basis_matrix caches it.
+
+    Layout (matches matrix_spline and nurbs_weights_to_skin):
+        - cv column  = i * cv_count_v + j, the cvs are a cv_count_u list of rows holding cv_count_v cvs
+        - sample row = sv * sample_count_u + su, sample (su / (sample_count_u - 1), sv / (sample_count_v - 1))
+        - rows of cvs are evaluated at the u parameter, the list of rows at the v parameter
+    The degree is clamped to the number of cvs - 1 in each direction.
+    :return: SparseMatrix
+    """
+    def uniform_samples(count):
+        if count < 2:
+            return np.zeros(max(count, 1))
+        return np.linspace(0.0, 1.0, count)
+
+    degree_row = min(degree, cv_count_v - 1)
+    degree_col = min(degree, cv_count_u - 1)
+    row_basis = basis_matrix_sparse(uniform_samples(sample_count_u),
+                                    open_uniform_knots(cv_count_v, degree_row), degree_row)
+    col_basis = basis_matrix_sparse(uniform_samples(sample_count_v),
+                                    open_uniform_knots(cv_count_u, degree_col), degree_col)
+    return sparse_kron(col_basis, row_basis)
+
+
+#######################################################################################################
+''' Refinement ''' ####################################################################################
+#######################################################################################################
+
+def knot_difference(knots, fine_knots, tolerance=1e-9):
+    """
+    Knots of fine_knots missing in knots (multiset difference). Returns None if knots is not
+    contained in fine_knots, meaning the fine space can't represent the coarse one by insertion.
+    """
+    remaining = list(np.asarray(fine_knots, dtype=float))
+    for k in np.asarray(knots, dtype=float):
+        match = [i for i, f in enumerate(remaining) if abs(f - k) <= tolerance]
+        if not match:
+            return None
+        remaining.pop(match[0])
+    return np.array(remaining)
+
+
+def knot_insertion_matrix(knots, degree, new_knots):
+    """
+    Exact refinement matrix for inserting new_knots into a curve (Boehm insertion, one knot at a time).
+    :return: (numCVs + len(new_knots), numCVs) matrix T, refined cvs = T.dot(cvs)
+    """
+    knots = np.asarray(knots, dtype=float)
+    num_cvs = len(knots) - degree - 1
+    matrix = np.eye(num_cvs)
+
+    for t in np.sort(np.asarray(new_knots, dtype=float)):
+        n = len(knots) - degree - 1
+        k = int(find_spans([t], knots, degree)[0])
+        step = np.zeros((n + 1, n))
+        for i in range(n + 1):
+            if i <= k - degree:
+                step[i, i] = 1.0
+            elif i >= k + 1:
+                step[i, i - 1] = 1.0
+            else:
+                denom = knots[i + degree] - knots[i]
+                alpha = (t - knots[i]) / denom if denom != 0.0 else 0.0
+                step[i, i] = alpha
+                step[i, i - 1] = 1.0 - alpha
+        matrix = step.dot(matrix)
+        knots = np.insert(knots, k + 1, t)
+
+    return matrix
+
+
+def refinement_matrix(knots, degree, fine_knots, fine_degree, samples_per_span=8):
+    """
+    Matrix T that expresses a curve (knots, degree) with the cvs of a finer curve (fine_knots, fine_degree):
+    fine_cvs = T.dot(cvs).
+        - Same degree and nested knots: exact Oslo/Boehm knot insertion.
+        - Otherwise the coarse basis is projected on the fine one with least squares. That is still exact
+          whenever the fine space contains the coarse one (degree elevation plus nested knots), and the
+          closest fit when it doesn't. A fit can have small negative weights, those are clipped and the rows
+          renormalized so the matrix stays usable as skin weights.
+    :return: (fineCVs, CVs) numpy array, no negative values, rows sum to 1.0
+    """
+    knots = np.asarray(knots, dtype=float)
+    fine_knots = np.asarray(fine_knots, dtype=float)
+
+    if degree == fine_degree:
+        new_knots = knot_difference(knots, fine_knots)
+        if new_knots is not None:
+            return knot_insertion_matrix(knots, degree, new_knots)
+
+    lo, hi = knot_domain(fine_knots, fine_degree)
+    breaks = np.unique(np.concatenate([knots[degree:len(knots) - degree],
+                                       fine_knots[fine_degree:len(fine_knots) - fine_degree]]))
+    params = np.unique(np.concatenate([np.linspace(a, b, samples_per_span + 1)
+                                       for a, b in zip(breaks[:-1], breaks[1:])] + [[lo, hi]]))
+    fine_basis = basis_matrix(params, fine_knots, fine_degree)
+    coarse_basis = basis_matrix(params, knots, degree)
+    matrix = np.linalg.lstsq(fine_basis, coarse_basis, rcond=None)[0]
+    # clean numerical noise so exact zeros stay sparse, non nested spans overshoot below zero
+    matrix[matrix < 1e-12] = 0.0
+    totals = matrix.sum(axis=1)
+    return matrix / np.where(totals > 0.0, totals, 1.0)[:, None]
+
+
+#######################################################################################################
+''' Curves ''' ########################################################################################
+#######################################################################################################
+
+def evaluate_curve(params, cvs, knots, degree):
+    """
+    Points on a non rational curve for a batch of parameters.
+    :param cvs: (numCVs, dim) array
+    :return: (len(params), dim) array
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    spans, values = basis_functions(params, knots, degree)
+    index = spans[:, None] - degree + np.arange(degree + 1)[None, :]
+    return np.einsum('kr,krd->kd', values, cvs[index])
+
+
+def derivative_curve(cvs, knots, degree):
+    """
+    Control points, knots and degree of the first derivative (hodograph) of a curve.
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    knots = np.asarray(knots, dtype=float)
+    if degree == 0:
+        # constant zero, single cv over the whole domain
+        return np.zeros_like(cvs[:1]), knots[[0, -1]], 0
+    delta = knots[degree + 1:degree + len(cvs)] - knots[1:len(cvs)]
+    delta = np.where(delta != 0.0, delta, 1.0)
+    d_cvs = degree * (cvs[1:] - cvs[:-1]) / delta[:, None]
+    return d_cvs, knots[1:-1], degree - 1
+
+
+def curve_derivatives(params, cvs, knots, degree, order=1):
+    """
+    Points and derivatives of a non rational curve in one pass over the basis.
+    :return: (order + 1, len(params), dim) array, [0] are the points, [1] the first derivatives...
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    spans, derivatives = basis_function_derivatives(params, knots, degree, order)
+    index = spans[:, None] - degree + np.arange(degree + 1)[None, :]
+    return np.einsum('kdr,krx->dkx', derivatives, cvs[index])
+
+
+def curve_tangents(params, cvs, knots, degree):
+    """ Unit tangents of a curve, (len(params), dim) """
+    return _normalize(curve_derivatives(params, cvs, knots, degree)[1])
+
+
+def curve_normals(params, cvs, knots, degree):
+    """
+    Unit principal normals of a 3d curve (second derivative without its tangent part), (len(params), 3).
+    Zero where the curve is straight.
+    """
+    points, first, second = curve_derivatives(params, cvs, knots, degree, order=2)
+    tangents = _normalize(first)
+    return _normalize(second - (second * tangents).sum(axis=1)[:, None] * tangents)
+
+
+def closest_params_on_curve(points, cvs, knots, degree, samples=None, iterations=8):
+    """
+    Parameter of the closest point on the curve for every point in one batch.
+    Seeds from a dense sampling of the curve and refines with Newton's method.
+    :param points: (N, 3) array
+    :param samples: number of seed samples, defaults to 8 per cv
+    :return: (N,) array of parameters
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    cvs = np.asarray(cvs, dtype=float)
+    knots = np.asarray(knots, dtype=float)
+    lo, hi = knot_domain(knots, degree)
+
+    if samples is None:
+        samples = max(len(cvs) * 8, 16)
+    seeds = np.linspace(lo, hi, samples)
+    seed_points = evaluate_curve(seeds, cvs, knots, degree)
+
+    # Coarse pass, (N x samples) distances are computed in chunks to keep memory flat on big meshes
+    params = np.empty(len(points))
+    chunk = max(1, 2 ** 22 // samples)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        dist = ((block[:, None, :] - seed_points[None, :, :]) ** 2).sum(axis=2)
+        params[start:start + chunk] = seeds[np.argmin(dist, axis=1)]
+
+    d1_cvs, d1_knots, d1_degree = derivative_curve(cvs, knots, degree)
+    d2_cvs, d2_knots, d2_degree = derivative_curve(d1_cvs, d1_knots, d1_degree)
+
+    for i in range(iterations):
+        diff = evaluate_curve(params, cvs, knots, degree) - points
+        d1 = evaluate_curve(params, d1_cvs, d1_knots, d1_degree)
+        d2 = evaluate_curve(params, d2_cvs, d2_knots, d2_degree)
+        numerator = (diff * d1).sum(axis=1)
+        denominator = (d2 * diff).sum(axis=1) + (d1 * d1).sum(axis=1)
+        step = np.where(np.abs(denominator) > 1e-12, numerator / np.where(denominator != 0.0, denominator, 1.0), 0.0)
+        params = np.clip(params - step, lo, hi)
+
+    return params
+
+
+def params_at_values(values, coefficients, knots, degree, iterations=60):
+    """
+    Inverse of a monotonic scalar spline: parameters where sum(N_i(t) * coefficients[i]) == values.
+    Vectorized bisection, used to find where a cv coordinate sits on a flat uniform plane.
+    :param values: targets, clamped to the spline range
+    :param coefficients: (numCVs,) increasing or decreasing scalar cvs
+    :return: numpy array of parameters
+    """
+    values = np.atleast_1d(np.asarray(values, dtype=float))
+    coefficients = np.asarray(coefficients, dtype=float)
+    lo, hi = knot_domain(np.asarray(knots, dtype=float), degree)
+
+    sign = 1.0 if coefficients[-1] >= coefficients[0] else -1.0
+    coefficients = coefficients * sign
+    values = np.clip(values * sign, coefficients.min(), coefficients.max())
+
+    low = np.full(len(values), lo)
+    high = np.full(len(values), hi)
+    for i in range(iterations):
+        mid = (low + high) * 0.5
+        below = evaluate_curve(mid, coefficients[:, None], knots, degree)[:, 0] < values
+        low = np.where(below, mid, low)
+        high = np.where(below, high, mid)
+    return (low + high) * 0.5
+
+
+#######################################################################################################
+''' Surfaces ''' ######################################################################################
+#######################################################################################################
+
+def evaluate_surface(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v):
+    """
+    Points on a non rational surface for a batch of (u, v) pairs.
+    :param cvs: (numCVsU, numCVsV, dim) array, u major like MFnNurbsSurface.cvPositions
+    :return: (len(params_u), dim) array
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    spans_u, values_u = basis_functions(params_u, knots_u, degree_u)
+    spans_v, values_v = basis_functions(params_v, knots_v, degree_v)
+    index_u = spans_u[:, None] - degree_u + np.arange(degree_u + 1)[None, :]
+    index_v = spans_v[:, None] - degree_v + np.arange(degree_v + 1)[None, :]
+    patch = cvs[index_u[:, :, None], index_v[:, None, :]]
+    return np.einsum('ka,kb,kabd->kd', values_u, values_v, patch)
+
+
+def derivative_surface(cvs, knots_u, knots_v, degree_u, degree_v, direction='u'):
+    """
+    First derivative surface in u or v, same arguments order it takes so calls can be chained.
+    :return: (cvs, knots_u, knots_v, degree_u, degree_v)
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    count_u, count_v = cvs.shape[:2]
+    if direction == 'u':
+        d_cvs, d_knots, d_degree = derivative_curve(cvs.reshape(count_u, -1), knots_u, degree_u)
+        return d_cvs.reshape(len(d_cvs), count_v, -1), d_knots, knots_v, d_degree, degree_v
+    d_cvs, d_knots, d_degree = derivative_curve(cvs.transpose(1, 0, 2).reshape(count_v, -1), knots_v, degree_v)
+    return d_cvs.reshape(len(d_cvs), count_u, -1).transpose(1, 0, 2), knots_u, d_knots, degree_u, d_degree
+
+
+def surface_derivatives(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v):
+    """
+    Points and first partial derivatives of a non rational surface in one pass over the basis.
+    :return: (points, d/du, d/dv), (len(params_u), dim) arrays each
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    spans_u, ders_u = basis_function_derivatives(params_u, knots_u, degree_u)
+    spans_v, ders_v = basis_function_derivatives(params_v, knots_v, degree_v)
+    index_u = spans_u[:, None] - degree_u + np.arange(degree_u + 1)[None, :]
+    index_v = spans_v[:, None] - degree_v + np.arange(degree_v + 1)[None, :]
+    patch = cvs[index_u[:, :, None], index_v[:, None, :]]
+    points = np.einsum('ka,kb,kabd->kd', ders_u[:, 0], ders_v[:, 0], patch)
+    d_u = np.einsum('ka,kb,kabd->kd', ders_u[:, 1], ders_v[:, 0], patch)
+    d_v = np.einsum('ka,kb,kabd->kd', ders_u[:, 0], ders_v[:, 1], patch)
+    return points, d_u, d_v
+
+
+def surface_tangents(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v):
+    """ Unit tangents in u and in v, ((N, 3), (N, 3)). Parameters in knot space like evaluate_surface """
+    points, d_u, d_v = surface_derivatives(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v)
+    return _normalize(d_u), _normalize(d_v)
+
+
+def surface_normals(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v):
+    """ Unit normals (dU x dV), (N, 3). Parameters in knot space like evaluate_surface """
+    points, d_u, d_v = surface_derivatives(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v)
+    return _normalize(np.cross(d_u, d_v))
+
+
+def surface_frames(params_u, params_v, cvs, knots_u, knots_v, degree_u, degree_v):
+    """
+    Frames on a non rational surface at normalized (0-1, like follicles) uvs.
+    x along dU, z along the normal (dU x dV), y = z x x.
+    :param cvs: (numCVsU, numCVsV, 3) array
+    :return: (N, 4, 4) row vector matrices, translation in the last row like MMatrix
+    """
+    lo_u, hi_u = knot_domain(np.asarray(knots_u, dtype=float), degree_u)
+    lo_v, hi_v = knot_domain(np.asarray(knots_v, dtype=float), degree_v)
+    u = lo_u + np.asarray(params_u, dtype=float) * (hi_u - lo_u)
+    v = lo_v + np.asarray(params_v, dtype=float) * (hi_v - lo_v)
+
+    points, d_u, d_v = surface_derivatives(u, v, cvs, knots_u, knots_v, degree_u, degree_v)
+
+    x = _normalize(d_u)
+    z = _normalize(np.cross(d_u, d_v))
+    frames = np.zeros((len(points), 4, 4))
+    frames[:, 0, :3] = x
+    frames[:, 1, :3] = np.cross(z, x)
+    frames[:, 2, :3] = z
+    frames[:, 3, :3] = points
+    frames[:, 3, 3] = 1.0
+    return frames
+
+
+def closest_params_on_surface(points, cvs, knots_u, knots_v, degree_u, degree_v, samples=None, iterations=10):
+    """
+    (u, v) of the closest point on the surface for every point in one batch.
+    Seeds from a coarse grid of surface samples and refines with a vectorized Newton projection
+    (The NURBS Book 6.1). Non rational surfaces only.
+    :param points: (N, 3) array
+    :param cvs: (numCVsU, numCVsV, 3) array
+    :param samples: (samples u, samples v) of the seed grid, defaults to 4 per cv
+    :return: ((N,) params u, (N,) params v), in knot space
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    cvs = np.asarray(cvs, dtype=float)
+    knots_u = np.asarray(knots_u, dtype=float)
+    knots_v = np.asarray(knots_v, dtype=float)
+    surface = (cvs, knots_u, knots_v, degree_u, degree_v)
+    lo_u, hi_u = knot_domain(knots_u, degree_u)
+    lo_v, hi_v = knot_domain(knots_v, degree_v)
+
+    if samples is None:
+        samples = (max(cvs.shape[0] * 4, 8), max(cvs.shape[1] * 4, 8))
+    seed_u, seed_v = np.meshgrid(np.linspace(lo_u, hi_u, samples[0]), np.linspace(lo_v, hi_v, samples[1]),
+                                 indexing='ij')
+    seed_u = seed_u.ravel()
+    seed_v = seed_v.ravel()
+    seed_points = evaluate_surface(seed_u, seed_v, *surface)
+
+    # Coarse pass, chunked like closest_params_on_curve
+    params_u = np.empty(len(points))
+    params_v = np.empty(len(points))
+    chunk = max(1, 2 ** 22 // len(seed_u))
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        dist = ((block[:, None, :] - seed_points[None, :, :]) ** 2).sum(axis=2)
+        nearest = np.argmin(dist, axis=1)
+        params_u[start:start + chunk] = seed_u[nearest]
+        params_v[start:start + chunk] = seed_v[nearest]
+
+    d_u = derivative_surface(*surface, direction='u')
+    d_v = derivative_surface(*surface, direction='v')
+    d_uu = derivative_surface(*d_u, direction='u')
+    d_uv = derivative_surface(*d_u, direction='v')
+    d_vv = derivative_surface(*d_v, direction='v')
+
+    for i in range(iterations):
+        diff = evaluate_surface(params_u, params_v, *surface) - points
+        su = evaluate_surface(params_u, params_v, *d_u)
+        sv = evaluate_surface(params_u, params_v, *d_v)
+        suu = evaluate_surface(params_u, params_v, *d_uu)
+        suv = evaluate_surface(params_u, params_v, *d_uv)
+        svv = evaluate_surface(params_u, params_v, *d_vv)
+
+        f = (diff * su).sum(axis=1)
+        g = (diff * sv).sum(axis=1)
+        a = (su * su).sum(axis=1) + (diff * suu).sum(axis=1)
+        b = (su * sv).sum(axis=1) + (diff * suv).sum(axis=1)
+        c = (sv * sv).sum(axis=1) + (diff * svv).sum(axis=1)
+
+        det = a * c - b * b
+        valid = np.abs(det) > 1e-12
+        det = np.where(valid, det, 1.0)
+        params_u = np.clip(params_u - np.where(valid, (c * f - b * g) / det, 0.0), lo_u, hi_u)
+        params_v = np.clip(params_v - np.where(valid, (a * g - b * f) / det, 0.0), lo_v, hi_v)
+
+    return params_u, params_v
+
+
+#######################################################################################################
+''' Deformer weights ''' ##############################################################################
+#######################################################################################################
+
+def wire_falloff(ratio):
+    """
+    Smooth falloff used by the wire deformer: 1.0 on the wire, 0.0 at the dropoff distance.
+    :param ratio: distance / dropoffDistance
+    """
+    ratio = np.clip(np.asarray(ratio, dtype=float), 0.0, 1.0)
+    return 1.0 - ratio * ratio * (3.0 - 2.0 * ratio)
+
+
+def wire_weights(points, cvs, knots, degree, cv_influences, dropoff_distance):
+    """
+    Weights a wire deformer gives to each influence that moves the wire curve.
+    Same values wire_to_skinCluster used to measure by moving every joint and querying pointPosition.
+    :param points: (N, 3) deformed points
+    :param cvs: (numCVs, 3) wire curve cvs
+    :param cv_influences: (numCVs, numInfluences) skin weights of the wire curve
+    :param dropoff_distance: wire dropoffDistance
+    :return: (N, numInfluences) array
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    params = closest_params_on_curve(points, cvs, knots, degree)
+    closest = evaluate_curve(params, cvs, knots, degree)
+    distance = np.sqrt(((points - closest) ** 2).sum(axis=1))
+    falloff = wire_falloff(distance / float(dropoff_distance))
+
+    basis = basis_matrix(params, knots, degree)
+    return falloff[:, None] * basis.dot(np.asarray(cv_influences, dtype=float))
@@ -0,0 +1,120 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Maya side of nurbs_math. Reads nurbs data from the scene in one API call per shape and
+       returns NumPy arrays ready for the vectorized math, or writes arrays back.
+
+Usage:
+    cvs, knots, degree = nurbs_utils.get_curve_data('spine_crv')
+    cvs, knots_u, knots_v, degree_u, degree_v = nurbs_utils.get_surface_data('face_srf')
+    nurbs_utils.set_surface_cvs('face_srfShapeOrig', cvs)
+    surface = nurbs_utils.create_surface(cvs, knots_u, knots_v, degree_u, degree_v, name='copy_srf')
+'''
+
+import numpy as np
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+import nurbs_math as nmath
+
+
+def get_dag_path(node):
+    """
+    Get an API 2.0 dag path from a node name
+    :param node: transform or shape name
+    :return: om2.MDagPath
+    """
+    sel = om2.MSelectionList()
+    sel.add(node)
+    return sel.getDagPath(0)
+
+
+def get_shape(node, shape_type):
+    """ Returns the first non intermediate shape of the given type, or the node itself if it's already a shape """
+    if mc.nodeType(node) == shape_type:
+        return node
+    shapes = mc.listRelatives(node, shapes=True, noIntermediate=True, type=shape_type, fullPath=True)
+    if not shapes:
+        mc.error('{} has no {} shape'.format(node, shape_type))
+    return shapes[0]
+
+
+def points_to_array(points):
+    """ MPointArray/MVectorArray to a (N, 3) numpy array """
+    return np.array([(p.x, p.y, p.z) for p in points], dtype=float).reshape(-1, 3)
+
+
+def get_curve_data(curve, space=om2.MSpace.kWorld):
+    """
+    Reads cvs, knots and degree of a nurbs curve
+    :param curve: curve transform or shape
+    :param space: om2.MSpace constant
+    :return: (cvs (numCVs, 3), full knot vector, degree)
+    """
+    fn = om2.MFnNurbsCurve(get_dag_path(get_shape(curve, 'nurbsCurve')))
+    cvs = points_to_array(fn.cvPositions(space))
+    knots = nmath.full_knots(list(fn.knots()))
+    return cvs, knots, fn.degree
+
+
+def get_surface_data(surface, space=om2.MSpace.kWorld):
+    """
+    Reads cvs, knots and degrees of a nurbs surface
+    :param surface: surface transform or shape
+    :param space: om2.MSpace constant
+    :return: (cvs (numCVsU, numCVsV, 3), full knot vector u, full knot vector v, degree u, degree v)
+    """
+    return get_fn_surface_data(om2.MFnNurbsSurface(get_dag_path(get_shape(surface, 'nurbsSurface'))), space)
+
+
+def get_fn_surface_data(fn, space=om2.MSpace.kObject):
+    """ get_surface_data of an MFnNurbsSurface, also works on surface data MObjects inside a node's compute """
+    cvs = points_to_array(fn.cvPositions(space)).reshape(fn.numCVsInU, fn.numCVsInV, 3)
+    knots_u = nmath.full_knots(list(fn.knotsInU()))
+    knots_v = nmath.full_knots(list(fn.knotsInV()))
+    return cvs, knots_u, knots_v, fn.degreeInU, fn.degreeInV
+
+
+def set_surface_cvs(surface, cvs, space=om2.MSpace.kObject):
+    """
+    Writes all cvs of a nurbs surface in one API call, no construction history or refresh involved.
+    Not undoable, the surface needs the same number of cvs.
+    :param surface: surface transform or shape, can be an intermediate (orig) shape
+    :param cvs: (numCVsU, numCVsV, 3) or (numCVs, 3) array, u major
+    """
+    fn = om2.MFnNurbsSurface(get_dag_path(get_shape(surface, 'nurbsSurface')))
+    cvs = np.asarray(cvs, dtype=float).reshape(-1, 3)
+    if len(cvs) != fn.numCVsInU * fn.numCVsInV:
+        raise ValueError('{} has {} cvs, got {}'.format(surface, fn.numCVsInU * fn.numCVsInV, len(cvs)))
+    fn.setCVPositions(om2.MPointArray([om2.MPoint(*p) for p in cvs.tolist()]), space)
+    fn.updateSurface()
+
+
+def create_surface(cvs, knots_u, knots_v, degree_u, degree_v, name=None):
+    """
+    New open, non rational nurbs surface from arrays in one MFnNurbsSurface.create call. Not undoable like
+    set_surface_cvs, and without a shading group (sets -forceElement), callers add all their surfaces at once.
+    :param cvs: (numCVsU, numCVsV, 3) array, u major
+    :param knots_u: full knot vector, like nurbs_math uses
+    :return: name of the new transform, its shape is name + 'Shape'
+    """
+    cvs = np.asarray(cvs, dtype=float).reshape(-1, 3)
+    fn = om2.MFnNurbsSurface()
+    transform = fn.create(om2.MPointArray([om2.MPoint(*p) for p in cvs.tolist()]),
+                          om2.MDoubleArray(list(knots_u)[1:-1]), om2.MDoubleArray(list(knots_v)[1:-1]),
+                          degree_u, degree_v, om2.MFnNurbsSurface.kOpen, om2.MFnNurbsSurface.kOpen, False)
+    dag = om2.MFnDagNode(transform)
+    if name:
+        dag.setName(name)
+        om2.MFnDagNode(dag.child(0)).setName(dag.name() + 'Shape')
+    return dag.partialPathName()
+
+
+def get_component_positions(components):
+    """
+    World positions of a component list (ex. 'mesh.vtx[*]') with a single xform query
+    :return: (N, 3) numpy array
+    """
+    pos = mc.xform(components, q=True, ws=True, t=True)
+    return np.array(pos, dtype=float).reshape(-1, 3)
@@ -0,0 +1,285 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Build benchmark of the ribbon builders over a grid of layer counts and densities, in one dimension and
+       2d plane modes. Every build records wall time, maya commands called, nodes created and peak Python
+       memory, and the results are saved as JSON so two versions can be compared.
+
+       Runs headless on cmds_standin (plain python, numpy needed) or inside mayapy with --maya. MatrixRibbon
+       (tmp) is python 2 source and needs kmd, its builds are recorded as skipped when it can't be imported.
+       Under python 3 that means only weighted_ribbon is measured. Commands are counted with cmds_profiler.
+       On the stand-in the peak memory includes the stand-in scene itself.
+
+Usage:
+    python ribbon_benchmark.py -o results.json
+    python ribbon_benchmark.py -o results.json --compare baseline.json
+    mayapy ribbon_benchmark.py --maya -o results_maya.json
+
+    import ribbon_benchmark
+    results = ribbon_benchmark.run(ribbon_benchmark.get_cases(layers=(2, 3)), builders=('weighted_ribbon',))
+'''
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import traceback
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2 mayapy
+    tracemalloc = None
+
+import cmds_profiler
+import cmds_standin
+
+
+DENSITY_U = (1, 4, 16, 64, 256)
+BUILDERS = ('weighted_ribbon', 'matrix_ribbon')
+
+
+#######################################################################################################
+''' Cases ''' #########################################################################################
+#######################################################################################################
+
+def get_cases(layers=(2, 3, 4, 5, 6), max_density=256, modes=(True, False)):
+    """
+    Benchmark settings, densities in u grow 4x per layer up to max_density.
+    2d planes get a smaller density in v (1, 1, 2, 2, 4, 4) so the big cases stay buildable.
+    :param modes: one_dimension values to run
+    :return: list of dicts (num_layers, one_dimension, lyr_density_u, lyr_density_v)
+    """
+    cases = list()
+    for one_dimension in modes:
+        for num_layers in layers:
+            density_u = tuple(min(4 ** i, max_density) for i in range(num_layers))
+            if one_dimension:
+                density_v = (1,) * num_layers
+            else:
+                density_v = tuple(2 ** (i // 2) for i in range(num_layers))
+            cases.append({'num_layers': num_layers,
+                          'one_dimension': one_dimension,
+                          'lyr_density_u': density_u,
+                          'lyr_density_v': density_v})
+    return cases
+
+
+#######################################################################################################
+''' Builders ''' ######################################################################################
+#######################################################################################################
+
+def build_weighted_ribbon(case):
+    import weighted_ribbon
+    return weighted_ribbon.createRibbon(name='bench',
+                                        oneDimension=case['one_dimension'],
+                                        numLayers=case['num_layers'],
+                                        lyrDensityU=case['lyr_density_u'],
+                                        lyrDensityV=case['lyr_density_v'])
+
+
+def load_matrix_ribbon():
+    """
+    MatrixRibbon module, loaded from the tmp file of this library.
+    Raises ImportError when it can't be, the case is then recorded as skipped
+    """
+    try:
+        return _load_matrix_ribbon()
+    except SyntaxError as e:
+        # tmp and xLib still use python 2 print statements
+        raise ImportError('MatrixRibbon is python 2 source, run the benchmark in a python 2 mayapy '
+                          '({} line {}: {})'.format(os.path.basename(e.filename or 'tmp'), e.lineno, e.msg))
+
+
+def _load_matrix_ribbon():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tmp')
+    try:
+        from importlib.machinery import SourceFileLoader
+        import importlib.util
+        loader = SourceFileLoader('matrix_ribbon', path)
+        spec = importlib.util.spec_from_loader('matrix_ribbon', loader)
+        module = importlib.util.module_from_spec(spec)
+        loader.exec_module(module)
+        return module
+    except ImportError as e:
+        if 'importlib' not in str(e):
+            raise
+        import imp
+        return imp.load_source('matrix_ribbon', path)
+
+
+def build_matrix_ribbon(case):
+    # allocations stay off, resetting the tracemalloc peak per phase would break peak_memory_kb
+    ribbon = load_matrix_ribbon().MatrixRibbon(collect_build_stats=True)
+    ribbon.name = 'bench'
+    ribbon.one_dimension = case['one_dimension']
+    ribbon.num_layers = case['num_layers']
+    ribbon.lyr_density_u = case['lyr_density_u']
+    ribbon.lyr_density_v = case['lyr_density_v']
+    ribbon.initial_build()
+    return ribbon
+
+
+BUILD_FUNCTIONS = {'weighted_ribbon': build_weighted_ribbon, 'matrix_ribbon': build_matrix_ribbon}
+
+
+#######################################################################################################
+''' Measure ''' #######################################################################################
+#######################################################################################################
+
+def new_scene(standin):
+    """ Empty scene, a fresh stand-in or a new maya file """
+    if standin:
+        cmds_standin.install()
+    else:
+        import maya.cmds as mc
+        mc.file(new=True, force=True)
+
+
+def measure(builder, case, standin=True):
+    """
+    Builds one case in a new scene
+    :return: dict with the case, seconds, commands, nodes, peak_memory_kb and error (None if it built)
+    """
+    new_scene(standin)
+    import maya.cmds as mc
+    before = set(mc.ls())
+    result = dict(case, builder=builder, seconds=None, commands=None, nodes=None, peak_memory_kb=None, error=None)
+
+    if tracemalloc is not None:
+        tracemalloc.start()
+    profiler = cmds_profiler.Profiler(slowest=0, trace=False)
+    start = time.time()
+    try:
+        with profiler:
+            BUILD_FUNCTIONS[builder](case)
+    except ImportError as e:
+        result['error'] = 'skipped: {}'.format(e)
+    except Exception:
+        result['error'] = traceback.format_exc(limit=4)
+    else:
+        result['seconds'] = time.time() - start
+        result['commands'] = profiler.total_calls()
+        result['nodes'] = len(set(mc.ls()) - before)
+    finally:
+        if tracemalloc is not None:
+            if result['error'] is None:
+                result['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] / 1024.0
+            tracemalloc.stop()
+
+    return result
+
+
+def run(cases=None, builders=BUILDERS, standin=True, verbose=True):
+    """
+    Runs every builder over every case
+    :param standin: run on cmds_standin, False inside maya
+    :return: dict with the environment and the list of results
+    """
+    cases = get_cases() if cases is None else cases
+    maya_version = None
+    if not standin:
+        import maya.cmds as mc
+        maya_version = mc.about(version=True)
+
+    results = list()
+    for builder in builders:
+        for case in cases:
+            result = measure(builder, case, standin)
+            results.append(result)
+            if verbose:
+                print(format_result(result))
+
+    if standin:
+        cmds_standin.uninstall()
+
+    return {'backend': 'standin' if standin else 'maya',
+            'maya': maya_version,
+            'python': platform.python_version(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results': results}
+
+
+#######################################################################################################
+''' Report ''' ########################################################################################
+#######################################################################################################
+
+def case_key(result):
+    return (result['builder'], result['num_layers'], result['one_dimension'],
+            tuple(result['lyr_density_u']), tuple(result['lyr_density_v']))
+
+
+def format_result(result):
+    name = '{:<16} {} layers {:<3} u{}'.format(result['builder'], result['num_layers'],
+                                               '1d' if result['one_dimension'] else '2d',
+                                               list(result['lyr_density_u']))
+    if result['error']:
+        return '{:<60} {}'.format(name, result['error'].strip().splitlines()[-1])
+    memory = '' if result['peak_memory_kb'] is None else '{:10.0f} kb'.format(result['peak_memory_kb'])
+    return '{:<60} {:8.3f} s {:7d} cmds {:6d} nodes{}'.format(name, result['seconds'], result['commands'],
+                                                             result['nodes'], memory)
+
+
+def save(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=1.2, keys=('seconds', 'commands', 'nodes', 'peak_memory_kb')):
+    """
+    Cases of current that got worse than baseline
+    :param baseline: results dict (run/load) of the reference version
+    :param threshold: ratio over the baseline counted as a regression
+    :return: list of (case key, measure, baseline value, current value)
+    """
+    reference = dict((case_key(r), r) for r in baseline['results'] if not r['error'])
+    regressions = list()
+    for result in current['results']:
+        old = reference.get(case_key(result))
+        if old is None or result['error']:
+            continue
+        for key in keys:
+            if old[key] and result[key] is not None and result[key] > old[key] * threshold:
+                regressions.append((case_key(result), key, old[key], result[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ribbon builders benchmark')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', help='baseline JSON file, regressions are printed and set the exit code')
+    parser.add_argument('--threshold', type=float, default=1.2, help='regression ratio over the baseline')
+    parser.add_argument('--builders', nargs='+', default=BUILDERS, choices=BUILDERS)
+    parser.add_argument('--layers', nargs='+', type=int, default=(2, 3, 4, 5, 6))
+    parser.add_argument('--max-density', type=int, default=DENSITY_U[-1])
+    parser.add_argument('--mode', choices=('1d', '2d', 'both'), default='both')
+    parser.add_argument('--maya', action='store_true', help='run in maya standalone instead of the stand-in')
+    args = parser.parse_args(argv)
+
+    if args.maya:
+        import maya.standalone
+        maya.standalone.initialize()
+
+    modes = {'1d': (True,), '2d': (False,), 'both': (True, False)}[args.mode]
+    data = run(get_cases(args.layers, args.max_density, modes), args.builders, standin=not args.maya)
+    if args.output:
+        save(data, args.output)
+
+    if args.compare:
+        regressions = compare(load(args.compare), data, args.threshold)
+        for key, measure_name, old, new in regressions:
+            print('REGRESSION {} {}: {:.3f} -> {:.3f}'.format(key, measure_name, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
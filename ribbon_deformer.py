@@ -0,0 +1,446 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: layeredRibbonDeformer, the whole layer stack of a ribbon evaluated by one deformer node (Python API 2.0).
+       Replaces the follicles, skinClusters and driver surfaces of every layer. The node deforms one nurbs
+       surface with the resolution of the last layer:
+           controlMatrix[k] - local matrix of every control, all layers in one flat array
+           layer[x]         - sparse (COO) weights of layer x's controls on the surface cvs, the normalized uvs
+                              the controls ride on and the index of its first control in controlMatrix
+           outputFrame[k]   - surface frame each control rides on, object space of the deformed surface
+
+       The controls ride on layeredRibbonFrames nodes, one per layer (create_frame_nodes), not on the
+       deformer's outputFrame. A control feeding the node that places it is a node level cycle the evaluation
+       manager runs serially. The frames node of layer x reads the rest surface and only the controls of the
+       layers before it, so the graph goes controls A -> frames B -> controls B -> ... -> deformer.
+
+       Layer x deforms the surface left by the layers before it, like the skinCluster chain does. A control
+       moves the cvs in its frame: p' = p + sum(w * (p * F^-1 * L * F - p)). Frames have x along dU and z along
+       the normal (dU x dV). The deformer expects the whole surface as its membership, paint weights are ignored.
+       outputFrame and outputGeom share one evaluation of the stack, kept until controlMatrix, layer or the
+       input geometry change.
+
+Usage:
+    import ribbon_deformer
+    ribbon_deformer.load_plugin()
+    deformer = mc.deformer('ribbon_output_srf', type=ribbon_deformer.NODE_TYPE)[0]
+    layers = [(weights, params_u, params_v), ...]
+    starts = ribbon_deformer.set_layer_data(deformer, layers)
+    frame_nodes = ribbon_deformer.create_frame_nodes(deformer, layers, ['ribbon_A_frames', 'ribbon_B_frames'])
+    mc.connectAttr('ctrl_A_00.matrix', deformer + '.controlMatrix[0]')
+    mc.connectAttr('ctrl_A_00.matrix', frame_nodes[1] + '.controlMatrix[0]')
+    mc.connectAttr(frame_nodes[0] + '.outputFrame[0]', 'ctrl_A_00_offset.offsetParentMatrix')
+'''
+
+import numpy as np
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+import nurbs_math as nmath
+import nurbs_utils
+
+
+def maya_useNewAPI():
+    pass
+
+
+NODE_TYPE = 'layeredRibbonDeformer'
+FRAMES_NODE_TYPE = 'layeredRibbonFrames'
+# Autodesk keeps 0x00000 - 0x7ffff for plugins that are never shared, get a registered block before shipping
+NODE_ID = om2.MTypeId(0x0007F1A0)
+FRAMES_NODE_ID = om2.MTypeId(0x0007F1A2)
+
+_IDENTITY = np.identity(4)
+
+
+#######################################################################################################
+''' Math ''' ##########################################################################################
+#######################################################################################################
+
+class LayerData(object):
+    """
+    One layer of the deformer.
+        weights  - nurbs_math.SparseMatrix (surface cvs x layer controls)
+        params_u - normalized u of every control on the surface
+        params_v - normalized v
+        start    - index of the layer's first control in controlMatrix
+    """
+    __slots__ = ('weights', 'params_u', 'params_v', 'start')
+
+    def __init__(self, weights, params_u, params_v, start):
+        self.weights = weights
+        self.params_u = np.asarray(params_u, dtype=float)
+        self.params_v = np.asarray(params_v, dtype=float)
+        self.start = start
+
+    def __len__(self):
+        return len(self.params_u)
+
+
+def evaluate_layers(cvs, knots_u, knots_v, degree_u, degree_v, layers, controls, deform_last=True):
+    """
+    Runs the layer stack on the rest cvs.
+    :param cvs: (numCVsU, numCVsV, 3) rest cvs
+    :param layers: LayerData list, in evaluation order
+    :param controls: (numControls, 4, 4) local matrices of the controls
+    :param deform_last: False stops after the frames of the last layer, its controls are then not needed
+    :return: ((numCVs, 3) deformed cvs, (numControls, 4, 4) frame of every control)
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    points = cvs.reshape(-1, 3)
+    frames = list()
+    for index, layer in enumerate(layers):
+        frame = nmath.surface_frames(layer.params_u, layer.params_v, points.reshape(cvs.shape),
+                                     knots_u, knots_v, degree_u, degree_v)
+        frames.append(frame)
+        if not deform_last and index == len(layers) - 1:
+            break
+        local = controls[layer.start:layer.start + len(layer)]
+        # a control at rest doesn't move anything, conjugating by its frame gives the cv space matrix
+        matrices = np.matmul(np.matmul(np.linalg.inv(frame), local), frame) - _IDENTITY
+
+        weights = layer.weights
+        homogeneous = np.hstack([points, np.ones((len(points), 1))])
+        offsets = np.einsum('k,ka,kab->kb', weights.values, homogeneous[weights.rows], matrices[weights.cols])
+        points = points.copy()
+        np.add.at(points, weights.rows, offsets[:, :3])
+
+    frames = np.concatenate(frames) if frames else np.zeros((0, 4, 4))
+    return points, frames
+
+
+#######################################################################################################
+''' Node ''' ##########################################################################################
+#######################################################################################################
+
+class LayerStackNode(object):
+    """
+    Attributes and reading shared by the deformer and the frames node: controlMatrix, layer and outputFrame.
+    Subclasses call create_stack_attributes() in their initialize.
+    """
+    control_matrix = None
+    layer = None
+    weight_rows = None
+    weight_columns = None
+    weight_values = None
+    param_u = None
+    param_v = None
+    control_start = None
+    output_frame = None
+
+    def __init__(self):
+        # LayerData list read from the layer attribute, None when it changed
+        self.layers = None
+
+    @classmethod
+    def create_stack_attributes(cls):
+        matrix_fn = om2.MFnMatrixAttribute()
+        typed_fn = om2.MFnTypedAttribute()
+        numeric_fn = om2.MFnNumericAttribute()
+        compound_fn = om2.MFnCompoundAttribute()
+
+        cls.control_matrix = matrix_fn.create('controlMatrix', 'cmt', om2.MFnMatrixAttribute.kDouble)
+        matrix_fn.array = True
+
+        cls.weight_rows = typed_fn.create('layerWeightRows', 'lwr', om2.MFnData.kIntArray)
+        cls.weight_columns = typed_fn.create('layerWeightColumns', 'lwc', om2.MFnData.kIntArray)
+        cls.weight_values = typed_fn.create('layerWeightValues', 'lwv', om2.MFnData.kDoubleArray)
+        cls.param_u = typed_fn.create('layerParamU', 'lpu', om2.MFnData.kDoubleArray)
+        cls.param_v = typed_fn.create('layerParamV', 'lpv', om2.MFnData.kDoubleArray)
+        cls.control_start = numeric_fn.create('layerControlStart', 'lcs', om2.MFnNumericData.kInt, 0)
+
+        cls.layer = compound_fn.create('layer', 'lyr')
+        for child in cls.layer_children():
+            compound_fn.addChild(child)
+        compound_fn.array = True
+
+        cls.output_frame = matrix_fn.create('outputFrame', 'ofr', om2.MFnMatrixAttribute.kDouble)
+        matrix_fn.array = True
+        matrix_fn.usesArrayDataBuilder = True
+        matrix_fn.writable = False
+        matrix_fn.storable = False
+
+        for attribute in (cls.control_matrix, cls.layer, cls.output_frame):
+            cls.addAttribute(attribute)
+        for attribute in (cls.control_matrix, cls.layer) + cls.layer_children():
+            cls.attributeAffects(attribute, cls.output_frame)
+
+    @classmethod
+    def layer_children(cls):
+        return (cls.weight_rows, cls.weight_columns, cls.weight_values, cls.param_u, cls.param_v, cls.control_start)
+
+    def layers_dirty(self, plug):
+        """ setDependentsDirty part of the layer cache """
+        if plug.attribute() == self.layer or plug.attribute() in self.layer_children():
+            self.layers = None
+
+    # Read #############################################################################################
+
+    def read_layers(self, data):
+        """ LayerData list, read again only after the layer attribute changed """
+        if self.layers is not None:
+            return self.layers
+
+        handle = data.inputArrayValue(self.layer)
+        elements = list()
+        for i in range(len(handle)):
+            handle.jumpToPhysicalElement(i)
+            element = handle.inputValue()
+            rows = om2.MFnIntArrayData(element.child(self.weight_rows).data()).array()
+            columns = om2.MFnIntArrayData(element.child(self.weight_columns).data()).array()
+            values = om2.MFnDoubleArrayData(element.child(self.weight_values).data()).array()
+            params_u = om2.MFnDoubleArrayData(element.child(self.param_u).data()).array()
+            params_v = om2.MFnDoubleArrayData(element.child(self.param_v).data()).array()
+            start = element.child(self.control_start).asInt()
+            weights = nmath.SparseMatrix(list(rows), list(columns), list(values),
+                                         (max(rows) + 1 if len(rows) else 0, len(params_u)))
+            elements.append((handle.elementLogicalIndex(), LayerData(weights, list(params_u), list(params_v), start)))
+
+        self.layers = [layer for index, layer in sorted(elements, key=lambda item: item[0])]
+        return self.layers
+
+    def read_controls(self, data, layers):
+        """ (numControls, 4, 4) local matrices, identity where controlMatrix has no element """
+        count = max([layer.start + len(layer) for layer in layers] or [0])
+        controls = np.tile(_IDENTITY, (count, 1, 1))
+        handle = data.inputArrayValue(self.control_matrix)
+        for i in range(len(handle)):
+            handle.jumpToPhysicalElement(i)
+            index = handle.elementLogicalIndex()
+            if index < count:
+                controls[index] = np.array(list(handle.inputValue().asMatrix())).reshape(4, 4)
+        return controls
+
+    def write_frames(self, plug, data, frames):
+        output_handle = data.outputArrayValue(self.output_frame)
+        builder = output_handle.builder()
+        for index, frame in enumerate(frames):
+            builder.addElement(index).setMMatrix(om2.MMatrix(frame.ravel().tolist()))
+        output_handle.set(builder)
+        output_handle.setAllClean()
+        data.setClean(plug)
+
+
+class LayeredRibbonDeformer(LayerStackNode, oma2.MPxDeformerNode):
+
+    def __init__(self):
+        oma2.MPxDeformerNode.__init__(self)
+        LayerStackNode.__init__(self)
+        # (rest cvs, (points, frames)) of the last evaluation, None when an input of the stack changed
+        self.result = None
+
+    @staticmethod
+    def creator():
+        return LayeredRibbonDeformer()
+
+    @classmethod
+    def initialize(cls):
+        cls.create_stack_attributes()
+        output_geom = oma2.MPxDeformerNode.outputGeom
+        for attribute in (cls.control_matrix, cls.layer) + cls.layer_children():
+            cls.attributeAffects(attribute, output_geom)
+        cls.attributeAffects(oma2.MPxDeformerNode.inputGeom, cls.output_frame)
+
+    @classmethod
+    def stack_inputs(cls):
+        """ Attributes the evaluation of the stack depends on, envelope is applied after it """
+        return (cls.control_matrix, cls.layer, oma2.MPxDeformerNode.input,
+                oma2.MPxDeformerNode.inputGeom) + cls.layer_children()
+
+    # Dirty ############################################################################################
+
+    def setDependentsDirty(self, plug, affected):
+        self.layers_dirty(plug)
+        if plug.attribute() in self.stack_inputs():
+            self.result = None
+
+    def preEvaluation(self, context, evaluation_node):
+        # the evaluation manager skips setDependentsDirty
+        if not context.isNormal():
+            return
+        if evaluation_node.dirtyPlugExists(self.layer):
+            self.layers = None
+        if any(evaluation_node.dirtyPlugExists(attribute)
+               for attribute in (self.control_matrix, self.layer, oma2.MPxDeformerNode.input)):
+            self.result = None
+
+    def evaluate(self, data, geometry):
+        """
+        (rest cvs, (points, frames)) of the stack. Computed once for outputFrame and outputGeom, again only after
+        an input changed
+        """
+        if self.result is None:
+            layers = self.read_layers(data)
+            surface = nurbs_utils.get_fn_surface_data(om2.MFnNurbsSurface(geometry), om2.MSpace.kObject)
+            self.result = surface[0], evaluate_layers(*(surface + (layers, self.read_controls(data, layers))))
+        return self.result
+
+    # Compute ##########################################################################################
+
+    def compute(self, plug, data):
+        if plug.attribute() != self.output_frame:
+            return oma2.MPxDeformerNode.compute(self, plug, data)
+
+        input_handle = data.inputArrayValue(oma2.MPxDeformerNode.input)
+        input_handle.jumpToPhysicalElement(0)
+        geometry = input_handle.inputValue().child(oma2.MPxDeformerNode.inputGeom).asNurbsSurface()
+        cvs, (points, frames) = self.evaluate(data, geometry)
+        self.write_frames(plug, data, frames)
+
+    def deform(self, data, geom_iter, matrix, multi_index):
+        envelope = data.inputValue(oma2.MPxDeformerNode.envelope).asFloat()
+        if envelope == 0.0:
+            return
+
+        input_handle = data.outputArrayValue(oma2.MPxDeformerNode.input)
+        input_handle.jumpToLogicalElement(multi_index)
+        geometry = input_handle.outputValue().child(oma2.MPxDeformerNode.inputGeom).asNurbsSurface()
+        cvs, (points, frames) = self.evaluate(data, geometry)
+        if geom_iter.count() != len(points):
+            return
+
+        rest = cvs.reshape(-1, 3)
+        points = rest + (points - rest) * envelope
+        geom_iter.setAllPositions(om2.MPointArray([om2.MPoint(*p) for p in points.tolist()]))
+
+
+class LayeredRibbonFrames(LayerStackNode, om2.MPxNode):
+    """
+    Frames of the last layer in its layer attribute on the rest surface deformed by the layers before it, in
+    outputFrame[i] for the layer's control i. Only the controls of those layers go in controlMatrix.
+    """
+    input_surface = None
+
+    def __init__(self):
+        om2.MPxNode.__init__(self)
+        LayerStackNode.__init__(self)
+
+    @staticmethod
+    def creator():
+        return LayeredRibbonFrames()
+
+    @classmethod
+    def initialize(cls):
+        typed_fn = om2.MFnTypedAttribute()
+        cls.input_surface = typed_fn.create('inputSurface', 'is', om2.MFnData.kNurbsSurface)
+        typed_fn.storable = False
+        cls.addAttribute(cls.input_surface)
+        cls.create_stack_attributes()
+        cls.attributeAffects(cls.input_surface, cls.output_frame)
+
+    def setDependentsDirty(self, plug, affected):
+        self.layers_dirty(plug)
+
+    def preEvaluation(self, context, evaluation_node):
+        # the evaluation manager skips setDependentsDirty
+        if context.isNormal() and evaluation_node.dirtyPlugExists(self.layer):
+            self.layers = None
+
+    def compute(self, plug, data):
+        if plug.attribute() != self.output_frame:
+            return None
+
+        surface = data.inputValue(self.input_surface).asNurbsSurface()
+        layers = self.read_layers(data)
+        frames = np.zeros((0, 4, 4))
+        if layers and not surface.isNull():
+            surface_data = nurbs_utils.get_fn_surface_data(om2.MFnNurbsSurface(surface), om2.MSpace.kObject)
+            points, frames = evaluate_layers(*(surface_data + (layers, self.read_controls(data, layers))),
+                                             deform_last=False)
+            frames = frames[-len(layers[-1]):]
+        self.write_frames(plug, data, frames)
+
+
+def initializePlugin(plugin):
+    fn = om2.MFnPlugin(plugin, 'Felipe Sanges', '1.0')
+    fn.registerNode(NODE_TYPE, NODE_ID, LayeredRibbonDeformer.creator, LayeredRibbonDeformer.initialize,
+                    om2.MPxNode.kDeformerNode)
+    fn.registerNode(FRAMES_NODE_TYPE, FRAMES_NODE_ID, LayeredRibbonFrames.creator, LayeredRibbonFrames.initialize)
+
+
+def uninitializePlugin(plugin):
+    fn = om2.MFnPlugin(plugin)
+    fn.deregisterNode(FRAMES_NODE_ID)
+    fn.deregisterNode(NODE_ID)
+
+
+def load_plugin():
+    """ Loads this file as a plugin, False if it can't be loaded """
+    path = __file__
+    if path.endswith('.pyc'):
+        path = path[:-1]
+    try:
+        if not mc.pluginInfo(path, q=True, loaded=True):
+            mc.loadPlugin(path, quiet=True)
+        return True
+    except RuntimeError:
+        return False
+
+
+#######################################################################################################
+''' Setup ''' #########################################################################################
+#######################################################################################################
+
+def set_layer_data(deformer, layers):
+    """
+    Writes the layers of a deformer or a frames node in one MDGModifier.
+    :param layers: list of (weights, params_u, params_v) in evaluation order, weights is a dense
+                   (surface cvs x layer controls) array or a nurbs_math.SparseMatrix with the same shape
+    :return: index of the first control of every layer in controlMatrix/outputFrame
+    """
+    sel = om2.MSelectionList()
+    sel.add(deformer)
+    fn = om2.MFnDependencyNode(sel.getDependNode(0))
+    layer_plug = fn.findPlug('layer', False)
+
+    modifier = om2.MDGModifier()
+    starts = list()
+    start = 0
+    for x, (weights, params_u, params_v) in enumerate(layers):
+        if not isinstance(weights, nmath.SparseMatrix):
+            weights = nmath.SparseMatrix.from_dense(weights, 1e-9)
+        if weights.shape[1] != len(params_u):
+            raise ValueError('layer {} has {} weight columns for {} controls'.format(x, weights.shape[1],
+                                                                                len(params_u)))
+        element = layer_plug.elementByLogicalIndex(x)
+
+        def child(name):
+            return element.child(fn.attribute(name))
+
+        for name, values in (('layerWeightRows', weights.rows), ('layerWeightColumns', weights.cols)):
+            modifier.newPlugValue(child(name), om2.MFnIntArrayData().create(om2.MIntArray(values.tolist())))
+        for name, values in (('layerWeightValues', weights.values), ('layerParamU', params_u),
+                             ('layerParamV', params_v)):
+            data = om2.MFnDoubleArrayData().create(om2.MDoubleArray(np.asarray(values, dtype=float).tolist()))
+            modifier.newPlugValue(child(name), data)
+        modifier.newPlugValueInt(child('layerControlStart'), start)
+
+        starts.append(start)
+        start += len(params_u)
+
+    modifier.doIt()
+    return starts
+
+
+def create_frame_nodes(deformer, layers, names):
+    """
+    One layeredRibbonFrames per layer on the deformer's rest surface, holding the layers up to its own.
+    Controls of layer x connect their matrix to the frames nodes of the layers after x, and ride on
+    outputFrame of node x.
+    :param layers: the list given to set_layer_data
+    :param names: node name of every layer
+    :return: frames node of every layer
+    """
+    # what feeds the deformer, not the deformer itself, or the frames would depend on it
+    source = mc.listConnections(deformer + '.input[0].inputGeometry', source=True, destination=False,
+                                plugs=True)[0]
+    nodes = list()
+    for x, name in enumerate(names):
+        node = mc.createNode(FRAMES_NODE_TYPE, n=name)
+        mc.connectAttr(source, node + '.inputSurface')
+        set_layer_data(node, layers[:x + 1])
+        nodes.append(node)
+    return nodes
@@ -0,0 +1,167 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Layout of the layered ribbons, computed once before the build. Every layer keeps NumPy arrays with the
+       cv indices, follicle uvs and world positions of its controls plus their name tags, so the builders
+       (weighted_ribbon.addFolliclesToAll, MatrixRibbon.add_follicles_to_all) don't list cv strings or parse
+       names out of them. Reading the scene costs one API call per surface.
+
+Usage:
+    import ribbon_layout
+    layout = ribbon_layout.get_ribbon_layout(layer_surfaces, driver_surfaces, ['A', 'B', 'C'], one_dimension=True)
+    for layer in layout.layers:
+        print(layer.tags, layer.params_u)
+    corners = nurbs_utils.get_surface_data('base_plane')[0]
+    surfaces = ribbon_layout.create_layer_surfaces(corners, (1, 4), (1, 1), ['a_srf', 'b_srf'], 'surfaces_grp')
+'''
+
+import numpy as np
+import maya.cmds as mc
+
+import nurbs_math as nmath
+import nurbs_utils
+import ribbon_weights
+
+
+class LayerLayout(object):
+    """
+    Controls of one ribbon layer, one entry per control in creation order (u major, like cv[*][*]).
+        surface   - layer surface the controls come from
+        driver    - surface the follicles attach to
+        tag       - layer letter
+        cv_count  - (numCVsU, numCVsV) of the layer surface
+        index_u   - int array, cv index in u of every control
+        index_v   - int array, cv index in v
+        params_u  - float array, normalized follicle parameterU
+        params_v  - float array, normalized follicle parameterV
+        positions - (N, 3) world position of the cvs
+        tags      - name tags, 'A_02_00' (or 'A_02' for one dimension ribbons)
+    """
+    __slots__ = ('surface', 'driver', 'tag', 'cv_count', 'index_u', 'index_v',
+                 'params_u', 'params_v', 'positions', 'tags')
+
+    def __init__(self, surface, driver, tag, cv_count, index_u, index_v, params_u, params_v, positions, tags):
+        self.surface = surface
+        self.driver = driver
+        self.tag = tag
+        self.cv_count = cv_count
+        self.index_u = index_u
+        self.index_v = index_v
+        self.params_u = params_u
+        self.params_v = params_v
+        self.positions = positions
+        self.tags = tags
+
+    def __len__(self):
+        return len(self.tags)
+
+
+class RibbonLayout(object):
+    """ Layers of a ribbon, in build order """
+    __slots__ = ('layers', 'one_dimension', 'direction')
+
+    def __init__(self, layers, one_dimension, direction):
+        self.layers = layers
+        self.one_dimension = one_dimension
+        self.direction = direction
+
+    def __len__(self):
+        return len(self.layers)
+
+
+def create_layer_layout(surface, driver, tag, cvs, driver_data=None, driver_count=None,
+                        one_dimension=False, direction='u'):
+    """
+    Builds a LayerLayout from arrays already read from the scene, no Maya calls.
+    :param cvs: (numCVsU, numCVsV, 3) world cvs of the layer surface
+    :param driver_data: (cvs, knots_u, knots_v, degree_u, degree_v) of an arbitrary driver surface,
+                        the uvs are then projected on it (nurbs_math.closest_params_on_surface)
+    :param driver_count: (numCVsU, numCVsV) of a driver built like the layers (createNormPlane),
+                         the uvs then come from the knot vectors (ribbon_weights.layer_follicle_params)
+    """
+    count_u, count_v = cvs.shape[:2]
+    index_u, index_v = np.meshgrid(np.arange(count_u), np.arange(count_v), indexing='ij')
+    index_u = index_u.ravel()
+    index_v = index_v.ravel()
+
+    if one_dimension:
+        # first row of cvs across the ribbon direction
+        keep = index_v == 0 if direction == 'u' else index_u == 0
+        index_u = index_u[keep]
+        index_v = index_v[keep]
+
+    positions = cvs[index_u, index_v]
+
+    if driver_data is not None:
+        driver_cvs, knots_u, knots_v, degree_u, degree_v = driver_data
+        params_u, params_v = nmath.closest_params_on_surface(positions, driver_cvs, knots_u, knots_v,
+                                                             degree_u, degree_v)
+        params_u = nmath.normalize_params(params_u, knots_u, degree_u)
+        params_v = nmath.normalize_params(params_v, knots_v, degree_v)
+    else:
+        grid_u, grid_v = ribbon_weights.layer_follicle_params((count_u - 1, count_v - 1),
+                                                              (driver_count[0] - 1, driver_count[1] - 1))
+        params_u = grid_u[index_u]
+        params_v = grid_v[index_v]
+
+    if one_dimension:
+        # followers stay in the middle of the ribbon
+        if direction == 'u':
+            params_v = np.full(len(params_v), 0.5)
+            tags = ['{}_{:02d}'.format(tag, i) for i in index_u]
+        else:
+            params_u = np.full(len(params_u), 0.5)
+            tags = ['{}_{:02d}'.format(tag, i) for i in index_v]
+    else:
+        tags = ['{}_{:02d}_{:02d}'.format(tag, u, v) for u, v in zip(index_u, index_v)]
+
+    return LayerLayout(surface, driver, tag, (count_u, count_v), index_u, index_v,
+                       params_u, params_v, positions, tags)
+
+
+def get_ribbon_layout(layer_surfaces, driver_surfaces, tags, one_dimension=False, direction='u', arbitrary=False):
+    """
+    Reads every layer surface (and driver) once and builds the ribbon layout.
+    :param layer_surfaces: surfaces the controls come from, one per layer
+    :param driver_surfaces: surfaces the follicles attach to, one per layer
+    :param tags: layer letters
+    :param arbitrary: drivers are not createNormPlane planes, project the cvs on them instead
+    :return: RibbonLayout
+    """
+    surface_data = dict()
+
+    def read(surface):
+        if surface not in surface_data:
+            surface_data[surface] = nurbs_utils.get_surface_data(surface)
+        return surface_data[surface]
+
+    layers = list()
+    for surface, driver, tag in zip(layer_surfaces, driver_surfaces, tags):
+        driver_data = read(driver)
+        if arbitrary:
+            layer = create_layer_layout(surface, driver, tag, read(surface)[0], driver_data=driver_data,
+                                        one_dimension=one_dimension, direction=direction)
+        else:
+            layer = create_layer_layout(surface, driver, tag, read(surface)[0], driver_count=driver_data[0].shape[:2],
+                                        one_dimension=one_dimension, direction=direction)
+        layers.append(layer)
+
+    return RibbonLayout(layers, one_dimension, direction)
+
+
+def create_layer_surfaces(corners, density_u, density_v, names, group):
+    """
+    The layer surfaces of a ribbon, one per name, parented to group and in initialShadingGroup.
+    Same cvs and knots a linear rebuild followed by a quadratic rebuild keeping the cvs gave, degree 1 in a
+    direction with a single span. One API call per layer instead of a duplicate and two rebuilds.
+    :param corners: cvs of the linear single span plane every layer is generated from
+    :param density_u: spans in u of every layer
+    :param density_v: spans in v of every layer
+    :return: surface names under group
+    """
+    surfaces = [nurbs_utils.create_surface(*ribbon_weights.layer_surface_data(corners, spans_u, spans_v), name=name)
+                for spans_u, spans_v, name in zip(density_u, density_v, names)]
+    surfaces = mc.parent(surfaces, group)
+    mc.sets(surfaces, edit=True, forceElement='initialShadingGroup')
+    return surfaces
@@ -0,0 +1,219 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Pure math weight engine for the layered ribbons (weighted_ribbon.createRibbon). No Maya needed.
+
+Every ribbon layer is the same plane rebuilt with a different number of spans (degree 1 when a direction has
+a single span, degree 2 otherwise). The driver surfaces all share the resolution of the last layer, so the
+weights of a layer's controls on a driver surface are the refinement matrix from the layer's knot vectors to
+the last layer's knot vectors. This replaces the wrap deformer + pointPosition probing.
+
+The layer surfaces themselves are generated here too (layer_surface_data), no rebuildSurface needed.
+
+Layers don't depend on each other, map_layers computes them in a process pool (python 3, concurrent.futures)
+and Maya's thread only applies the results. Inside Maya the workers run mayapy.
+
+Usage:
+    import ribbon_weights
+    weights = ribbon_weights.ribbon_layer_weights((1, 1, 2, 5), (1, 1, 1, 1), 4)
+    weights = ribbon_weights.ribbon_layer_weights((4, 8, 16, 32), (4, 8, 16, 32), 4, False, workers=4)
+    # weights[x] is (driver surface cvs x layer x controls), u major rows like cv[*][*]
+    params_u, params_v = ribbon_weights.layer_follicle_params((2, 1), (5, 1))
+    weights = ribbon_weights.wire_layer_weights(nurbs_utils.get_surface_data('plane_A_surf'), driver_cvs)
+'''
+
+import os
+import sys
+
+try:
+    import concurrent.futures as futures
+    import multiprocessing
+except ImportError:
+    # python 2 maya, layers are computed one after another
+    futures = None
+
+import numpy as np
+
+import nurbs_math as nmath
+
+# dropoffDistance of the wires the skinCluster chain measures one dimension layers with
+WIRE_DROPOFF_DISTANCE = 100.0
+
+
+def layer_knots(spans):
+    """
+    Knot vector, degree and number of cvs of one direction of a layer surface.
+    Mirrors createNormPlane: linear rebuild with 'spans' spans, then a rebuild to degree 2
+    keeping the cvs (unless there's a single span).
+    :return: (knots, degree, num_cvs)
+    """
+    num_cvs = spans + 1
+    degree = 1 if spans == 1 else 2
+    return nmath.open_uniform_knots(num_cvs, degree), degree, num_cvs
+
+
+def layer_surface_data(corners, spans_u, spans_v):
+    """
+    Cvs, knots and degrees of a layer surface, what createNormPlane's two rebuilds make out of a linear plane.
+    The linear rebuild spaces spans + 1 cvs evenly between the plane's corners and the quadratic one keeps them.
+    :param corners: (2, 2, 3) cvs of the single span linear plane, u major
+    :return: (cvs (numCVsU, numCVsV, 3), knots u, knots v, degree u, degree v), nurbs_utils.create_surface args
+    """
+    corners = np.asarray(corners, dtype=float).reshape(2, 2, 3)
+    knots_u, degree_u, count_u = layer_knots(spans_u)
+    knots_v, degree_v, count_v = layer_knots(spans_v)
+    a = np.linspace(0.0, 1.0, count_u)[:, None, None]
+    b = np.linspace(0.0, 1.0, count_v)[None, :, None]
+    cvs = ((1.0 - a) * (1.0 - b) * corners[0, 0] + a * (1.0 - b) * corners[1, 0] +
+           (1.0 - a) * b * corners[0, 1] + a * b * corners[1, 1])
+    return cvs, knots_u, knots_v, degree_u, degree_v
+
+
+def direction_refinement(spans, fine_spans):
+    """ (fine cvs x layer cvs) refinement matrix for one surface direction """
+    knots, degree, num_cvs = layer_knots(spans)
+    fine_knots, fine_degree, fine_num_cvs = layer_knots(fine_spans)
+    return nmath.refinement_matrix(knots, degree, fine_knots, fine_degree)
+
+
+def layer_weight_matrix(spans_uv, fine_spans_uv, one_dimension=True, direction='u'):
+    """
+    Weights of one layer's controls on a surface with the resolution fine_spans_uv.
+    :param spans_uv: (spans u, spans v) of the layer surface
+    :param fine_spans_uv: (spans u, spans v) of the driven surface
+    :param one_dimension: controls only exist on the first row of cvs (follicleFromCvsOneD)
+    :param direction: 'u' or 'v', the ribbon direction of one dimension ribbons
+    :return: (fine cvs, controls) numpy array. Rows are u major, columns follow the control creation order.
+    """
+    refine_u = direction_refinement(spans_uv[0], fine_spans_uv[0])
+    refine_v = direction_refinement(spans_uv[1], fine_spans_uv[1])
+
+    if not one_dimension:
+        # one control per cv, u major
+        return np.kron(refine_u, refine_v)
+
+    # a control drives every cv of its row, rows of a refinement matrix sum to 1
+    fine_u, fine_v = refine_u.shape[0], refine_v.shape[0]
+    if direction == 'v':
+        return np.tile(refine_v, (fine_u, 1))
+    return np.repeat(refine_u, fine_v, axis=0)
+
+
+def ribbon_layer_weights(density_u, density_v, num_layers, one_dimension=True, direction='u', workers=None):
+    """
+    Weights for every layer of a ribbon on the driver surfaces (resolution of the last layer).
+    :param density_u: spans in u for each layer, surface space (already swapped when direction is 'v')
+    :param density_v: spans in v for each layer
+    :param workers: processes computing the layers, see map_layers
+    :return: list with one (driver cvs x controls) array per layer
+    """
+    fine_spans = (density_u[num_layers - 1], density_v[num_layers - 1])
+    return map_layers(layer_weight_matrix, [((density_u[x], density_v[x]), fine_spans, one_dimension, direction)
+                                            for x in range(num_layers)], workers)
+
+
+def wire_layer_weights(layer_data, cvs, direction='u', dropoff_distance=WIRE_DROPOFF_DISTANCE):
+    """
+    Weights of a one dimension layer the way the skinCluster chain gets them from wire_to_skin: the layer
+    surface's isoparm at .5 across the ribbon is a wire, each of its cvs bound to the control of that cv, and
+    every cv of the driven surface takes the wire's weights at its closest point. Rows are normalized like a
+    skinCluster does, the falloff only matters past the dropoff distance.
+    :param layer_data: (cvs, knots u, knots v, degree u, degree v) of the layer surface, nurbs_utils.get_surface_data
+    :param cvs: (numCVsU, numCVsV, 3) cvs of the driven surface
+    :param direction: 'u' or 'v', the ribbon direction
+    :return: (driven cvs, controls) numpy array, u major rows like layer_weight_matrix
+    """
+    layer_cvs, knots_u, knots_v, degree_u, degree_v = layer_data
+    layer_cvs = np.asarray(layer_cvs, dtype=float)
+    if direction == 'v':
+        layer_cvs = layer_cvs.transpose(1, 0, 2)
+        knots_u, knots_v, degree_u, degree_v = knots_v, knots_u, degree_v, degree_u
+
+    # cvs of the isoparm, every row blended by the basis across the ribbon
+    across = nmath.basis_matrix([0.5], knots_v, degree_v)[0]
+    wire_cvs = np.einsum('v,uvd->ud', across, layer_cvs)
+    points = np.asarray(cvs, dtype=float).reshape(-1, 3)
+    weights = nmath.wire_weights(points, wire_cvs, knots_u, degree_u, np.identity(len(wire_cvs)), dropoff_distance)
+    totals = weights.sum(axis=1)
+    return weights / np.where(totals > 0.0, totals, 1.0)[:, None]
+
+
+def scale_network(weights, tolerance=1e-9):
+    """
+    Connections of one layer of the layered scale network (MatrixRibbon.layered_scale_setup2). Zero weights add
+    nothing to a wtAddMatrix sum, only the others are connected and the wtMatrix elements of every locator are
+    packed in joint order.
+    :param weights: (joints, locators) weights of the layer's joints on the output locators
+    :return: list of (joint index, locator index, wtMatrix element)
+    """
+    weights = np.asarray(weights, dtype=float)
+    sizes = [0] * weights.shape[1]
+    entries = list()
+    for joint, locator in zip(*np.nonzero(np.abs(weights) > tolerance)):
+        entries.append((int(joint), int(locator), sizes[locator]))
+        sizes[locator] += 1
+    return entries
+
+
+def layer_follicle_params(spans_uv, fine_spans_uv):
+    """
+    Follicle parameters for every cv of a layer surface attached to a driver surface (follicleFromCvs).
+    Both are flat uniform planes covering the same area, the cvs of each one are evenly spaced
+    (the greville abscissae of the linear rebuild). The parameter of a layer cv is where the driver surface
+    reaches that cv, found by inverting the driver's cv spacing with its knot vector. When the driver is
+    linear in a direction this is simply the layer cv's greville abscissa.
+    :param spans_uv: (spans u, spans v) of the layer surface
+    :param fine_spans_uv: (spans u, spans v) of the driver surface
+    :return: (params u per cv column, params v per cv row), normalized 0-1
+    """
+    params = list()
+    for spans, fine_spans in zip(spans_uv, fine_spans_uv):
+        positions = nmath.greville_abscissae(nmath.open_uniform_knots(spans + 1, 1), 1)
+        fine_knots, fine_degree, fine_num_cvs = layer_knots(fine_spans)
+        fine_positions = nmath.greville_abscissae(nmath.open_uniform_knots(fine_num_cvs, 1), 1)
+        if fine_degree == 1:
+            params.append(positions)
+        else:
+            params.append(nmath.params_at_values(positions, fine_positions, fine_knots, fine_degree))
+    return params[0], params[1]
+
+
+#######################################################################################################
+''' Parallel ''' ######################################################################################
+#######################################################################################################
+
+def worker_executable():
+    """ Python the worker processes run, mayapy when running inside Maya's gui. None if it can't be found """
+    folder, name = os.path.split(sys.executable)
+    name = name.lower()
+    if not name.startswith('maya') or name.startswith('mayapy'):
+        return sys.executable
+    # windows and linux keep mayapy next to maya, osx in Maya.app/Contents/bin
+    for path in (os.path.join(folder, 'mayapy.exe'), os.path.join(folder, 'mayapy'),
+                 os.path.join(folder, os.pardir, 'bin', 'mayapy')):
+        if os.path.isfile(path):
+            return os.path.normpath(path)
+    return None
+
+
+def map_layers(function, args_list, workers=None):
+    """
+    [function(*args) for args in args_list], in a pool of worker processes when workers > 1.
+    Starting the pool costs a fraction of a second, worth it for big plane ribbons, not for a few spans.
+    Falls back to computing in this process on python 2, without a worker python or if the pool breaks.
+    :param function: module level function of a maya free module, the workers import it
+    :param workers: number of processes, None or 1 computes in this process
+    """
+    args_list = list(args_list)
+    executable = worker_executable() if futures and workers and workers > 1 and len(args_list) > 1 else None
+    if executable:
+        # spawn, forking maya's process is not safe
+        context = multiprocessing.get_context('spawn')
+        context.set_executable(executable)
+        try:
+            with futures.ProcessPoolExecutor(min(workers, len(args_list)), mp_context=context) as pool:
+                return list(pool.map(function, *zip(*args_list)))
+        except (OSError, RuntimeError):
+            pass
+    return [function(*args) for args in args_list]
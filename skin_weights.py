@@ -0,0 +1,205 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Bulk skinCluster weight access. Weights are read and written as a whole
+       (components x influences) NumPy matrix with a single MFnSkinCluster call.
+       Bind pre matrices of many skinClusters are reset the same way, in one modifier.
+
+Usage:
+    weights = skin_weights.get_skin_weights('body_skC', 'body_geo')
+    skin_weights.set_skin_weights('body_skC', 'body_geo', weights)
+    skin_weights.reset_bind_pre_matrices(skin_weights.get_skin_clusters(mc.ls(type='mesh')))
+'''
+
+import numpy as np
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+import maya.api.OpenMayaAnim as oma2
+
+import nurbs_utils
+
+
+def get_skin_cluster(geo):
+    """ First skinCluster in the history of geo, None if there isn't one """
+    skin = mc.ls(mc.listHistory(geo, pdo=True) or [], type='skinCluster')
+    if skin:
+        return skin[0]
+    return None
+
+
+def get_skin_clusters(geos):
+    """ Every skinCluster in the history of geos, with a single history query """
+    if not geos:
+        return []
+    return mc.ls(mc.listHistory(geos, pdo=True) or [], type='skinCluster')
+
+
+def get_skin_fn(skin_cluster):
+    sel = om2.MSelectionList()
+    sel.add(skin_cluster)
+    return oma2.MFnSkinCluster(sel.getDependNode(0))
+
+
+def get_influences(skin_cluster):
+    """ Influence names in skinCluster order """
+    fn = get_skin_fn(skin_cluster)
+    return [path.partialPathName() for path in fn.influenceObjects()]
+
+
+def get_components(geo, indices=None):
+    """
+    Component object holding the points of geo (mesh vertices, curve or surface cvs)
+    :param indices: flat point indices, all points if None. Surface cvs use the u major order of weightList
+    :return: (om2.MDagPath, component MObject, number of points in geo)
+    """
+    shape = mc.listRelatives(geo, shapes=True, noIntermediate=True, fullPath=True) or [geo]
+    dag_path = nurbs_utils.get_dag_path(shape[0])
+
+    if dag_path.hasFn(om2.MFn.kNurbsSurface):
+        fn_surf = om2.MFnNurbsSurface(dag_path)
+        count_v = fn_surf.numCVsInV
+        count = fn_surf.numCVsInU * count_v
+        indices = np.arange(count) if indices is None else np.asarray(indices, dtype=int)
+        rows, columns = np.divmod(indices, count_v)
+        fn_comp = om2.MFnDoubleIndexedComponent()
+        component = fn_comp.create(om2.MFn.kSurfaceCVComponent)
+        fn_comp.addElements(list(zip(rows.tolist(), columns.tolist())))
+        return dag_path, component, count
+
+    if dag_path.hasFn(om2.MFn.kMesh):
+        count = om2.MFnMesh(dag_path).numVertices
+        component_type = om2.MFn.kMeshVertComponent
+    elif dag_path.hasFn(om2.MFn.kNurbsCurve):
+        count = om2.MFnNurbsCurve(dag_path).numCVs
+        component_type = om2.MFn.kCurveCVComponent
+    else:
+        mc.error('{} is not a mesh, nurbsCurve or nurbsSurface'.format(geo))
+
+    if indices is None:
+        indices = range(count)
+    fn_comp = om2.MFnSingleIndexedComponent()
+    component = fn_comp.create(component_type)
+    fn_comp.addElements([int(i) for i in indices])
+    return dag_path, component, count
+
+
+def get_skin_weights(skin_cluster, geo):
+    """
+    Reads every weight of geo in one call
+    :return: (components x influences) numpy array, columns in get_influences() order
+    """
+    fn = get_skin_fn(skin_cluster)
+    dag_path, component, count = get_components(geo)
+    weights, num_influences = fn.getWeights(dag_path, component)
+    return np.array(weights, dtype=float).reshape(count, num_influences)
+
+
+def to_dense(weights):
+    """ Accepts numpy arrays, nested lists, row iterators or sparse matrices (anything with toarray()) """
+    if hasattr(weights, 'toarray'):
+        weights = weights.toarray()
+    if not isinstance(weights, np.ndarray):
+        # zip objects and generators
+        weights = list(weights)
+    return np.asarray(weights, dtype=float)
+
+
+def set_skin_weights(skin_cluster, geo, weights, influences=None, normalize=True, lock=False):
+    """
+    Writes a (components x influences) weight matrix in one MFnSkinCluster.setWeights call.
+    Replaces the skinPercent loops, normalization and influence locking happen once for the whole matrix.
+    :param weights: dense numpy array, nested lists or sparse matrix, one row per point of geo
+    :param influences: influence names matching the weights columns, defaults to the skinCluster order.
+                       Influences of the skinCluster that are not listed get zero weights on the written rows.
+    :param normalize: normalize every row before writing it. Rows without any weight are skipped so
+                      those points keep the weights they had.
+    :param lock: lock the weights of the written influences (.liw) when done
+    """
+    fn = get_skin_fn(skin_cluster)
+    weights = to_dense(weights)
+
+    all_influences = get_influences(skin_cluster)
+    if influences is None:
+        influences = all_influences
+    if weights.ndim != 2 or weights.shape[1] != len(influences):
+        mc.error('Weights shape {} does not match {} influences'.format(weights.shape, len(influences)))
+
+    # match by short name, influenceObjects gives partial paths
+    short_names = [inf.split('|')[-1] for inf in all_influences]
+    columns = [short_names.index(inf.split('|')[-1]) for inf in influences]
+    if columns != list(range(len(all_influences))):
+        full = np.zeros((len(weights), len(all_influences)))
+        full[:, columns] = weights
+        weights = full
+    indices = list(range(len(all_influences)))
+
+    rows = np.arange(len(weights))
+    if normalize:
+        totals = weights.sum(axis=1)
+        rows = np.flatnonzero(totals > 0.0)
+        weights = weights[rows] / totals[rows][:, None]
+
+    dag_path, component, count = get_components(geo, rows)
+    if len(rows) and rows[-1] >= count:
+        mc.error('{} weight rows for {} points in {}'.format(rows[-1] + 1, count, geo))
+
+    fn.setWeights(dag_path,
+                  component,
+                  om2.MIntArray(indices),
+                  om2.MDoubleArray(weights.ravel().tolist()),
+                  False)
+
+    if lock:
+        for inf in influences:
+            mc.setAttr(inf + '.liw', 1)
+
+
+#######################################################################################################
+''' Bind pre matrix ''' ###############################################################################
+#######################################################################################################
+
+def get_influence_matrices(skin_clusters):
+    """
+    Influences of every skinCluster, with their world inverse matrices read through the API
+    :return: (list of bindPreMatrix element plugs, (N, 4, 4) numpy array of the matrices to write in them).
+             Elements whose bindPreMatrix is connected are left out.
+    """
+    plugs = list()
+    matrices = list()
+    for skin_cluster in skin_clusters:
+        sel = om2.MSelectionList()
+        sel.add(skin_cluster)
+        fn = om2.MFnDependencyNode(sel.getDependNode(0))
+        matrix_plug = fn.findPlug('matrix', False)
+        bind_plug = fn.findPlug('bindPreMatrix', False)
+
+        for index in matrix_plug.getExistingArrayAttributeIndices():
+            source = matrix_plug.elementByLogicalIndex(index).source()
+            if source.isNull:
+                continue
+            bind_element = bind_plug.elementByLogicalIndex(index)
+            if bind_element.isDestination:
+                continue
+            influence = om2.MDagPath.getAPathTo(source.node())
+            plugs.append(bind_element)
+            matrix = influence.inclusiveMatrixInverse()
+            matrices.append([matrix.getElement(row, column) for row in range(4) for column in range(4)])
+
+    return plugs, np.array(matrices, dtype=float).reshape(-1, 4, 4)
+
+
+def reset_bind_pre_matrices(skin_clusters):
+    """
+    Sets every bindPreMatrix to the current world inverse matrix of its influence, so the skinned geos go back
+    to their undeformed shape at the current pose. All skinClusters are written with one modifier doIt.
+    Connected bindPreMatrix elements are skipped.
+    :return: number of matrices written
+    """
+    plugs, matrices = get_influence_matrices(skin_clusters)
+    modifier = om2.MDGModifier()
+    for plug, matrix in zip(plugs, matrices):
+        data = om2.MFnMatrixData().create(om2.MMatrix(matrix.ravel().tolist()))
+        modifier.newPlugValue(plug, data)
+    modifier.doIt()
+    return len(plugs)
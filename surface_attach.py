@@ -0,0 +1,207 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: surfaceMatrixArray, one node that attaches any number of outputs to a nurbs surface (Python API 2.0).
+       Takes the surface, its world matrix and arrays of normalized uvs (0-1 like follicles) and computes the
+       world matrix of every uv in one pass with nurbs_math, instead of one follicle shape and transform per
+       output each evaluating the surface on its own. Frames have x along dU and z along the surface normal.
+       outputScale scales every output, one connection for a ribbon's global scale.
+
+       Outputs connect to transforms through offsetParentMatrix (maya 2020+, translate and rotate) or through
+       a decomposeMatrix (translate only, or translate and rotate). Targets should sit under a parent at the
+       origin, like follicles do.
+
+Usage:
+    import surface_attach
+    surface_attach.load_plugin()
+    node = surface_attach.create_surface_attach('ribbon_srf', [0.0, 0.5, 1.0], [0.5, 0.5, 0.5])
+    surface_attach.connect_outputs(node, ['a_grp', 'b_grp', 'c_grp'])
+    node, transforms, grp = surface_attach.attach_transforms('ribbon_srf', [0.0, 1.0], [0.5, 0.5], ['a', 'b'], 'a_grp')
+'''
+
+import numpy as np
+
+import maya.cmds as mc
+import maya.api.OpenMaya as om2
+
+import command_buffer
+import name_registry
+import nurbs_math as nmath
+import nurbs_utils
+
+
+def maya_useNewAPI():
+    pass
+
+
+NODE_TYPE = 'surfaceMatrixArray'
+# Autodesk keeps 0x00000 - 0x7ffff for plugins that are never shared, get a registered block before shipping
+NODE_ID = om2.MTypeId(0x0007F1A1)
+
+
+#######################################################################################################
+''' Node ''' ##########################################################################################
+#######################################################################################################
+
+class SurfaceMatrixArray(om2.MPxNode):
+    input_surface = None
+    input_world_matrix = None
+    parameter_u = None
+    parameter_v = None
+    output_scale = None
+    output_matrix = None
+
+    @staticmethod
+    def creator():
+        return SurfaceMatrixArray()
+
+    @classmethod
+    def initialize(cls):
+        typed_fn = om2.MFnTypedAttribute()
+        matrix_fn = om2.MFnMatrixAttribute()
+        numeric_fn = om2.MFnNumericAttribute()
+
+        cls.input_surface = typed_fn.create('inputSurface', 'is', om2.MFnData.kNurbsSurface)
+        typed_fn.storable = False
+        cls.input_world_matrix = matrix_fn.create('inputWorldMatrix', 'iwm', om2.MFnMatrixAttribute.kDouble)
+        matrix_fn.storable = False
+        cls.parameter_u = typed_fn.create('parameterU', 'pu', om2.MFnData.kDoubleArray)
+        cls.parameter_v = typed_fn.create('parameterV', 'pv', om2.MFnData.kDoubleArray)
+        scale = [numeric_fn.create('outputScale' + axis, 'os' + axis.lower(), om2.MFnNumericData.kDouble, 1.0)
+                 for axis in 'XYZ']
+        cls.output_scale = numeric_fn.create('outputScale', 'os', *scale)
+        numeric_fn.keyable = True
+
+        cls.output_matrix = matrix_fn.create('outputMatrix', 'om', om2.MFnMatrixAttribute.kDouble)
+        matrix_fn.array = True
+        matrix_fn.usesArrayDataBuilder = True
+        matrix_fn.writable = False
+        matrix_fn.storable = False
+
+        inputs = (cls.input_surface, cls.input_world_matrix, cls.parameter_u, cls.parameter_v, cls.output_scale)
+        for attribute in inputs + (cls.output_matrix,):
+            cls.addAttribute(attribute)
+        for attribute in inputs:
+            cls.attributeAffects(attribute, cls.output_matrix)
+
+    def compute(self, plug, data):
+        if plug.attribute() != self.output_matrix:
+            return None
+
+        surface = data.inputValue(self.input_surface).asNurbsSurface()
+        world = np.array(list(data.inputValue(self.input_world_matrix).asMatrix())).reshape(4, 4)
+        params_u = om2.MFnDoubleArrayData(data.inputValue(self.parameter_u).data()).array()
+        params_v = om2.MFnDoubleArrayData(data.inputValue(self.parameter_v).data()).array()
+        count = min(len(params_u), len(params_v))
+        scale = np.diag(tuple(data.inputValue(self.output_scale).asDouble3()) + (1.0,))
+
+        output_handle = data.outputArrayValue(self.output_matrix)
+        builder = output_handle.builder()
+        if count and not surface.isNull():
+            frames = nmath.surface_frames(list(params_u)[:count], list(params_v)[:count],
+                                          *nurbs_utils.get_fn_surface_data(om2.MFnNurbsSurface(surface)))
+            for index, matrix in enumerate(np.matmul(np.matmul(scale, frames), world)):
+                builder.addElement(index).setMMatrix(om2.MMatrix(matrix.ravel().tolist()))
+        output_handle.set(builder)
+        output_handle.setAllClean()
+        data.setClean(plug)
+
+
+def initializePlugin(plugin):
+    om2.MFnPlugin(plugin, 'Felipe Sanges', '1.0').registerNode(
+        NODE_TYPE, NODE_ID, SurfaceMatrixArray.creator, SurfaceMatrixArray.initialize)
+
+
+def uninitializePlugin(plugin):
+    om2.MFnPlugin(plugin).deregisterNode(NODE_ID)
+
+
+def load_plugin():
+    """ Loads this file as a plugin, False if it can't be loaded """
+    path = __file__
+    if path.endswith('.pyc'):
+        path = path[:-1]
+    try:
+        if not mc.pluginInfo(path, q=True, loaded=True):
+            mc.loadPlugin(path, quiet=True)
+        return True
+    except RuntimeError:
+        return False
+
+
+#######################################################################################################
+''' Setup ''' #########################################################################################
+#######################################################################################################
+
+def create_surface_attach(surface, params_u, params_v, name=None):
+    """
+    surfaceMatrixArray reading surface, one output per uv
+    :param surface: surface transform
+    :param params_u: normalized u of every output
+    :param params_v: normalized v of every output
+    :return: node name
+    """
+    if not load_plugin():
+        mc.error('Could not load the {} plugin'.format(NODE_TYPE))
+    node = mc.createNode(NODE_TYPE, n=name or '{}_surfaceMatrixArray'.format(surface.split('|')[-1]))
+    mc.connectAttr(nurbs_utils.get_shape(surface, 'nurbsSurface') + '.local', node + '.inputSurface')
+    mc.connectAttr(surface + '.worldMatrix[0]', node + '.inputWorldMatrix')
+    mc.setAttr(node + '.parameterU', [float(u) for u in params_u], type='doubleArray')
+    mc.setAttr(node + '.parameterV', [float(v) for v in params_v], type='doubleArray')
+    return node
+
+
+def connect_outputs(node, targets, mode='offsetParentMatrix', rotate=True, buf=None):
+    """
+    Drives targets with the outputs of a surfaceMatrixArray, outputMatrix[i] goes to targets[i]
+    :param mode: 'offsetParentMatrix' or 'decomposeMatrix'. offsetParentMatrix always brings the rotation along
+    :param rotate: decomposeMatrix mode, connect outputRotate too
+    :param buf: command_buffer.CommandBuffer to record in, flushed here when not given
+    :return: list of the decomposeMatrix nodes, empty in offsetParentMatrix mode
+    """
+    if mode not in ('offsetParentMatrix', 'decomposeMatrix'):
+        raise ValueError('Unknown mode {!r}'.format(mode))
+    flush = buf is None
+    if flush:
+        buf = command_buffer.CommandBuffer()
+
+    decompose_list = list()
+    for index, target in enumerate(targets):
+        output = '{}.outputMatrix[{}]'.format(node, index)
+        if mode == 'offsetParentMatrix':
+            buf.connect(output, (target, 'offsetParentMatrix'))
+            continue
+        decompose = buf.create_node('decomposeMatrix', '{}_dcm'.format(target))
+        buf.connect(output, (decompose, 'inputMatrix'))
+        buf.connect((decompose, 'outputTranslate'), (target, 'translate'))
+        if rotate:
+            buf.connect((decompose, 'outputRotate'), (target, 'rotate'))
+        decompose_list.append(decompose)
+
+    if flush:
+        buf.flush()
+        return [str(decompose) for decompose in decompose_list]
+    return decompose_list
+
+
+def attach_transforms(surface, params_u, params_v, names, group=None, rotate=True, name=None):
+    """
+    One surfaceMatrixArray placing a new transform per uv, the follicle free version of
+    follicle_factory.create_follicles. Transforms and connections go through one command_buffer flush.
+    :param names: transform names
+    :param group: parent of the transforms, created when it doesn't exist
+    :param rotate: offsetParentMatrix when True, translate only through decomposeMatrix when False
+    :param name: node name
+    :return: (node, transforms, group)
+    """
+    node = create_surface_attach(surface, params_u, params_v, name=name)
+    buf = command_buffer.CommandBuffer()
+    if group is not None and not name_registry.exists(group):
+        group = buf.create_node('transform', group)
+
+    transforms = [buf.create_node('transform', transform, parent=group) for transform in names]
+    # offsetParentMatrix brings the rotation along, translate only goes through decomposeMatrix
+    connect_outputs(node, transforms, 'offsetParentMatrix' if rotate else 'decomposeMatrix', rotate=rotate, buf=buf)
+    buf.flush()
+    return node, [str(transform) for transform in transforms], group and str(group)
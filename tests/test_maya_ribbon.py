@@ -0,0 +1,66 @@
+'''
+MatrixRibbon builds in Maya. Needs mayapy with kmd and the ribbon plugins, skipped anywhere else:
+    mayapy -m pytest tests/test_maya_ribbon.py
+'''
+
+import numpy as np
+import pytest
+
+standalone = pytest.importorskip('maya.standalone')
+
+import ribbon_benchmark
+
+
+@pytest.fixture(scope='module')
+def matrix_ribbon():
+    standalone.initialize()
+    try:
+        return ribbon_benchmark.load_matrix_ribbon()
+    except ImportError as e:
+        pytest.skip(str(e))
+
+
+def build(module, backend, name):
+    """ New scene with a 3 layers one dimension ribbon, get_return_dict() of the build """
+    import maya.cmds as mc
+    mc.file(new=True, force=True)
+    ribbon = module.MatrixRibbon()
+    ribbon.set_name(name)
+    ribbon.one_dimension = True
+    ribbon.num_layers = 3
+    ribbon.lyr_density_u = (1, 4, 16)
+    ribbon.lyr_density_v = (1, 1, 1)
+    ribbon.set_backend(backend)
+    ribbon.initial_build()
+    return ribbon.get_return_dict()
+
+
+def posed_surface(module, backend, output_index):
+    """ World cvs of the output surface with a control of the first two layers moved """
+    import maya.cmds as mc
+    import nurbs_utils
+    result = build(module, backend, 'cmp')
+    # the stack's last layer doesn't deform a surface, only its bind joints
+    for ctrls in result['ctrls_lists'][:2]:
+        mc.move(0.0, 1.0, 0.5, ctrls[len(ctrls) // 2], relative=True, worldSpace=True)
+    return nurbs_utils.get_surface_data(result['surface_list'][output_index])[0]
+
+
+def test_deformer_matches_stack(matrix_ribbon):
+    stack = posed_surface(matrix_ribbon, 'stack', -1)
+    deformer = posed_surface(matrix_ribbon, 'deformer', 0)
+    assert stack.shape == deformer.shape
+    np.testing.assert_allclose(deformer, stack, atol=1e-3)
+
+
+def test_deformer_has_no_cycle(matrix_ribbon):
+    import maya.cmds as mc
+    result = build(matrix_ribbon, 'deformer', 'cycle')
+    mc.evaluationManager(mode='parallel')
+    mc.evaluationManager(invalidate=True)
+    # builds the evaluation graph
+    mc.currentTime(2)
+    mc.currentTime(1)
+    for node in [result['deformer']] + result['frame_nodes']:
+        cluster = mc.evaluationManager(cycleCluster=node) or []
+        assert not set(cluster) - {node}, '{} is in a cycle with {}'.format(node, cluster)
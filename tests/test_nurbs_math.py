@@ -0,0 +1,174 @@
+import numpy as np
+
+import nurbs_math as nmath
+import ribbon_weights
+
+
+# clamped, non uniform and with a double knot, what a rebuilt or inserted into curve ends up with
+KNOTS = np.array([0.0, 0.0, 0.0, 0.0, 0.1, 0.35, 0.35, 0.6, 1.0, 1.0, 1.0, 1.0])
+DEGREE = 3
+# away from the knots, where the basis is smooth
+PARAMS = np.array([0.03, 0.23, 0.3, 0.42, 0.55, 0.77, 0.95])
+
+
+def derivative_matrix(params, knots, degree, order):
+    """ Dense (len(params) x numCVs) matrix of the order-th basis derivatives """
+    spans, derivatives = nmath.basis_function_derivatives(params, knots, degree, order)
+    matrix = np.zeros((len(params), len(knots) - degree - 1))
+    for k, span in enumerate(spans):
+        matrix[k, span - degree:span + 1] = derivatives[k, order]
+    return matrix
+
+
+def assert_weights(matrix):
+    """ No negatives and rows summing to 1, what a skinCluster expects """
+    matrix = np.asarray(matrix)
+    assert matrix.min() >= 0.0
+    np.testing.assert_allclose(matrix.sum(axis=1), 1.0, atol=1e-12)
+
+
+#######################################################################################################
+''' Basis ''' #########################################################################################
+#######################################################################################################
+
+def test_basis_function_derivatives_match_finite_differences():
+    step = 1e-6
+    for degree in (1, 2, 3):
+        knots = nmath.open_uniform_knots(7, degree) if degree < DEGREE else KNOTS
+        first = derivative_matrix(PARAMS, knots, degree, 1)
+        expected = (nmath.basis_matrix(PARAMS + step, knots, degree) -
+                    nmath.basis_matrix(PARAMS - step, knots, degree)) / (2.0 * step)
+        np.testing.assert_allclose(first, expected, atol=1e-5)
+        if degree > 1:
+            second = derivative_matrix(PARAMS, knots, degree, 2)
+            expected = (derivative_matrix(PARAMS + step, knots, degree, 1) -
+                        derivative_matrix(PARAMS - step, knots, degree, 1)) / (2.0 * step)
+            np.testing.assert_allclose(second, expected, atol=1e-3)
+
+
+def test_basis_function_derivatives_order_zero_is_basis():
+    spans, derivatives = nmath.basis_function_derivatives(PARAMS, KNOTS, DEGREE, order=4)
+    np.testing.assert_allclose(derivatives[:, 0], nmath.basis_functions(PARAMS, KNOTS, DEGREE)[1])
+    # over the degree the basis is constant
+    np.testing.assert_array_equal(derivatives[:, 4], 0.0)
+
+
+def test_basis_matrix_partition_of_unity():
+    params = np.concatenate([[0.0, 0.1, 0.35, 1.0], np.random.RandomState(1).rand(50)])
+    for degree in (1, 2, 3):
+        knots = nmath.open_uniform_knots(9, degree) if degree < DEGREE else KNOTS
+        assert_weights(nmath.basis_matrix(params, knots, degree))
+        np.testing.assert_allclose(nmath.basis_matrix_sparse(params, knots, degree).toarray(),
+                                   nmath.basis_matrix(params, knots, degree))
+
+
+#######################################################################################################
+''' Curves and surfaces ''' ###########################################################################
+#######################################################################################################
+
+def test_curve_derivatives_match_hodograph():
+    cvs = np.random.RandomState(2).rand(len(KNOTS) - DEGREE - 1, 3)
+    params = np.linspace(0.0, 1.0, 21)
+    d_cvs, d_knots, d_degree = nmath.derivative_curve(cvs, KNOTS, DEGREE)
+    first = nmath.evaluate_curve(params, d_cvs, d_knots, d_degree)
+    points, derivatives = nmath.curve_derivatives(params, cvs, KNOTS, DEGREE)
+    np.testing.assert_allclose(points, nmath.evaluate_curve(params, cvs, KNOTS, DEGREE), atol=1e-12)
+    np.testing.assert_allclose(derivatives, first, atol=1e-9)
+    np.testing.assert_allclose(nmath.curve_tangents(params, cvs, KNOTS, DEGREE),
+                               first / np.linalg.norm(first, axis=1)[:, None], atol=1e-9)
+
+
+def test_surface_normals_on_plane():
+    # cvs moved around inside the y = 2 plane, u along x and v along z
+    random = np.random.RandomState(3)
+    grid = np.stack(np.meshgrid(np.arange(5.0), np.arange(4.0), indexing='ij'), axis=-1)
+    grid += random.uniform(-0.2, 0.2, grid.shape)
+    cvs = np.stack([grid[..., 0], np.full(grid.shape[:2], 2.0), grid[..., 1]], axis=-1)
+    knots_u, knots_v = nmath.open_uniform_knots(5, 3), nmath.open_uniform_knots(4, 2)
+    params_u, params_v = random.rand(2, 30)
+    normals = nmath.surface_normals(params_u, params_v, cvs, knots_u, knots_v, 3, 2)
+    # x cross z
+    np.testing.assert_allclose(normals, np.tile([0.0, -1.0, 0.0], (30, 1)), atol=1e-12)
+
+
+def test_surface_normals_on_extrusion():
+    # a curve in xz extruded along y, a generalized cylinder: normals are the curve's in plane normal
+    profile = np.random.RandomState(4).rand(len(KNOTS) - DEGREE - 1, 3)
+    profile[:, 1] = 0.0
+    cvs = np.stack([profile, profile + [0.0, 3.0, 0.0]], axis=1)
+    knots_v = nmath.open_uniform_knots(2, 1)
+    params_v = np.linspace(0.0, 1.0, len(PARAMS))
+    normals = nmath.surface_normals(PARAMS, params_v, cvs, KNOTS, knots_v, DEGREE, 1)
+    tangents = nmath.curve_tangents(PARAMS, profile, KNOTS, DEGREE)
+    np.testing.assert_allclose(normals, np.cross(tangents, [0.0, 1.0, 0.0]), atol=1e-12)
+
+
+#######################################################################################################
+''' Refinement ''' ####################################################################################
+#######################################################################################################
+
+def test_refinement_matrix_non_nested_spans():
+    # 5 -> 256 spans are not nested, this goes through the least squares fit
+    for spans in (2, 5, 6, 16):
+        assert_weights(ribbon_weights.direction_refinement(spans, 256))
+
+
+def test_refinement_matrix_nested_is_exact():
+    knots, degree, count = ribbon_weights.layer_knots(4)
+    fine_knots, fine_degree, fine_count = ribbon_weights.layer_knots(16)
+    matrix = nmath.refinement_matrix(knots, degree, fine_knots, fine_degree)
+    assert_weights(matrix)
+    cvs = np.random.RandomState(0).rand(count, 3)
+    params = np.linspace(0.0, 1.0, 33)
+    np.testing.assert_allclose(nmath.evaluate_curve(params, matrix.dot(cvs), fine_knots, fine_degree),
+                               nmath.evaluate_curve(params, cvs, knots, degree), atol=1e-12)
+
+
+def test_refinement_matrix_partition_of_unity():
+    for degree, fine_degree, fine_count in ((3, 3, 13), (2, 3, 10), (1, 2, 6), (3, 2, 9)):
+        knots = KNOTS if degree == DEGREE else nmath.open_uniform_knots(5, degree)
+        fine_knots = nmath.open_uniform_knots(fine_count, fine_degree)
+        assert_weights(nmath.refinement_matrix(knots, degree, fine_knots, fine_degree))
+
+
+def test_ribbon_layer_weights_defaults():
+    for density in ((1, 1, 2, 5), (1, 2, 6, 16)):
+        for one_dimension in (True, False):
+            for weights in ribbon_weights.ribbon_layer_weights(density, (1,) * len(density), len(density),
+                                                               one_dimension):
+                assert_weights(weights)
+
+
+def test_wire_layer_weights():
+    corners = [[[0.0, 0.0, 0.0], [0.0, 0.0, 10.0]], [[10.0, 0.0, 0.0], [10.0, 0.0, 10.0]]]
+    driver_cvs = ribbon_weights.layer_surface_data(corners, 16, 1)[0]
+    for spans in (1, 2, 5):
+        weights = ribbon_weights.wire_layer_weights(ribbon_weights.layer_surface_data(corners, spans, 1), driver_cvs)
+        assert weights.shape == (driver_cvs.shape[0] * driver_cvs.shape[1], spans + 1)
+        assert_weights(weights)
+    # a linear wire weights every cv by where it sits along the ribbon
+    weights = ribbon_weights.wire_layer_weights(ribbon_weights.layer_surface_data(corners, 1, 1), driver_cvs)
+    along = driver_cvs[:, :, 0].ravel() / 10.0
+    np.testing.assert_allclose(weights, np.stack([1.0 - along, along], axis=1), atol=1e-9)
+
+
+def test_scale_network_matches_per_pair_sums():
+    rng = np.random.RandomState(3)
+    weights = rng.uniform(-0.5, 1.0, (5, 9))
+    weights[rng.uniform(size=weights.shape) < 0.5] = 0.0
+    weights[2] = 0.0
+    scales = rng.uniform(0.2, 3.0, (5, 3))
+    # one scale matrix per (joint, locator) pair, the network before pruning
+    per_pair = [sum(weights[j, i] * np.diag(np.append(scales[j], 1.0)) for j in range(len(weights)))
+                for i in range(weights.shape[1])]
+
+    entries = ribbon_weights.scale_network(weights)
+    assert all(weights[joint, locator] != 0.0 for joint, locator, _ in entries)
+    assert 2 not in [joint for joint, _, _ in entries]
+    pruned = [dict() for _ in range(weights.shape[1])]
+    for joint, locator, element in entries:
+        assert element not in pruned[locator]
+        pruned[locator][element] = weights[joint, locator] * np.diag(np.append(scales[joint], 1.0))
+    for locator, elements in enumerate(pruned):
+        assert sorted(elements) == list(range(len(elements)))
+        np.testing.assert_allclose(sum(elements.values(), np.zeros((4, 4))), per_pair[locator])
@@ -0,0 +1,214 @@
+'''
+Copyright MIT 2017
+Author: Felipe Sanges
+
+About: Memoized layer weights. Ribbons built with the same layout (num layers, densities, direction, degree)
+       get the same weights, so they are computed once per session and kept in an LRU cache. With a directory
+       set (set_directory or the FSRIGLIB_WEIGHT_CACHE environment variable) they are also saved as npz files
+       and shared between sessions and machines. Keys are a hash of the layout and WEIGHTS_VERSION.
+
+       Cached arrays are read only, they are shared between every ribbon asking for them.
+
+Usage:
+    import weight_cache
+    weight_cache.set_directory('/pipeline/cache/ribbon_weights')
+    weights = weight_cache.ribbon_layer_weights((1, 1, 2, 5), (1, 1, 1, 1), 4)
+    basis = weight_cache.grid_basis_matrix(10, 4, 7, 4, degree=3)
+    bases = weight_cache.grid_basis_matrices([(10, 4, 7, 4), (40, 40, 33, 33)], workers=4)
+    print(weight_cache.stats())
+'''
+
+import collections
+import functools
+import hashlib
+import os
+
+import numpy as np
+
+import nurbs_math as nmath
+import ribbon_weights
+
+# Bump when ribbon_weights or nurbs_math change the weights they return, old disk entries are then ignored
+WEIGHTS_VERSION = 2
+ENVIRONMENT_VARIABLE = 'FSRIGLIB_WEIGHT_CACHE'
+
+
+class WeightCache(object):
+    """
+    LRU of computed weights with an optional npz copy on disk.
+    Values are a list of dense arrays or a nurbs_math.SparseMatrix.
+    :param maxsize: entries kept in memory
+    :param directory: folder of the npz files, None to only cache in memory
+    """
+
+    def __init__(self, maxsize=64, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name, args):
+        data = repr((WEIGHTS_VERSION, name, args)).encode('utf-8')
+        return '{}_{}'.format(name, hashlib.sha1(data).hexdigest())
+
+    def get(self, name, compute, *args):
+        """
+        Cached value of compute(*args), args must be plain python values (their repr is the key)
+        """
+        value = self.find(name, args)
+        if value is None:
+            value = self.add(name, args, compute(*args))
+        return value
+
+    def find(self, name, args):
+        """ Value stored for args in memory or on disk, None when it has to be computed """
+        key = self.key(name, args)
+        if key in self.entries:
+            self.hits += 1
+            # most recently used goes last
+            value = self.entries.pop(key)
+            self.entries[key] = value
+            return value
+
+        value = self.load(key)
+        if value is not None:
+            self.disk_hits += 1
+            self.store(key, value)
+        return value
+
+    def add(self, name, args, value):
+        """ Stores a value find() didn't have, counted as a miss """
+        key = self.key(name, args)
+        self.misses += 1
+        self.save(key, value)
+        return self.store(key, value)
+
+    def store(self, key, value):
+        self.entries[key] = _read_only(value)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return value
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def load(self, key):
+        if not self.directory or not os.path.isfile(self.path(key)):
+            return None
+        try:
+            with np.load(self.path(key)) as data:
+                return _from_arrays(dict((name, data[name]) for name in data.files))
+        except (IOError, OSError, ValueError, KeyError):
+            # unreadable or half written by another session, computed again
+            return None
+
+    def save(self, key, value):
+        if not self.directory:
+            return
+        path = self.path(key)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(temp_path, 'wb') as f:
+                np.savez_compressed(f, **_to_arrays(value))
+            if not os.path.isfile(path):
+                os.rename(temp_path, path)
+        except (IOError, OSError):
+            # read only or shared folder written at the same time, the memory cache still works
+            pass
+        finally:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+
+    def clear(self, disk=False):
+        """ Empties the memory cache and resets the counters, disk=True deletes the npz files too """
+        self.entries.clear()
+        self.hits = self.disk_hits = self.misses = 0
+        if disk and self.directory and os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, file_name))
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'size': len(self.entries), 'maxsize': self.maxsize, 'directory': self.directory}
+
+
+def _to_arrays(value):
+    if isinstance(value, nmath.SparseMatrix):
+        return {'rows': value.rows, 'cols': value.cols, 'values': value.values, 'shape': np.array(value.shape)}
+    return dict(('layer_{}'.format(index), array) for index, array in enumerate(value))
+
+
+def _from_arrays(arrays):
+    if 'shape' in arrays:
+        return nmath.SparseMatrix(arrays['rows'], arrays['cols'], arrays['values'],
+                                  tuple(int(n) for n in arrays['shape']))
+    return [arrays['layer_{}'.format(index)] for index in range(len(arrays))]
+
+
+def _read_only(value):
+    arrays = (value.rows, value.cols, value.values) if isinstance(value, nmath.SparseMatrix) else value
+    for array in arrays:
+        array.flags.writeable = False
+    return value
+
+
+# Kept when the module is reloaded, a rebuild of the rig tools doesn't lose the session's weights
+try:
+    cache
+except NameError:
+    cache = WeightCache(directory=os.environ.get(ENVIRONMENT_VARIABLE) or None)
+
+
+#######################################################################################################
+''' Cached weights ''' ################################################################################
+#######################################################################################################
+
+def ribbon_layer_weights(density_u, density_v, num_layers, one_dimension=True, direction='u', workers=None):
+    """ ribbon_weights.ribbon_layer_weights through the cache, workers only matter on a miss """
+    compute = functools.partial(ribbon_weights.ribbon_layer_weights, workers=workers)
+    return cache.get('ribbon_layer_weights', compute,
+                     tuple(int(d) for d in density_u[:num_layers]), tuple(int(d) for d in density_v[:num_layers]),
+                     int(num_layers), bool(one_dimension), str(direction))
+
+
+def grid_basis_matrix(sample_count_u, sample_count_v, cv_count_u, cv_count_v, degree=3):
+    """ nurbs_math.grid_basis_matrix through the cache """
+    return cache.get('grid_basis_matrix', nmath.grid_basis_matrix, int(sample_count_u), int(sample_count_v),
+                     int(cv_count_u), int(cv_count_v), int(degree))
+
+
+def grid_basis_matrices(sizes, degree=3, workers=None):
+    """
+    grid_basis_matrix of every layer at once, the ones missing from the cache are computed in parallel
+    :param sizes: (sample_count_u, sample_count_v, cv_count_u, cv_count_v) of every layer
+    :param workers: processes computing the misses, see ribbon_weights.map_layers
+    :return: list of SparseMatrix in the order of sizes
+    """
+    args_list = [tuple(int(n) for n in size) + (int(degree),) for size in sizes]
+    values = [cache.find('grid_basis_matrix', args) for args in args_list]
+    # layers with the same size are computed once
+    missing = sorted(set(args for args, value in zip(args_list, values) if value is None))
+    computed = dict(zip(missing, ribbon_weights.map_layers(nmath.grid_basis_matrix, missing, workers)))
+    for args in missing:
+        cache.add('grid_basis_matrix', args, computed[args])
+    return [computed[args] if value is None else value for args, value in zip(args_list, values)]
+
+
+def set_directory(directory):
+    """ Folder of the on disk cache, None turns it off """
+    cache.directory = directory
+
+
+def stats():
+    """ {'hits', 'disk_hits', 'misses', 'size', 'maxsize', 'directory'} of the session """
+    return cache.stats()
+
+
+def clear(disk=False):
+    cache.clear(disk)
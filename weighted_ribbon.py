@@ -9,6 +9,10 @@ deformation weights (Other surface degrees to be implemented yet).
 OBS : The hole system uses the bindPreMatrix of each skinCluster, allowing it to follow any deformation applied to the 
 driverSurface.
 
+Layer weights come from ribbon_weights: the knot refinement matrix between each layer and the driver surfaces.
+Controls layout (cv indices, follicle uvs, names) comes from ribbon_layout, computed once before the build.
+With surfaceAttach=True the controls hang from one surface_attach node per layer instead of one follicle each.
+
 This script is a work in progress. There's a lot of improvements to be made and I apologize for the dirty code :/ But it works :)
 ToDo:
         -Recreate UI with QT
@@ -21,15 +25,34 @@ DEPENDENCIES:
 '''
 
 import maya.cmds as mc
-import maya.mel as mel
 import string
-import maya.OpenMaya as om
 
 # Import shape module
 import controlCurveShapes as ccs
 reload(ccs)
-
-
+import skin_weights
+reload(skin_weights)
+import ribbon_weights
+reload(ribbon_weights)
+import weight_cache
+reload(weight_cache)
+import ribbon_layout
+reload(ribbon_layout)
+import command_buffer
+reload(command_buffer)
+import follicle_factory
+reload(follicle_factory)
+import name_registry
+reload(name_registry)
+import nurbs_utils
+reload(nurbs_utils)
+import build_transaction
+reload(build_transaction)
+import surface_attach
+reload(surface_attach)
+
+
+@build_transaction.BuildTransaction('createRibbon')
 def createRibbon(
     scale=0.10,
     edgeAtOrigin=True,
@@ -46,7 +69,8 @@ def createRibbon(
     autoCtrlCurves=True,
     rotationOn = True,
     direction = 'u',
-    createOutMesh = True
+    createOutMesh = True,
+    surfaceAttach = False
     ):
 
     '''-
@@ -68,7 +92,8 @@ def createRibbon(
                 oneDimension=True,          # = One dimension line of controls or 2d plane with collumns and rows of cotrols - BROKEN
                 numLayers=4,                # = Number of control layers
                 lyrDensityU=[1, 1, 2, 5],   # = Number of control per layer in U
-                lyrDensityV=[1, 1, 1, 1, 1] # = Number of control per layer in V
+                lyrDensityV=[1, 1, 1, 1, 1],# = Number of control per layer in V
+                surfaceAttach=False         # = One surfaceMatrixArray node per layer instead of follicles
                 )
     '''
 
@@ -117,12 +142,12 @@ def createRibbon(
     '''Basic grps'''
     #Create basic grps
     topGrp = prefix + 'rig_grp'
-    if not mc.objExists(topGrp):
+    if not name_registry.exists(topGrp):
         topGrp = mc.createNode('transform', n=topGrp)
 
     #Create connection top grp
     connectionLayerNode = prefix + 'connectionLayer'
-    if not mc.objExists(connectionLayerNode):
+    if not name_registry.exists(connectionLayerNode):
         connectionLayerNode = mc.createNode('transform', n=connectionLayerNode)
 
     mc.parent(connectionLayerNode, topGrp)
@@ -145,70 +170,30 @@ def createRibbon(
         driverSurfaceList.append(driverSurface)
 
 
+    #Controls layout of every layer, cv indices, uvs and names read once from the surfaces
+    layout = ribbon_layout.get_ribbon_layout(layerGeos, driverSurfaceList, surfLyr, oneDimension, direction)
+
     #add follicles
     allFol, cvTags, allLyrJointList, folTopGrp, follicleGrpList, allListOfCtrlsList = addFolliclesToAll(prefix, '', numLayers, surfLyr,
                                                                                     layerGeos, connectionLayerNode,
-                                                                                    True, '', rotationOn, oneDimension, driverSurfaceList,
-                                                                                    direction)
+                                                                                    False, '', rotationOn, oneDimension, driverSurfaceList,
+                                                                                    direction, layout=layout,
+                                                                                    surfaceAttach=surfaceAttach)
 
     #Create base surface
     baseSurf = mc.duplicate(layerGeos[-1], n='%sbase_surf'%prefix)[0]
 
-    '''def'''
-    #def
-    #Deform layerGeos to generate weitghts on the driver surface
-    layerGeos, driverSurfaceList, surfLyr, allListOfCtrlsList
-
-    #move ctrls and mesure distance
-
     #create blendshape to next surf
     blnd = mc.blendShape(baseSurf, driverSurfaceList[0], frontOfChain=True, n=prefix + 'base_blnd')[0]
     targets = mc.listAttr(blnd + '.w', m=1)
     mc.setAttr(blnd + '.' + targets[0], 1, lock=1)
 
-    for x in range(0, numLayers-1):
-        wrapSurf = layerGeos[x]
-        wrapped = mc.duplicate(driverSurfaceList[x], n = driverSurfaceList[x] + '_TMP')[0]
-
-        mc.select(wrapped, wrapSurf, r=True)
-        mel.eval('CreateWrap ;')
+    #Exact weights of every layer on the driver surfaces, computed from the layers knot vectors (cached by layout)
+    layerWeights = weight_cache.ribbon_layer_weights(densityU, densityV, numLayers, oneDimension, direction)
 
+    for x in range(0, numLayers-1):
         bindJs = allListOfCtrlsList[x]
 
-        cvs = mc.ls(wrapped + '.cv[*][*]', fl=1)
-
-        allDisplacement = []
-        #j = bindJs[0]
-        for j in bindJs:
-
-            pos = mc.xform(j, q=1, ws=1, rp=1)
-
-            displacement = []
-            #v = vtxSmoothed[0]
-            for v in cvs:
-                #get initial pos
-                iniPos = mc.pointPosition(v, world=1)
-
-
-                #get deformed pos
-                mc.move(0, -1, 0, j, relative=1)
-                defPos = mc.pointPosition(v, world=1)
-
-                #get distance between them
-                iniPosV = om.MVector(iniPos[0], iniPos[1], iniPos[2])
-                defPosV = om.MVector(defPos[0], defPos[1], defPos[2])
-
-                resultV = defPosV - iniPosV
-
-                length = resultV.length()
-                displacement.append(length)
-
-                mc.move(0, 1, 0, j, relative=1)
-
-            allDisplacement.append(displacement)
-
-        mc.delete(wrapped)
-
         #Create blnd skinned
         #blndSkndSurf = mc.duplicate(driverSurfaceList[x], n = driverSurfaceList[x].replace('driver', 'blndSkndSurf'))[0]
         blndSkndSurf = driverSurfaceList[x+1]
@@ -222,16 +207,9 @@ def createRibbon(
         outSkin = mc.skinCluster( bindJs, blndSkndSurf, dr=4.5, maximumInfluences=1, frontOfChain=0, toSelectedBones=1, n = 'outMesh_skC')
 
         #set weights
-        for i, j in enumerate(bindJs):
-            for y, dis in enumerate(allDisplacement[i]):
-                normValue = dis
-                mc.skinPercent(outSkin[0], blndSkndSurf + '.' + cvs[y].split('.')[1], transformValue=[(j, normValue)])
-                mc.setAttr(j + '.liw', 1)
+        skin_weights.set_skin_weights(outSkin[0], blndSkndSurf, layerWeights[x], influences=bindJs, lock=True)
 
         #Connect prebindMatrix
-        mc.select('%s.cv[*:*]' % (blndSkndSurf), r=1)
-        cvs = mc.ls(sl=1, fl=1)
-
         if outSkin:
             for i in range(len(bindJs)):
                 if mc.attributeQuery('parentMatrixPath', node=bindJs[i], exists=True):
@@ -260,8 +238,6 @@ def createNormPlane(prefix,
                     densityV,
                     connectionLayerNode,
                     sAttributeName):
-    #return list with surf names
-    layerSurfaces = []
     #layerNum = 1 #tmp
     #Create conlyr
     conlyr = mc.createNode('transform', n=prefix + 'surfaces_connectionLayer' + driven)
@@ -270,70 +246,17 @@ def createNormPlane(prefix,
     #Create sufaces parent
     surfGrp = mc.createNode('transform', n=prefix + 'surfaces_grp' + driven)
 
-    for layerNum in range(1, numLayers + 1):
+    #Cvs of the linear single span plane, every layer is generated from its corners
+    corners = nurbs_utils.get_surface_data(basePlane)[0]
 
-        lyrTag = surfLyr[layerNum - 1]
+    layerSurfaces = ribbon_layout.create_layer_surfaces(
+        corners, densityU[:numLayers], densityV[:numLayers],
+        [prefix + 'plane_' + lyrTag + '_surf' + driven for lyrTag in surfLyr[:numLayers]], surfGrp)
 
-        #plane name and
-        surface = prefix + 'plane_' + lyrTag + '_surf' + driven
-        surface = mc.duplicate(basePlane, n=surface)[0]
-        mc.parent(surface, surfGrp)
-        layerSurfaces.append(surface)
-        #Add message attr
+    #Add message attr
+    for surface in layerSurfaces:
         connectMessageAttr(conlyr, surface, sAttributeName)
 
-        #num of spans
-        spansU = densityU[layerNum - 1]
-        spansV = densityV[layerNum - 1]
-
-        #misc
-        rebuildType = 0
-        degreeU = 1
-        degreeV = 1
-
-        #Create linear first to get the right spacing
-        mc.rebuildSurface(
-            surface,
-            constructionHistory=0,
-            replaceOriginal=1,
-            rebuildType=rebuildType,
-            endKnots=1,
-            keepRange=0,
-            keepControlPoints=0,
-            keepCorners=0,
-            spansU=spansU,
-            degreeU=degreeU,
-            spansV=spansV,
-            degreeV=degreeV,
-            tolerance=0,
-            fitRebuild=0,
-            direction=2
-        )
-        #Rebuild it to quadratic maintaining cvs pos
-        #Check if lyr A is linear
-        if spansU != 1:
-            degreeU = 2
-        if spansV != 1:
-            degreeV = 2
-
-        mc.rebuildSurface(
-            surface,
-            constructionHistory=0,
-            replaceOriginal=1,
-            rebuildType=rebuildType,
-            endKnots=1,
-            keepRange=0,
-            keepControlPoints=1,
-            keepCorners=0,
-            spansU=spansU,
-            degreeU=degreeU,
-            spansV=spansV,
-            degreeV=degreeV,
-            tolerance=0,
-            fitRebuild=0,
-            direction=2
-        )
-
     #mc.delete(basePlane)
 
     return (layerSurfaces, surfGrp)
@@ -369,183 +292,70 @@ def connectMessageAttr(lyrGrp, object, sAttributeName):
             mc.connectAttr(lyrGrp + '.message', obj + '.' + sAttributeName)
 
 
-def follicleFromCvs(prefix, driven, currentLyrGeo, lyrCvs, tag, rotationOn):
-    cvTagNumList = []
-    follicleList = []
-
-    for p in lyrCvs:
-
-        #get name colunms and rows from cv name function
-        rowCol = getCvColRow(p)
-
-        name = prefix + 'layer_' + tag + '_' + rowCol[0] + '_' + rowCol[1]
-        #if
-
-        cvTagNumList.append(tag + '_' + rowCol[0] + '_' + rowCol[1])
-
-        #Create follicle grp
-        folP = prefix + 'follicles_' + tag + '_grp' + driven
-        if not (mc.objExists(folP)):
-            folP = mc.createNode('transform', n=folP)
-
-        #Create follicle transform and shape
-        fol = mc.createNode('transform', n=name + '_follicle_n' + driven, p=folP)
-        follicleList.append(fol)
-        fols = mc.createNode('follicle', p=fol, n=name + '_follicleShape' + driven)
-        #hide shape
-        mc.setAttr(fols + '.v', 0, lock=True)
-
-        #Connect to currentLyrGeo
-        mc.connectAttr(currentLyrGeo + '.worldMatrix[0]', fols + '.inputWorldMatrix')
-        mc.connectAttr(currentLyrGeo + '.local', fols + '.inputSurface')
-        mc.connectAttr(fols + '.outTranslate', fol + '.translate')
+def follicleFromCvs(prefix, driven, currentLyrGeo, lyrLayout, rotationOn, surfaceAttach=False):
+    """ One follicle per control of a ribbon_layout.LayerLayout, uvs come precomputed in the layout.
+        Every node, connection and setAttr goes through one follicle_factory flush.
+    """
+    if surfaceAttach:
+        return attachFromCvs(prefix, driven, currentLyrGeo, lyrLayout, rotationOn)
 
-        #connect rotation if needed
-        if rotationOn:
-            mc.connectAttr(fols + '.outRotate', fol + '.rotate')
-
-        #Create loc on point
-        pos = mc.xform(p, q=1, t=1, ws=1)
-        loc = mc.spaceLocator(n='pos_loc')[0]
-        mc.move(pos[0], pos[1], pos[2], loc, rpr=1)
-        mc.parent(loc, currentLyrGeo)
-
-        uRng = mc.getAttr(currentLyrGeo + '.minMaxRangeU')
-        vRng = mc.getAttr(currentLyrGeo + '.minMaxRangeV')
-
-        #Create node closestPointOnSurface
-        pointSurf = mc.createNode('closestPointOnSurface', n='tmp_closestPointOnSurface_1')
-        mc.connectAttr(currentLyrGeo + '.local', pointSurf + '.inputSurface')
-        mc.connectAttr(loc + '.translate', pointSurf + '.inPosition')
-
-        #Get uv coords
-        u = mc.getAttr(pointSurf + '.u')
-        v = mc.getAttr(pointSurf + '.v')
-
-        #Normalized uv's then set follicle paramenters
-        normU = abs(u / uRng[0][1])
-        normV = abs(v / vRng[0][1])
-
-        mc.setAttr(fols + '.parameterU', normU)
-        mc.setAttr(fols + '.parameterV', normV)
-
-        mc.delete(pointSurf, loc)
+    cvTagNumList = list(lyrLayout.tags)
+    names = [prefix + 'layer_' + cvTag for cvTag in cvTagNumList]
+    follicleList, follicleShapes, folP = follicle_factory.create_follicles(
+        currentLyrGeo, lyrLayout.params_u, lyrLayout.params_v, [name + '_follicle_n' + driven for name in names],
+        shape_names=[name + '_follicleShape' + driven for name in names],
+        group=prefix + 'follicles_' + lyrLayout.tag + '_grp' + driven, rotate=rotationOn, hide=True)
 
     return (follicleList, cvTagNumList, folP)
 
 
-def follicleFromCvsOneD(prefix, driven, currentLyrGeo, lyrCvs, tag, rotationOn, direction):
-    cvTagNumList = []
-    follicleList = []
-
-    for p in lyrCvs:
-
-        #get name colunms and rows from cv name function
-        if direction == 'u':
-            rowCol = getCvColRow(p)
-        else:
-            tmpRowCol = getCvColRow(p)
-            rowCol = [tmpRowCol[1], tmpRowCol[0]]
-
-
-
-        if rowCol[1] == '00':
-            name = prefix + 'layer_' + tag + '_' + rowCol[0]
-
-            cvTagNumList.append(tag + '_' + rowCol[0])
-
-            #Create follicle grp
-            folP = prefix + 'follicles_' + tag + '_grp' + driven
-            if not (mc.objExists(folP)):
-                folP = mc.createNode('transform', n=folP)
+def attachFromCvs(prefix, driven, currentLyrGeo, lyrLayout, rotationOn):
+    """ follicleFromCvs with one surface_attach node for the whole layer. The '_follicle_n' transforms keep
+        their names but are plain transforms placed by the node's outputMatrix.
+    """
+    cvTagNumList = list(lyrLayout.tags)
+    node, follicleList, folP = surface_attach.attach_transforms(
+        currentLyrGeo, lyrLayout.params_u, lyrLayout.params_v,
+        [prefix + 'layer_' + cvTag + '_follicle_n' + driven for cvTag in cvTagNumList],
+        group=prefix + 'follicles_' + lyrLayout.tag + '_grp' + driven, rotate=rotationOn,
+        name=prefix + 'attach_' + lyrLayout.tag + driven)
 
-            #Create follicle transform and shape
-            fol = mc.createNode('transform', n=name + '_follicle_n' + driven, p=folP)
-            follicleList.append(fol)
-            fols = mc.createNode('follicle', p=fol, n=name + '_follicleShape' + driven)
-            #hide shape
-            mc.setAttr(fols + '.v', 0, lock=True)
-
-            #Connect to currentLyrGeo
-            mc.connectAttr(currentLyrGeo + '.worldMatrix[0]', fols + '.inputWorldMatrix')
-            mc.connectAttr(currentLyrGeo + '.local', fols + '.inputSurface')
-            mc.connectAttr(fols + '.outTranslate', fol + '.translate')
-
-            #connect rotation if needed
-            if rotationOn:
-                mc.connectAttr(fols + '.outRotate', fol + '.rotate')
-
-            #Create loc on point
-            pos = mc.xform(p, q=1, t=1, ws=1)
-            loc = mc.spaceLocator(n='pos_loc')[0]
-            mc.move(pos[0], pos[1], pos[2], loc, rpr=1)
-            mc.parent(loc, currentLyrGeo)
-
-            uRng = mc.getAttr(currentLyrGeo + '.minMaxRangeU')
-            vRng = mc.getAttr(currentLyrGeo + '.minMaxRangeV')
-
-            #Create node closestPointOnSurface
-            pointSurf = mc.createNode('closestPointOnSurface', n='tmp_closestPointOnSurface_1')
-            mc.connectAttr(currentLyrGeo + '.local', pointSurf + '.inputSurface')
-            mc.connectAttr(loc + '.translate', pointSurf + '.inPosition')
-
-            #Get uv coords
-            u = mc.getAttr(pointSurf + '.u')
-            v = mc.getAttr(pointSurf + '.v')
-
-            #Normalized uv's then set follicle paramenters
-            normU = abs(u / uRng[0][1])
-            normV = abs(v / vRng[0][1])
-
-
-            if direction == 'v':
-                mc.setAttr(fols + '.parameterV', normV)
-                mc.setAttr(fols + '.parameterU', .5)
-            else:
-                mc.setAttr(fols + '.parameterU', normU)
-                mc.setAttr(fols + '.parameterV', .5)
+    return (follicleList, cvTagNumList, folP)
 
-            mc.delete(pointSurf, loc)
 
-    return (follicleList, cvTagNumList, folP)
+#The layout already holds the first row of cvs only, with the other parameter at .5
+def follicleFromCvsOneD(prefix, driven, currentLyrGeo, lyrLayout, rotationOn, surfaceAttach=False):
+    return follicleFromCvs(prefix, driven, currentLyrGeo, lyrLayout, rotationOn, surfaceAttach)
 
 
 def jointToFollicle(prefix, driven, follicleList, tag, radius, lyrTag, connectionLayerNode):
+    """ One joint inside each follicle, connected to the layer's connection node. One command_buffer flush. """
     jointList = []
-    x = 0
-
-    jointConnectionLyr = mc.createNode('transform', n=prefix + 'joint_' + lyrTag + '_connectionLayer' + driven)
-    mc.parent(jointConnectionLyr, connectionLayerNode)
+    buf = command_buffer.CommandBuffer()
 
+    jointConnectionLyr = buf.create_node('transform', prefix + 'joint_' + lyrTag + '_connectionLayer' + driven,
+                                         parent=connectionLayerNode)
 
-    #j = follicleList[0]
-    for s in follicleList:
+    for x, s in enumerate(follicleList):
         #name = prefix + 'lyr_' + tag[x] + '_ctrl' + driven
         name = prefix + tag[x] + '_ctrl' + driven
-        x = x + 1
-        mc.select(cl=1)
-        j = mc.joint(n=name, radius=radius)
+        #Created in the follicle, translate and jointOrient are already zero
+        j = buf.create_node('joint', name, parent=s)
+        buf.set_attr((j, 'radius'), float(radius))
         jointList.append(j)
-        #Add connectMessageAttr(lyrGrp, object, sAttributeName)
-        sAttributeName = name
-        connectMessageAttr(jointConnectionLyr, j, sAttributeName)
+        #Same as connectMessageAttr(lyrGrp, object, sAttributeName)
+        buf.add_attr(j, name, 'message')
+        buf.connect((jointConnectionLyr, 'message'), (j, name))
 
-        mc.select(cl=1)
-        mc.parent(j, s)
-        mc.setAttr(j + '.tx', 0)
-        mc.setAttr(j + '.ty', 0)
-        mc.setAttr(j + '.tz', 0)
+    buf.flush()
 
-        mc.setAttr(j + '.jointOrientX', 0)
-        mc.setAttr(j + '.jointOrientY', 0)
-        mc.setAttr(j + '.jointOrientZ', 0)
-
-    return jointList
+    return [str(j) for j in jointList]
 
 
 #Loop thru every surface to add follicles
 def addFolliclesToAll(prefix, driven, numLayers, surfLyr, layerGeos, connectionLayerNode, skinBind, singleSurf,
-                      rotationOn, oneDimension, driverSurfaceList, direction):
+                      rotationOn, oneDimension, driverSurfaceList, direction, arbitrarySurface=False, layout=None,
+                      surfaceAttach=False):
     #TEST for loop
     allFollicles = []
     cvTagNum = []
@@ -554,6 +364,11 @@ def addFolliclesToAll(prefix, driven, numLayers, surfLyr, layerGeos, connectionL
     follicleGrpList = []
     allListOfCtrlsList = []
 
+    # Check if all follicles should be in the same surface, custom surfaces get the cvs projected on them
+    if layout is None:
+        drivers = [singleSurf or driverSurfaceList[i] for i in range(numLayers)]
+        layout = ribbon_layout.get_ribbon_layout(layerGeos[:numLayers], drivers, surfLyr, oneDimension, direction,
+                                                 arbitrarySurface or bool(singleSurf))
 
     #follicles top grp
     folTopGrp = mc.createNode('transform', n=prefix + 'follicles_top_grp' + driven)
@@ -565,25 +380,19 @@ def addFolliclesToAll(prefix, driven, numLayers, surfLyr, layerGeos, connectionL
             mc.warning('Breaking HERE : ' + layerGeos[i])
             break'''
 
-        #get current layer surface
-        currentLyrGeo = driverSurfaceList[i]
-        nextLyrGeo = layerGeos[i]
-
-        # Check if all follicles should be in the same surface
-        if singleSurf:
-            currentLyrGeo = singleSurf
-
-        #get points from next surface
-        lyrCvs = mc.ls(nextLyrGeo + '.cv[*][*]', fl=1)
+        #get current layer
+        lyrLayout = layout.layers[i]
+        currentLyrGeo = lyrLayout.driver
+        nextLyrGeo = lyrLayout.surface
 
         #get Tag
-        lyrTag = surfLyr[i]
+        lyrTag = lyrLayout.tag
 
         ##### Run follicleFromCvs function to create the follicles
 
         if oneDimension:
-            folliclesList, cvNameList, folP = follicleFromCvsOneD(prefix, driven, currentLyrGeo, lyrCvs, lyrTag,
-                                                                  rotationOn, direction)
+            folliclesList, cvNameList, folP = follicleFromCvsOneD(prefix, driven, currentLyrGeo, lyrLayout, rotationOn,
+                                                                  surfaceAttach)
             mc.parent(folP, folTopGrp)
             follicleGrpList.append(folP)
 
@@ -591,7 +400,8 @@ def addFolliclesToAll(prefix, driven, numLayers, surfLyr, layerGeos, connectionL
             cvTagNum.append(cvNameList)
 
         else:
-            folliclesList, cvNameList, folP = follicleFromCvs(prefix, driven, currentLyrGeo, lyrCvs, lyrTag, rotationOn)
+            folliclesList, cvNameList, folP = follicleFromCvs(prefix, driven, currentLyrGeo, lyrLayout, rotationOn,
+                                                              surfaceAttach)
             mc.parent(folP, folTopGrp)
 
             follicleGrpList.append(folP)
@@ -815,6 +625,7 @@ def addCtrlShapesToRibbonIII(
 
 
 
+@build_transaction.BuildTransaction('reShapeRibbon')
 def reShapeRibbon(inShaperSurf, prefix='rbn'):
 
     inShaperSurf = mc.ls(sl=1)[0]
@@ -18,6 +18,12 @@ import maya.mel as mel
 import pymel.core as pm
 
 import controlCurveShapes as ccs
+import nurbs_math as nmath
+import nurbs_utils
+import skin_weights
+import build_transaction
+import follicle_factory
+import name_registry
 
 
 
@@ -25,14 +31,26 @@ import controlCurveShapes as ccs
 ''' Wire to SkinCluster 08/05/2017 ''' #########################################################
 #######################################################################################################
 
-def wire_to_skinCluster(curve, geo, name="", jntList="", dropoffDistance=100, rotation=0.00):
+@build_transaction.BuildTransaction('wire_to_skinCluster')
+def wire_to_skinCluster(curve, geo, name="", jntList="", dropoffDistance=100, rotation=0.00, mode='analytic'):
     """
         Date : 08/05/2017
         Author : Felipe Sanges
+        Modes :
+            'analytic' - Weights are solved from the curve cvs, knots and dropoffDistance in one NumPy pass
+                         and written to the skinCluster in one call. No wire deformer is created.
+                         rotation is not modeled, a non zero value warns and gets the weights of rotation 0.
+            'probe'    - Old path. Creates a wire, moves every joint and measures each vertex with pointPosition.
+                         Slow, kept to compare results.
         Usage :
         curve, geo = mc.ls(sl=1)
         rlx.wire_to_skinCluster(curve, geo, name='name', dropoffDistance=100, rotation=0.00)
         """
+    if mode not in ('analytic', 'probe'):
+        mc.error('Unknown mode "%s". Use "analytic" or "probe".' % mode)
+    if mode == 'analytic' and rotation:
+        mc.warning('wire_to_skinCluster: rotation %s is ignored in analytic mode, use mode="probe" for it.' % rotation)
+
     skinGeo = mc.duplicate(geo, n=geo + '_skin')[0]
     if not name:
         name = 'tmp'
@@ -50,10 +68,23 @@ def wire_to_skinCluster(curve, geo, name="", jntList="", dropoffDistance=100, ro
 
     #--- Skin Curve
     crv_skin = mc.skinCluster( jntList, curve, dr=4.5, maximumInfluences=1, frontOfChain=1, toSelectedBones=1, n = 'layer_A_skC')
+
+    if mode == 'analytic':
+        #--- Solve all vertices at once from the curve data
+        cvs, knots, degree = nurbs_utils.get_curve_data(curve)
+        cvInfluences = skin_weights.get_skin_weights(crv_skin[0], curve)
+        vtxPos = nurbs_utils.get_component_positions(geo + '.vtx[*]')
+        weights = nmath.wire_weights(vtxPos, cvs, knots, degree, cvInfluences, dropoffDistance)
+
+        outSkin = mc.skinCluster( jntList, geo, dr=4.5, maximumInfluences=1, frontOfChain=1, toSelectedBones=1, n = 'outMesh_skC')
+        skin_weights.set_skin_weights(outSkin[0], geo, weights,
+                                      influences=skin_weights.get_influences(crv_skin[0]), lock=True)
+        return jntList
+
     wire = mc.wire(geo, gw=False, en=1.000000, ce=0.000000, li=0.000000, w=curve )[0]
 
-#--- Set wire attrs
-mc.setAttr(wire + ".rotation", rotation)
+    #--- Set wire attrs
+    mc.setAttr(wire + ".rotation", rotation)
     mc.setAttr(wire + ".dropoffDistance[0]", dropoffDistance)
     
     #--- Get all vertices
@@ -88,18 +119,14 @@ mc.setAttr(wire + ".rotation", rotation)
         allDisplacement.append(displacement)
     mc.warning('DONE!!')
 
-#  skin
-mc.setAttr(wire + ".envelope", 0)
+    #  skin
+    mc.setAttr(wire + ".envelope", 0)
     outSkin = mc.skinCluster( jntList, geo, dr=4.5, maximumInfluences=1, frontOfChain=1, toSelectedBones=1, n = 'outMesh_skC')
-    
-    for i, j in enumerate(jntList):
-        for x, dis in enumerate(allDisplacement[i]):
-            mc.skinPercent(outSkin[0], geo + '.vtx[' + str(x) + ']', transformValue=[(j, dis)])
-            
-            #Lock influence weights
-            mc.setAttr(j + '.liw', 1)
 
-mc.warning('Done')
+    #   Write all weights at once and lock influence weights
+    skin_weights.set_skin_weights(outSkin[0], geo, zip(*allDisplacement), influences=jntList, lock=True)
+
+    mc.warning('Done')
     mc.delete(wire)
     return jntList
 
@@ -193,6 +220,7 @@ def fk_simple_setup(inJointList,
 ''' Joints to Driver Mesh 16/04/2017 ''' #########################################################
 #######################################################################################################
 
+@build_transaction.BuildTransaction('joints_to_driver_mesh')
 def joints_to_driver_mesh(inJointList, scale = 0.1, name='tmp'):
     ''' 
     Creates a poly face for each inJoints and set up follicles on the combined mesh. 
@@ -264,54 +292,38 @@ def joints_to_driver_mesh(inJointList, scale = 0.1, name='tmp'):
 
     #   Get Shape
     shape = mc.listRelatives(mesh, s=1)[0]
-    #   Create follicle for each joint
-    folList = list()
-    bindJList = list()
-    for i, jnt in enumerate(inJointList):#pass
-        #for i, vc in enumerate(triLocList):
-        #Create cpom
-        cpom = mc.createNode('closestPointOnMesh', n='tmp_cpom')
-        mc.connectAttr(shape+'.worldMesh[0]',cpom+'.inMesh')
+    #   Closest uv of each joint, one cpom for all of them
+    cpom = mc.createNode('closestPointOnMesh', n='tmp_cpom')
+    mc.connectAttr(shape+'.worldMesh[0]',cpom+'.inMesh')
+    paramUList = list()
+    paramVList = list()
+    for jnt in inJointList:#pass
         mc.connectAttr(jnt + '.translate',cpom+'.inPosition', f=1)
+        paramUList.append(mc.getAttr('%s.parameterU'%cpom))
+        paramVList.append(mc.getAttr('%s.parameterV'%cpom))
+    mc.delete(cpom)
 
-        parameterU = mc.getAttr('%s.parameterU'%cpom)
-        parameterV = mc.getAttr('%s.parameterV'%cpom)
-
-        #Create follicle transform and shape
-        fols = mc.createNode('follicle', n = "%s_%s_follicle_nodeShape"%(jnt, i)) #, n = mesh('mesh', 'follicle_nodeShape'), p = fol )
-        fol = mc.listRelatives(fols, p=1)[0]
-        #   Set uv values
-        if jntNum < 2:
-            parameterU = .5
-            parameterV = .5
-        mc.setAttr('%s.parameterU'%fols, parameterU)
-        mc.setAttr('%s.parameterV'%fols, parameterV)
-        #   Hide follicle
-        mc.setAttr('%s.v'%fols, 0, lock=True)
-        #   Connect to mesh
-        mc.connectAttr(shape + '.worldMatrix[0]', fols + '.inputWorldMatrix')
-        mc.connectAttr(shape + '.outMesh', fols + '.inputMesh')# check for worldMesh[0]
-        mc.connectAttr(fols + '.outTranslate', fol + '.translate')
-        mc.connectAttr(fols + '.outRotate', fol + '.rotate')
-
-        #Create follicle grp
-        folP = '%s_follicles_grp'%mesh
-        if not(mc.objExists(folP)):
-            folP = mc.createNode('transform', n=folP )
-        
+    #   Set uv values
+    if jntNum < 2:
+        paramUList = [.5] * jntNum
+        paramVList = [.5] * jntNum
+
+    #   Create follicle for each joint, all in one flush
+    folNames = ["%s_%s_follicle_node"%(jnt, i) for i, jnt in enumerate(inJointList)]
+    folList, folShapes, folP = follicle_factory.create_follicles(
+        shape, paramUList, paramVList, folNames, group='%s_follicles_grp'%mesh, hide=True)
+
+    bindJList = list()
+    for jnt, fol in zip(inJointList, folList):#pass
         #  Parent joint
         dup = mc.duplicate(jnt, po=1)[0]
         mc.parent(dup, fol)
-        mc.parent(fol, folP)
 
         #   Zero all
         mc.xform(dup, t=(0, 0, 0), ro=(0, 0, 0), s=(1, 1, 1))
         mc.makeIdentity(dup, jo=1, apply=1)
         mc.parent(dup, w=1)
-        
-        mc.delete(cpom)
 
-        folList.append(fol)
         bindJList.append(dup)
 
     #   Bind mesh
@@ -397,59 +409,24 @@ def surface_from_chain(inJointList, width=0.01, name='surface', degree=2, axis='
 
 def follicle_to_closest_point(inSurface, inPosList, name='tmp'):
     """ Usage: rlx.follicle_to_closest_point(inSurface, inPosList, name='tmp')
+        The closest uv of every position is solved in one NumPy pass over the world space surface
+        (nurbs_math.closest_params_on_surface), no temporary duplicate or closestPointOnSurface nodes.
+        The follicles are made by follicle_factory in one flush.
     """
+    if not len(inPosList):
+        return []
 
-    folList = list()
-    
-    for i, pos in enumerate(inPosList):
-            
-        #Create follicle grp
-        folP = '%s_follicles_master_grp'%name
-        if not(mc.objExists(folP)):
-            folP = mc.createNode('transform', n='%s_follicles_master_grp'%name )
-
-        #Create follicle transform and shape
-        fol = mc.createNode('transform', n='%s_follicle_%02d_n'%(name, i), p = folP )
-        folList .append(fol)
-        fols = mc.createNode('follicle', p = fol, n=fol+'Shape' )
-        #Connect to inSurface
-        mc.connectAttr(inSurface + '.worldMatrix[0]', fols + '.inputWorldMatrix')
-        mc.connectAttr(inSurface + '.local', fols + '.inputSurface')
-        mc.connectAttr(fols + '.outTranslate', fol + '.translate')
-        mc.connectAttr(fols + '.outRotate', fol + '.rotate')
-
-        #Create loc on point
-        #pos = mc.xform(p, q=1, sp=1, ws=1)
-        loc = mc.spaceLocator(n='pos_loc')[0]
-        mc.move(pos[0], pos[1], pos[2], loc, rpr=1)
-
-        uRng = mc.getAttr(inSurface + '.minMaxRangeU')
-        vRng = mc.getAttr(inSurface + '.minMaxRangeV')
-
-        # Create duplicate inSurface
-        surface = mc.duplicate(inSurface, n='tmp_surface_1')[0]
-        for attr in ['tx', 'ty', 'tz', 'rx', 'ry', 'rz', 'sx', 'sy', 'sz']:
-            mc.setAttr(surface + '.' + attr, l=0)
-        
-        mc.makeIdentity(surface, t=1, r=1, s=1, apply=1)
-
-        #Create node closestPointOnSurface
-        pointSurf = mc.createNode('closestPointOnSurface', n='tmp_closestPointOnSurface_1' )
-        mc.connectAttr(surface + '.local', pointSurf + '.inputSurface')
-        mc.connectAttr(loc + '.translate', pointSurf + '.inPosition')
-
-        #Get uv coords
-        u = mc.getAttr(pointSurf + '.u')
-        v = mc.getAttr(pointSurf + '.v')
-
-        #Normalized uv's then set follicle paramenters
-        normU = abs( u / uRng[0][1] )
-        normV = abs( v / vRng[0][1] )
-
-        mc.setAttr(fols + '.parameterU', normU)
-        mc.setAttr(fols + '.parameterV', normV)
-
-        mc.delete(pointSurf, loc, surface)
+    cvs, knotsU, knotsV, degreeU, degreeV = nurbs_utils.get_surface_data(inSurface)
+    u, v = nmath.closest_params_on_surface(inPosList, cvs, knotsU, knotsV, degreeU, degreeV)
+
+    #Normalized uv's for the follicle paramenters
+    normU = nmath.normalize_params(u, knotsU, degreeU)
+    normV = nmath.normalize_params(v, knotsV, degreeV)
+
+    #Every follicle in one flush
+    folList, folShapes, folP = follicle_factory.create_follicles(
+        inSurface, normU, normV, name_registry.unique_names(name + '_follicle_{:02d}_n', len(inPosList), start=0),
+        group='%s_follicles_master_grp'%name)
 
     return folList
 
@@ -458,6 +435,7 @@ def follicle_to_closest_point(inSurface, inPosList, name='tmp'):
 ''' Copy Skin To Nurbs - 01/06/2017 '''
 ##########################################################
 
+@build_transaction.BuildTransaction('copy_skin_to_nurbs')
 def copy_skin_to_nurbs(inSkinnedObj, inSurface):
     """
     copy_skin_to_nurbs  - 01/06/2017.
@@ -506,6 +484,7 @@ def copy_skin_to_nurbs(inSkinnedObj, inSurface):
 ###########################################################################
 ''' Copy Weights Nurbs - (Julien Version - depricated) 27/02/2017 ''' ###
 ###########################################################################
+@build_transaction.BuildTransaction('copy_weights_nurbs')
 def copy_weights_nurbs() :
 
     #####switches  True/False   ####
@@ -1481,19 +1460,15 @@ def createObjsOnSelected(objList, type='curve', degree=1 ):
 ''' resetSkinCluster  '''##########################################################################
 #######################################################################################################
 
-def resetSkinCluster():
-    sel = mc.ls(selection=True)
-
-    for each in sel:
-        skinClusterDef = mc.ls(mc.listHistory(each, pdo=True),type='skinCluster')
-
-        if skinClusterDef:
-            infs = mc.listConnections( skinClusterDef[0] + '.matrix' )
-
-            for i, inf in enumerate( infs ):
+def resetSkinCluster(inGeos=None):
+    '''
+    Resets the bindPreMatrix of every skinCluster on inGeos (the selection by default) to the current pose.
+    One history query and one write for all the geos, connected bindPreMatrix elements are skipped.
+    '''
+    if inGeos is None:
+        inGeos = mc.ls(selection=True)
 
-                m = mc.getAttr( inf + '.worldInverseMatrix' )
-                mc.setAttr( skinClusterDef[0] + '.bindPreMatrix[' + str(i) + ']', m[0], m[1], m[2], m[3], m[4], m[5], m[6], m[7], m[8], m[9], m[10], m[11], m[12], m[13], m[14], m[15], typ= 'matrix' )
+    return skin_weights.reset_bind_pre_matrices(skin_weights.get_skin_clusters(inGeos))
 
 
 #######################################################################################################
@@ -1841,13 +1816,9 @@ def createSmearSkinGen(inJoints, inMesh, divisions = 2):
         allDisplacement.append(displacement)
     mc.warning('Done collecting weights. Starting to set values on outMesh!')
 
-    for i, j in enumerate(inJoints):
-        for x, dis in enumerate(allDisplacement[i]):
-            mc.skinPercent(outSkin[0], outMesh + '.vtx[' + str(x) + ']', transformValue=[(j, dis)])
-            
-            #Lock influence weights
-            mc.setAttr(j + '.liw', 1)
-            
+    #Write all weights at once and lock influence weights
+    skin_weights.set_skin_weights(outSkin[0], outMesh, zip(*allDisplacement), influences=inJoints, lock=True)
+
     mc.warning('Done calculating weights.')
     
     #mc.parent(
@@ -2213,6 +2184,7 @@ def chainFromPositionList(inPositionList):
 
 
 
+@build_transaction.BuildTransaction('chain_from_surface')
 def chain_from_surface(inSurfaceObj, direction='u', upVector=(0, 1, 0)):
     """ Creates a chain oriented by surface normals 
     Todo : add numOfJoints=10?
@@ -2224,6 +2196,9 @@ def chain_from_surface(inSurfaceObj, direction='u', upVector=(0, 1, 0)):
     chain = createJntChainFromSurfaceHulls(inSurfaceObj.name(), direction=direction)
 
     posList = getPosListFromObjects(chain)
+    # tmp follicles, solved in one batch
+    folList = follicle_to_closest_point(inSurfaceObj.name(), posList)
+    tmpFolGrps = list(set(mc.listRelatives(folList, parent=True, fullPath=True) or [])) if folList else []
     for i, j in enumerate(chain):#pass
 
         jnt = pm.PyNode(j)
@@ -2232,8 +2207,8 @@ def chain_from_surface(inSurfaceObj, direction='u', upVector=(0, 1, 0)):
         if j == chain[-1]:
             pm.makeIdentity(jnt, jointOrient=1, apply=0)
 
-        # Create tmp follicle
-        fol =  follicle_to_closest_point(inSurfaceObj.name(), [posList[i]])[0]
+        # Get tmp follicle
+        fol = folList[i]
         f = pm.PyNode(fol)
         # --- Set V to .5
         f.parameterV.set(.5)
@@ -2272,7 +2247,10 @@ def chain_from_surface(inSurfaceObj, direction='u', upVector=(0, 1, 0)):
             pm.delete(acon)
             pm.parent(jnt, off.getParent())
 
-        pm.delete(off, aim, up, f.getParent())
+        pm.delete(off, aim, up)
+
+    if tmpFolGrps:
+        mc.delete(tmpFolGrps)
 
     return chain
 
@@ -3011,23 +2989,10 @@ def handdleForSkinCluster(inObj=(mc.ls(sl=1)), scale=0.05, name='pin', rotation=
                           direction=2
                           )
 
-        #Create follicle grp
-        folP = '%s_%s_follicles_grp'%(name, description)
-        if not(mc.objExists(folP)):
-            folP = mc.createNode('transform', n=folP )
-
-        #Create follicle transform and shape
-        fol = mc.createNode('transform', n = '%s_%s_follicle_node'%(name, description), p = folP )
-        fols = mc.createNode('follicle', n = '%s_%s_follicle_nodeShape'%(name, description), p = fol )
-        #Connect to surface
-        mc.connectAttr(surface + '.worldMatrix[0]', fols + '.inputWorldMatrix')
-        mc.connectAttr(surface + '.local', fols + '.inputSurface')
-        mc.connectAttr(fols + '.outTranslate', fol + '.translate')
-        mc.connectAttr(fols + '.outRotate', fol + '.rotate')
+        #Create follicle and grp
+        fol = follicle_factory.create_follicles(surface, [.5], [.5], ['%s_%s_follicle_node'%(name, description)],
+                                                group='%s_%s_follicles_grp'%(name, description))[0][0]
 
-        mc.setAttr(fols + '.parameterU', .5)
-        mc.setAttr(fols + '.parameterV', .5)
-        
         return fol
 
 